@@ -0,0 +1,95 @@
+"""Benchmark converting neo4j nodes and relationships to Node/Edge objects
+
+Run with `python -m benchmarks.conversion`
+"""
+
+import argparse
+import gc
+import json
+import time
+import tracemalloc
+
+from biograph.edges import Edge
+from biograph.nodes import Node
+
+from .fakes import FakeNode, FakeRelationship
+
+LABELS = ["Species", "Reaction", "Parameter", "Compartment", "Unit", "KineticLaw"]
+TYPES = ["HAS_SPECIES", "IS_REACTANT", "HAS_PRODUCT", "HAS_PARAMETER", "IN_COMPARTMENT"]
+
+
+def make_nodes(count: int) -> list[FakeNode]:
+    return [
+        FakeNode(
+            str(i),
+            {LABELS[i % len(LABELS)]},
+            {
+                "uuid": f"node-{i}",
+                "id": f"id{i}",
+                "metaid": f"meta{i}",
+                "name": f"name{i}",
+                "size": "1.0",
+                "scale": "0",
+                "identifiers": [f'bqbiol:is="http://identifiers.org/x/{i % 100}"'],
+            },
+        )
+        for i in range(count)
+    ]
+
+
+def make_relationships(nodes: list[FakeNode]) -> list[FakeRelationship]:
+    return [
+        FakeRelationship(
+            f"r{i}",
+            TYPES[i % len(TYPES)],
+            nodes[i],
+            nodes[(i * 7 + 1) % len(nodes)],
+            {"uuid": f"rel-{i}"},
+        )
+        for i in range(len(nodes))
+    ]
+
+
+def measure(convert, items) -> dict[str, float]:
+    """Time the conversion and measure the memory retained per converted object"""
+    gc.collect()
+    start = time.perf_counter()
+    convert(items)
+    elapsed = time.perf_counter() - start
+
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    ret = convert(items)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del ret
+
+    return {
+        "seconds": elapsed,
+        "us_per_object": elapsed / len(items) * 1e6,
+        "bytes_per_object": (after - before) / len(items),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--count", type=int, default=300_000)
+    args = parser.parse_args()
+
+    nodes = make_nodes(args.count)
+    relationships = make_relationships(nodes)
+
+    results = {
+        "Node.from_neo4j": measure(
+            lambda items: [Node.from_neo4j(n) for n in items], nodes
+        ),
+        "Edge.from_neo4j": measure(
+            lambda items: [Edge.from_neo4j(r) for r in items], relationships
+        ),
+    }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+from typing import Any
+
+# minimal stand-ins for the neo4j driver's graph types, implementing only
+# what Node.from_neo4j, Edge.from_neo4j and neo4j_to_networkx use
+
+
+class FakeNode:
+    def __init__(self, element_id: str, labels: set[str], properties: dict[str, Any]):
+        self.element_id = element_id
+        self.labels = frozenset(labels)
+        self._properties = properties
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self._properties.get(key, default)
+
+    def items(self):
+        return self._properties.items()
+
+
+class FakeRelationship:
+    def __init__(
+        self,
+        element_id: str,
+        type: str,
+        start_node: FakeNode,
+        end_node: FakeNode,
+        properties: dict[str, Any],
+    ):
+        self.element_id = element_id
+        self.type = type
+        self.nodes = (start_node, end_node)
+        self._properties = properties
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self._properties.get(key, default)
+
+    def items(self):
+        return self._properties.items()
+
+
+class FakeGraph:
+    def __init__(self, nodes: list[FakeNode], relationships: list[FakeRelationship]):
+        self.nodes = nodes
+        self.relationships = relationships
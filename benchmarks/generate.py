@@ -0,0 +1,253 @@
+"""Generate synthetic SBML models, and the graphs they would be imported as
+
+Each model has one compartment, the given number of species (each annotated
+with identifiers drawn from a shared vocabulary, so that models overlap) and
+reactions, each with a kinetic law, one or two parameters, and one or two
+reactants and products.
+
+Run with `python -m benchmarks.generate OUT_DIR` to write SBML files, e.g. for
+`pdm import-sbml` or the ingestion benchmark.
+"""
+
+import argparse
+import os
+import random
+import uuid
+
+import networkx as nx
+
+from biograph import graph
+from biograph.nodes import ENTITY_LABEL
+
+from .fakes import FakeGraph, FakeNode, FakeRelationship
+
+RDF = "http://www.w3.org/1999/02/22-rdf-syntax-ns#"
+BQBIOL = "http://biomodels.net/biology-qualifiers/"
+
+
+class ModelSpec:
+    """Size of a synthetic model"""
+
+    species: int
+    reactions: int
+    # identifiers per species, and the number of distinct identifiers they are drawn from
+    identifiers: int
+    vocabulary: int
+
+    def __init__(
+        self,
+        species: int = 100,
+        reactions: int = 150,
+        identifiers: int = 2,
+        vocabulary: int = 1000,
+    ) -> None:
+        self.species = species
+        self.reactions = reactions
+        self.identifiers = identifiers
+        self.vocabulary = vocabulary
+
+    def as_dict(self) -> dict[str, int]:
+        return {
+            "species": self.species,
+            "reactions": self.reactions,
+            "identifiers": self.identifiers,
+            "vocabulary": self.vocabulary,
+        }
+
+
+def _uris(rng: random.Random, spec: ModelSpec) -> list[str]:
+    return [
+        f"http://identifiers.org/chebi/CHEBI:{k}"
+        for k in rng.sample(range(spec.vocabulary), spec.identifiers)
+    ]
+
+
+def annotation(metaid: str, uris: list[str]) -> str:
+    """Build an SBML annotation describing the element with the given metaid as the given URIs"""
+    items = "".join(f'<rdf:li rdf:resource="{u}"/>' for u in uris)
+    return (
+        f'<annotation><rdf:RDF xmlns:rdf="{RDF}" xmlns:bqbiol="{BQBIOL}">'
+        f'<rdf:Description rdf:about="#{metaid}">'
+        f"<bqbiol:is><rdf:Bag>{items}</rdf:Bag></bqbiol:is>"
+        "</rdf:Description></rdf:RDF></annotation>"
+    )
+
+
+class _Reaction:
+    reactants: list[int]
+    products: list[int]
+    parameters: int
+
+    def __init__(self, rng: random.Random, species: int) -> None:
+        self.reactants = rng.sample(range(species), min(species, rng.randint(1, 2)))
+        self.products = rng.sample(range(species), min(species, rng.randint(1, 2)))
+        self.parameters = rng.randint(1, 2)
+
+
+def _layout(
+    rng: random.Random, spec: ModelSpec
+) -> tuple[list[list[str]], list[_Reaction]]:
+    """Pick the identifiers of each species and the participants of each reaction"""
+    species = [_uris(rng, spec) for _ in range(spec.species)]
+    reactions = [_Reaction(rng, spec.species) for _ in range(spec.reactions)]
+    return species, reactions
+
+
+##########
+## SBML ##
+##########
+
+
+def make_sbml(name: str, spec: ModelSpec, seed: int = 0) -> str:
+    """Build an SBML level 3 document for a synthetic model"""
+    rng = random.Random(seed)
+    species, reactions = _layout(rng, spec)
+
+    lines = [
+        '<?xml version="1.0" encoding="UTF-8"?>',
+        '<sbml xmlns="http://www.sbml.org/sbml/level3/version1/core" level="3" version="1">',
+        f'<model id="{name}" name="{name}">',
+        "<listOfCompartments>",
+        '<compartment id="c" name="cell" size="1" constant="true"/>',
+        "</listOfCompartments>",
+        "<listOfSpecies>",
+    ]
+    for i, uris in enumerate(species):
+        lines.append(
+            f'<species id="s{i}" metaid="meta_s{i}" name="species {i}" compartment="c" '
+            'initialConcentration="1" hasOnlySubstanceUnits="false" '
+            'boundaryCondition="false" constant="false">'
+            f"{annotation(f'meta_s{i}', uris)}</species>"
+        )
+    lines += ["</listOfSpecies>", "<listOfReactions>"]
+    for i, r in enumerate(reactions):
+        lines.append(f'<reaction id="r{i}" reversible="false">')
+        lines.append("<listOfReactants>")
+        lines += [
+            f'<speciesReference species="s{s}" stoichiometry="1" constant="true"/>'
+            for s in r.reactants
+        ]
+        lines += ["</listOfReactants>", "<listOfProducts>"]
+        lines += [
+            f'<speciesReference species="s{s}" stoichiometry="1" constant="true"/>'
+            for s in r.products
+        ]
+        lines += ["</listOfProducts>", "<kineticLaw>", "<listOfLocalParameters>"]
+        lines += [
+            f'<localParameter id="k{i}_{p}" value="0.1"/>' for p in range(r.parameters)
+        ]
+        lines += ["</listOfLocalParameters>", "</kineticLaw>", "</reaction>"]
+    lines += ["</listOfReactions>", "</model>", "</sbml>"]
+    return "\n".join(lines)
+
+
+###########
+## graph ##
+###########
+
+
+class _GraphBuilder:
+    nodes: list[FakeNode]
+    relationships: list[FakeRelationship]
+
+    def __init__(self, rng: random.Random) -> None:
+        self.rng = rng
+        self.nodes = []
+        self.relationships = []
+
+    def _uuid(self) -> str:
+        return str(uuid.UUID(int=self.rng.getrandbits(128), version=4))
+
+    def node(self, label: str, properties: dict) -> FakeNode:
+        n = FakeNode(
+            f"n{len(self.nodes)}",
+            {label, ENTITY_LABEL},
+            {"uuid": self._uuid(), **properties},
+        )
+        self.nodes.append(n)
+        return n
+
+    def relationship(self, typ: str, start: FakeNode, end: FakeNode):
+        self.relationships.append(
+            FakeRelationship(
+                f"r{len(self.relationships)}",
+                typ,
+                start,
+                end,
+                {"uuid": self._uuid()},
+            )
+        )
+
+
+def make_neo4j_graph(models: int, spec: ModelSpec, seed: int = 0) -> FakeGraph:
+    """Build the graph the synthetic models would be read from the database as"""
+    rng = random.Random(seed)
+    b = _GraphBuilder(rng)
+
+    for m in range(models):
+        species_uris, reactions = _layout(rng, spec)
+
+        model = b.node("Model", {"id": f"model{m}", "name": f"model {m}"})
+        compartment = b.node("Compartment", {"id": "c", "name": "cell", "size": "1.0"})
+        b.relationship("HAS_COMPARTMENT", model, compartment)
+
+        species = []
+        for i, uris in enumerate(species_uris):
+            metaid = f"meta_s{i}"
+            s = b.node(
+                "Species",
+                {
+                    "id": f"s{i}",
+                    "metaid": metaid,
+                    "name": f"species {i}",
+                    "annotation": annotation(metaid, uris),
+                    "identifiers": [f'bqbiol:is="{u}"' for u in uris],
+                },
+            )
+            b.relationship("HAS_SPECIES", model, s)
+            b.relationship("IN_COMPARTMENT", s, compartment)
+            species.append(s)
+
+        for i, r in enumerate(reactions):
+            reaction = b.node("Reaction", {"id": f"r{i}", "name": f"reaction {i}"})
+            b.relationship("HAS_REACTION", model, reaction)
+            for s in r.reactants:
+                b.relationship("IS_REACTANT", species[s], reaction)
+            for s in r.products:
+                b.relationship("HAS_PRODUCT", reaction, species[s])
+
+            law = b.node("KineticLaw", {"id": f"law{i}"})
+            b.relationship("HAS_KINETICLAW", reaction, law)
+            for p in range(r.parameters):
+                parameter = b.node("Parameter", {"id": f"k{i}_{p}", "value": "0.1"})
+                b.relationship("HAS_PARAMETER", law, parameter)
+
+    return FakeGraph(b.nodes, b.relationships)
+
+
+def make_graph(models: int, spec: ModelSpec, seed: int = 0) -> nx.MultiDiGraph:
+    """Build the networkx graph of the synthetic models, as the routes work on it"""
+    return graph.neo4j_to_networkx(make_neo4j_graph(models, spec, seed))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("out_dir")
+    parser.add_argument("--models", type=int, default=10)
+    parser.add_argument("--species", type=int, default=100)
+    parser.add_argument("--reactions", type=int, default=150)
+    parser.add_argument("--identifiers", type=int, default=2)
+    parser.add_argument("--vocabulary", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    spec = ModelSpec(args.species, args.reactions, args.identifiers, args.vocabulary)
+    os.makedirs(args.out_dir, exist_ok=True)
+    for m in range(args.models):
+        name = f"synthetic{m}"
+        with open(os.path.join(args.out_dir, f"{name}.xml"), "w") as f:
+            f.write(make_sbml(name, spec, args.seed + m))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""Benchmark writing the test models to the database with each import write method
+
+Needs the database configured in config/neo4j.yml - imported models are left in
+the database, so point it at a scratch database.
+
+Run with `python -m benchmarks.ingestion`
+"""
+
+import argparse
+import json
+import os
+import time
+
+from biograph import database, neo4jsbml
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--models", default="tests/models")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    files = list(neo4jsbml.read_sbml_paths([args.models]))
+    arr = neo4jsbml.load_schema(neo4jsbml.configured_schema())
+
+    conn = neo4jsbml.connect_neo4j()
+    db = database.Database(database.Config.get())
+
+    writers = {
+        "neo4jsbml": lambda model: neo4jsbml.write(conn, model),
+        "native": lambda model: neo4jsbml.write_native(db, model),
+    }
+
+    results = {}
+    for method, write in writers.items():
+        per_file: dict[str, float] = {}
+        for name, xml in files:
+            elapsed = 0.0
+            for _ in range(args.repeat):
+                # every write needs a freshly mapped model, with its own tag
+                model = neo4jsbml.prepare(xml.decode(), arr)
+                start = time.perf_counter()
+                write(model)
+                elapsed += time.perf_counter() - start
+            per_file[os.path.basename(name)] = elapsed / args.repeat * 1e3
+
+        results[method] = {
+            "ms_per_model": sum(per_file.values()) / len(per_file),
+            "ms_by_file": per_file,
+        }
+
+    db.close()
+    conn.driver.close()
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
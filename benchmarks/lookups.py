@@ -0,0 +1,97 @@
+"""Benchmark uuid lookups with and without the Entity label and its constraint,
+and relationship lookups with and without the per-type uuid indexes
+
+Needs the database configured in config/neo4j.yml - creates --count temporary
+nodes and relationships (deleted again afterwards), so point it at a scratch database.
+
+Run with `python -m benchmarks.lookups`
+"""
+
+import argparse
+import json
+import random
+import time
+import uuid
+
+from biograph import database
+
+LABELS = ["Species", "Reaction", "Parameter", "Compartment", "Unit", "KineticLaw"]
+TYPES = ["HAS_SPECIES", "HAS_REACTION", "HAS_PARAMETER", "IN_COMPARTMENT"]
+
+# lookups as written before the Entity label, which can't use any index
+QUERIES = {
+    "unlabelled": "MATCH (n) WHERE n.uuid = $uuid RETURN n",
+    "entity": "MATCH (n:Entity {uuid: $uuid}) RETURN n",
+}
+# relationship lookups as written before, which can't use any index
+RELATIONSHIP_QUERIES = {
+    "relationship-untyped": "MATCH ()-[r]-() WHERE r.uuid = $uuid RETURN r",
+    "relationship-typed": database.relationship_by_uuid_query(TYPES),
+}
+
+
+def lookup(session, q: str, sample: list[str]) -> dict[str, float]:
+    """Time looking up each uuid of the sample with the query"""
+    start = time.perf_counter()
+    for u in sample:
+        session.run(q, uuid=u).consume()
+    elapsed = time.perf_counter() - start
+    return {"ms_per_lookup": elapsed / len(sample) * 1e3}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--count", type=int, default=500_000)
+    parser.add_argument("--lookups", type=int, default=200)
+    args = parser.parse_args()
+
+    cfg = database.Config.get()
+    with database.Database(cfg) as db, db.rw_session() as session:
+        database.create_indexes(session)
+
+        uuids = [str(uuid.uuid4()) for _ in range(args.count)]
+        for label in LABELS:
+            rows = uuids[LABELS.index(label) :: len(LABELS)]
+            for i in range(0, len(rows), 10_000):
+                session.run(
+                    f"UNWIND $uuids AS uuid CREATE (:{label}:Entity "
+                    "{uuid: uuid, benchmark: true})",
+                    uuids=rows[i : i + 10_000],
+                ).consume()
+
+        # a chain through the nodes, the relationship types taking turns
+        edges = [
+            {"start": a, "end": b, "uuid": str(uuid.uuid4())}
+            for a, b in zip(uuids, uuids[1:])
+        ]
+        for typ in TYPES:
+            rows = edges[TYPES.index(typ) :: len(TYPES)]
+            for i in range(0, len(rows), 10_000):
+                session.run(
+                    "UNWIND $rows AS row "
+                    "MATCH (a:Entity {uuid: row.start}) "
+                    "MATCH (b:Entity {uuid: row.end}) "
+                    f"CREATE (a)-[:{typ} {{uuid: row.uuid, benchmark: true}}]->(b)",
+                    rows=rows[i : i + 10_000],
+                ).consume()
+
+        results = {}
+        try:
+            sample = random.sample(uuids, args.lookups)
+            for name, q in QUERIES.items():
+                results[name] = lookup(session, q, sample)
+            sample = random.sample([e["uuid"] for e in edges], args.lookups)
+            for name, q in RELATIONSHIP_QUERIES.items():
+                results[name] = lookup(session, q, sample)
+        finally:
+            session.run(
+                "MATCH (n {benchmark: true}) "
+                "CALL { WITH n DETACH DELETE n } IN TRANSACTIONS OF 10000 ROWS"
+            ).consume()
+
+    results["nodes"] = args.count
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""Benchmark the conversion and graph functions on synthetic models, without a database
+
+Results are written as JSON, so that runs on different commits can be compared
+with --compare.
+
+Run with `python -m benchmarks.suite [--output results.json] [--compare old.json]`
+"""
+
+import argparse
+import gc
+import json
+import platform
+import random
+import statistics
+import subprocess
+import time
+from collections.abc import Callable
+from typing import Any
+
+import networkx as nx
+
+from biograph import api_models, graph
+from biograph.nodes import Node
+
+from .generate import ModelSpec, make_neo4j_graph
+
+
+def measure(
+    fn: Callable[[Any], Any],
+    setup: Callable[[], Any] = lambda: None,
+    repeat: int = 5,
+) -> dict[str, float]:
+    """Time fn(setup()) repeat times, excluding the setup, and summarize the timings in seconds"""
+    times = []
+    for _ in range(repeat):
+        arg = setup()
+        gc.collect()
+        start = time.perf_counter()
+        fn(arg)
+        times.append(time.perf_counter() - start)
+    return {
+        "min": min(times),
+        "median": statistics.median(times),
+        "mean": statistics.mean(times),
+    }
+
+
+def _commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _same_label(g: nx.MultiDiGraph, label: str, count: int, seed: int) -> list[str]:
+    uuids = [u for u, n in g.nodes.data("node") if n.label == label]
+    return random.Random(seed).sample(uuids, min(count, len(uuids)))
+
+
+def run(models: int, spec: ModelSpec, nodes: int, repeat: int, seed: int) -> dict:
+    neo4j_graph = make_neo4j_graph(models, spec, seed)
+    g = graph.neo4j_to_networkx(neo4j_graph)
+
+    # the nodes compared and merged, like a user selecting them in the UI
+    selected = _same_label(g, "Species", nodes, seed)
+
+    results = {
+        "Node.from_neo4j": measure(
+            lambda _: [Node.from_neo4j(n) for n in neo4j_graph.nodes], repeat=repeat
+        ),
+        "neo4j_to_networkx": measure(
+            lambda _: graph.neo4j_to_networkx(neo4j_graph), repeat=repeat
+        ),
+        "calc_similarity": measure(
+            lambda _: graph.calc_similarity(g, selected), repeat=repeat
+        ),
+        # merging changes the graph, so every run gets a fresh copy
+        "merge_nodes": measure(
+            lambda copy: graph.merge_nodes(copy, selected),
+            setup=g.copy,
+            repeat=repeat,
+        ),
+        "get_identifier_frequency": measure(
+            lambda _: graph.get_identifier_frequency(g), repeat=repeat
+        ),
+        "Graph.from_graph": measure(
+            lambda _: api_models.Graph.from_graph(g), repeat=repeat
+        ),
+        "dump_graph": measure(lambda _: api_models.dump_graph(g), repeat=repeat),
+    }
+
+    return {
+        "meta": {
+            "commit": _commit(),
+            "python": platform.python_version(),
+            "models": models,
+            "nodes": g.number_of_nodes(),
+            "relationships": g.number_of_edges(),
+            "selected": len(selected),
+            "repeat": repeat,
+            "seed": seed,
+            **spec.as_dict(),
+        },
+        "results": results,
+    }
+
+
+def compare(old: dict, new: dict):
+    """Print the change in median time of every benchmark"""
+    print(f"{'benchmark':<28}{'old (ms)':>12}{'new (ms)':>12}{'change':>10}")
+    for name, result in new["results"].items():
+        if name not in old["results"]:
+            continue
+        before = old["results"][name]["median"] * 1e3
+        after = result["median"] * 1e3
+        print(f"{name:<28}{before:>12.2f}{after:>12.2f}{after / before - 1:>+10.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--models", type=int, default=20)
+    parser.add_argument("--species", type=int, default=100)
+    parser.add_argument("--reactions", type=int, default=150)
+    parser.add_argument("--identifiers", type=int, default=2)
+    parser.add_argument("--vocabulary", type=int, default=1000)
+    parser.add_argument("--nodes", type=int, default=50, help="nodes to compare/merge")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="file to write the results to")
+    parser.add_argument("--compare", help="results of an earlier run to compare to")
+    args = parser.parse_args()
+
+    spec = ModelSpec(args.species, args.reactions, args.identifiers, args.vocabulary)
+    results = run(args.models, spec, args.nodes, args.repeat, args.seed)
+
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    else:
+        print(json.dumps(results, indent=2))
+
+    if args.compare is not None:
+        with open(args.compare) as f:
+            compare(json.load(f), results)
+
+
+if __name__ == "__main__":
+    main()
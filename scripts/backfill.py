@@ -0,0 +1,21 @@
+#!/usr/bin/env python3
+
+from biograph import database, similarity
+
+
+def main():
+    cfg = database.Config.get()
+
+    with database.Database(cfg) as db, db.rw_session() as session:
+        count = database.create_indexes(session)
+        print(f"Added the Entity label to {count} nodes")
+
+        count = database.backfill_identifiers(session)
+        print(f"Stored identifiers for {count} nodes")
+
+        count = similarity.backfill_sketches(session)
+        print(f"Stored similarity sketches for {count} models")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,15 @@
+#!/usr/bin/env python3
+
+from biograph import database
+
+
+def main():
+    cfg = database.Config.get()
+
+    with database.Database(cfg) as db, db.rw_session() as session:
+        database.create_indexes(session)
+        print("Created constraints and indexes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+
+import argparse
+import sys
+
+from biograph import neo4jsbml
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Import SBML files, directories of SBML files, or zip/tar archives of SBML files"
+    )
+    parser.add_argument("paths", nargs="+")
+    parser.add_argument(
+        "--schema", help="Arrows schema to use instead of the configured one"
+    )
+    args = parser.parse_args()
+
+    schema = None
+    if args.schema is not None:
+        with open(args.schema) as f:
+            schema = f.read()
+
+    # files are read one at a time as they are imported
+    total = neo4jsbml.count_sbml_paths(args.paths)
+    print(f"Importing {total} SBML files")
+
+    try:
+        result = neo4jsbml.import_batch(
+            neo4jsbml.read_sbml_paths(args.paths),
+            schema,
+            total,
+            lambda p: print(f"\r{p:.0%}", end="", file=sys.stderr),
+        )
+        print(file=sys.stderr)
+    finally:
+        neo4jsbml.close_pool()
+
+    print(f"Imported {len(result.imported)} SBML files")
+    for name, error in result.failed.items():
+        print(f"Failed to import {name}: {error}")
+
+    if result.failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+import asyncio
+import re
+from types import SimpleNamespace
+
+import neo4j
+from neo4j._codec.hydration.v1.hydration_handler import _GraphHydrator
+
+from biograph import async_database
+
+# (element id, labels, properties)
+NODES = [
+    ("n1", {"Model", "Entity"}, {"uuid": "m", "name": "model"}),
+    ("n2", {"Species", "Entity"}, {"uuid": "s", "name": "species"}),
+]
+# (element id, type, start, end, properties)
+RELATIONSHIPS = [("r1", "HAS_SPECIES", "n1", "n2", {"uuid": "e"})]
+
+
+class FakeResult:
+    def __init__(self, q: str, records: list[neo4j.Record]) -> None:
+        self.q = q
+        self.records = records
+
+    async def __aiter__(self):
+        for record in self.records:
+            yield record
+
+    async def data(self):
+        return [record.data() for record in self.records]
+
+    async def value(self):
+        return [record.value() for record in self.records]
+
+    async def consume(self):
+        return SimpleNamespace(
+            query=self.q,
+            result_available_after=0,
+            result_consumed_after=0,
+            profile=None,
+            plan=None,
+        )
+
+
+class FakeSession:
+    """Answers `MATCH (n) RETURN n`, `MATCH (a)-[r]->(b) RETURN ...` (optionally by
+    uuid) and `CALL db.relationshipTypes()` like the server, with the records
+    hydrated by the driver"""
+
+    async def run(self, q: str, params=None):
+        # one hydrator per result, like the driver
+        hydrator = _GraphHydrator()
+        nodes = {
+            element_id: (i, labels, properties)
+            for i, (element_id, labels, properties) in enumerate(NODES)
+        }
+
+        def node(element_id: str):
+            i, labels, properties = nodes[element_id]
+            return hydrator.hydrate_node(i, labels, properties, element_id)
+
+        columns = [c.strip() for c in re.split(r"RETURN", q)[-1].split(",")]
+        records = []
+        if "db.relationshipTypes()" in q:
+            types = sorted({typ for _, typ, _, _, _ in RELATIONSHIPS})
+            records = [neo4j.Record({"relationshipType": typ}) for typ in types]
+        elif "-[r" in q:
+            for i, (element_id, typ, start, end, properties) in enumerate(
+                RELATIONSHIPS
+            ):
+                if "$uuid" in q and (
+                    properties["uuid"] != params["uuid"] or f"`{typ}`" not in q
+                ):
+                    continue
+                values = {
+                    "r": lambda: hydrator.hydrate_relationship(
+                        i,
+                        nodes[start][0],
+                        nodes[end][0],
+                        typ,
+                        properties,
+                        element_id,
+                        start,
+                        end,
+                    ),
+                    "a": lambda: node(start),
+                    "b": lambda: node(end),
+                }
+                records.append(
+                    neo4j.Record(zip(columns, [values[c]() for c in columns]))
+                )
+        else:
+            records = [neo4j.Record({"n": node(element_id)}) for element_id in nodes]
+        return FakeResult(q, records)
+
+
+def test_stream_all():
+    async def run():
+        return [e async for e in async_database.stream_all(FakeSession())]
+
+    entities = asyncio.run(run())
+    assert [n.uuid for n in entities[:2]] == ["m", "s"]
+    (edge,) = entities[2:]
+    assert (edge.uuid, edge.start_node, edge.end_node) == ("e", "m", "s")
+
+
+def test_get_relationship():
+    async def run():
+        return await async_database.get_relationship(FakeSession(), "e")
+
+    edge = asyncio.run(run())
+    assert (edge.uuid, edge.typ, edge.start_node, edge.end_node) == (
+        "e",
+        "HAS_SPECIES",
+        "m",
+        "s",
+    )
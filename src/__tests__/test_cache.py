@@ -0,0 +1,50 @@
+import asyncio
+
+from biograph.cache import LRUCache, cached, generation
+
+
+def test_lru_eviction():
+    cache = LRUCache[str, int](2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+
+    # "b" is now the least recently used entry
+    cache.put("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+
+    stats = cache.stats()
+    assert stats.size == 2
+    assert stats.hits == 3
+    assert stats.misses == 1
+    assert stats.evictions == 1
+
+
+def test_lru_expiry():
+    cache = LRUCache[str, int](2, ttl=-1)
+    cache.put("a", 1)
+    assert cache.get("a") is None
+
+    stats = cache.stats()
+    assert stats.size == 0
+    assert stats.expirations == 1
+
+
+def test_cached_generation():
+    calls = 0
+
+    async def fetch():
+        nonlocal calls
+        calls += 1
+        return calls
+
+    async def run():
+        assert await cached(("test",), fetch) == 1
+        assert await cached(("test",), fetch) == 1
+        # a write makes the cached result stale
+        generation.bump()
+        assert await cached(("test",), fetch) == 2
+
+    asyncio.run(run())
@@ -0,0 +1,22 @@
+from biograph import clustering
+
+
+def test_find_clusters():
+    model_identifiers = {
+        "a": {"x", "y", "z", "common"},
+        "b": {"x", "y", "z", "common"},
+        "c": {"x", "y", "w", "common"},
+        "d": {"p", "q", "common"},
+        "e": {"p", "q", "r", "common"},
+        "f": {"s", "common"},
+    }
+
+    # "common" is shared by every model, so it is skipped when blocking
+    blocks = clustering.blocks(model_identifiers, max_block_size=5)
+    pairs = clustering.candidate_pairs(blocks)
+    assert pairs[("a", "b")] == 3
+    assert ("a", "f") not in pairs
+
+    g = clustering.similarity_graph(model_identifiers, 0.4, max_block_size=5)
+    assert clustering.find_clusters(g, "cliques") == [["a", "b", "c"], ["d", "e"]]
+    assert clustering.find_clusters(g, "communities") == [["a", "b", "c"], ["d", "e"]]
@@ -1,8 +1,14 @@
+import json
+
 import pytest
 from fastapi.testclient import TestClient
 from neo4j import GraphDatabase
 import urllib.parse
 import subprocess
+import time
+
+from biograph import backend
+from biograph.routes import model as model_routes
 
 # Import actual main module from the source code
 from . import main
@@ -15,6 +21,24 @@ AUTH = ("neoj4", "12345678")
 client = TestClient(main.api)
 
 
+@pytest.fixture(scope="session", autouse=True)
+def lifespan():
+    # run the app lifespan so the shared database driver is created
+    with client:
+        yield
+
+
+def wait_for_job(response):
+    """Wait for the job started by a request to finish, and return it"""
+    assert response.status_code == 200, response.json()
+    job_id = response.json()["id"]
+    while True:
+        job = client.get(f"/jobs/{job_id}").json()
+        if job["status"] in ("done", "failed"):
+            return job
+        time.sleep(0.1)
+
+
 @pytest.fixture()
 def query():
     def inner(q: str):
@@ -36,7 +60,7 @@ def database_fixure():
 def model(database_fixure):
     with open("./tests/models/Malkov2020.xml", "rb") as file:
         response = client.post("/model/upload", files={"file": file})
-        assert response.status_code == 200, response.json()
+        assert wait_for_job(response)["status"] == "done"
 
 
 def test_schema():
@@ -51,6 +75,22 @@ def test_query(query, model):
     assert len(data) == 23
 
 
+def test_query_truncated(model):
+    q = urllib.parse.quote_plus("MATCH (n) RETURN n")
+    response = client.get(f"/query/raw?q={q}&limit=5")
+    assert response.status_code == 200, response.json()
+    assert response.headers["x-truncated"] == "rows"
+    assert len(response.json()) == 5
+
+    response = client.get(
+        f"/query/raw?q={q}&limit=5", headers={"Accept": "application/x-ndjson"}
+    )
+    assert response.status_code == 200, response.text
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert len([line for line in lines if "row" in line]) == 5
+    assert lines[-1] == {"truncated": "rows"}
+
+
 def test_query_by_node(model):
     response = client.get(
         "/model/by-node?label=Reaction&property=name&value=Exposed_To_Infected"
@@ -68,15 +108,82 @@ def test_fetch(model):
     assert len(obj["nodes"]) == 23
 
 
+def test_fetch_etag(model):
+    response = client.get("/model/all")
+    assert response.status_code == 200, response.json()
+    etag = response.headers["etag"]
+
+    response = client.get("/model/all", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+
+
+def test_node_pages(model):
+    response = client.get("/node/all?limit=10")
+    assert response.status_code == 200, response.json()
+    assert response.headers["x-total-count"] == "23"
+    page = response.json()
+    assert len(page) == 10
+
+    response = client.get(f"/node/all?limit=100&after={page[-1]['id']}")
+    assert response.status_code == 200, response.json()
+    rest = response.json()
+    assert len(rest) == 13
+    assert not {n["id"] for n in page} & {n["id"] for n in rest}
+
+    for limit in (0, backend.MAX_PAGE_SIZE + 1):
+        response = client.get(f"/node/all?limit={limit}")
+        assert response.status_code == 422
+        response = client.get(f"/relationship/all?limit={limit}")
+        assert response.status_code == 422
+
+
+def test_fetch_ndjson(model):
+    response = client.get("/model/all", headers={"Accept": "application/x-ndjson"})
+    assert response.status_code == 200, response.text
+    assert response.headers["content-type"] == "application/x-ndjson"
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert len([line for line in lines if "node" in line]) == 23
+
+    relationships = client.get("/model/all").json()["relationships"]
+    streamed = [line["relationship"] for line in lines if "relationship" in line]
+    assert len(relationships) > 0
+    assert sorted(r["id"] for r in streamed) == sorted(r["id"] for r in relationships)
+
+
 def test_upload(model):
+    # cache the graph before the upload
+    before = client.get("/model/all")
+    assert before.status_code == 200, before.json()
+
     with open("./tests/models/Hou2020.xml", "rb") as file:
         response = client.post("/model/upload", files={"file": file})
 
-        assert response.status_code == 200, response.json()
+        assert wait_for_job(response)["status"] == "done"
+
+    # the upload is visible as soon as its job is done, not after the cache expires
+    response = client.get(
+        "/model/all", headers={"If-None-Match": before.headers["etag"]}
+    )
+    assert response.status_code == 200
+    assert len(response.json()["nodes"]) > len(before.json()["nodes"])
 
 
 def test_bad_upload(model):
     with open("./src/biograph/config.py", "rb") as file:
         response = client.post("/model/upload", files={"file": file})
 
-        assert response.status_code == 500, response.json()
+        assert wait_for_job(response)["status"] == "failed"
+
+
+def test_similar_bounds(model):
+    model_uuid = client.get("/model/all").json()["nodes"][0]["id"]
+    for k in (0, -1, model_routes.MAX_SIMILAR_MODELS + 1):
+        response = client.get(f"/model/{model_uuid}/similar?k={k}")
+        assert response.status_code == 422
+
+
+def test_metrics(model):
+    client.get("/model/all")
+    response = client.get("/metrics")
+    assert response.status_code == 200, response.text
+    assert 'route="/model/all"' in response.text
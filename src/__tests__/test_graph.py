@@ -0,0 +1,46 @@
+import json
+import random
+
+import networkx as nx
+
+from biograph import api_models, graph
+from biograph.edges import Edge
+from biograph.nodes import Node
+
+LABELS = ["Species", "Reaction", "Compartment"]
+TYPES = ["IS_REACTANT", "HAS_PRODUCT", "IN_COMPARTMENT"]
+
+
+def random_graph(seed: int, nodes: int = 30, edges: int = 120) -> nx.MultiDiGraph:
+    rng = random.Random(seed)
+    g = nx.MultiDiGraph()
+    for i in range(nodes):
+        g.add_node(str(i), node=Node(str(i), rng.choice(LABELS), {}))
+    for i in range(edges):
+        a = str(rng.randrange(nodes))
+        b = str(rng.randrange(nodes))
+        edge = Edge(f"e{i}", rng.choice(TYPES), a, b, {})
+        g.add_edge(a, b, key=edge.uuid, edge=edge)
+    return g
+
+
+def test_similarity_matrix_matches_pairwise():
+    for seed in range(5):
+        g = random_graph(seed)
+        uuids = [n for n in g.nodes if g.degree(n) > 0]
+
+        matrix = graph.similarity_matrix(g, uuids)
+
+        for i, a in enumerate(uuids):
+            for j, b in enumerate(uuids):
+                assert matrix[i, j] == graph._calc_similarity(g, a, b)
+
+
+def test_dump_graph_matches_model():
+    for seed in range(3):
+        g = random_graph(seed)
+        for i, (_, n) in enumerate(g.nodes.data("node")):
+            n.properties["name"] = f'node "{i}" é'
+
+        expected = api_models.Graph.from_graph(g).model_dump()
+        assert json.loads(api_models.dump_graph(g)) == expected
@@ -0,0 +1,56 @@
+import asyncio
+
+import networkx as nx
+
+from biograph import graph
+from biograph.edges import Edge
+from biograph.memory_database import MemoryDatabase, MemoryStore
+from biograph.nodes import Node
+
+
+def model_graph(model: str, species: list[tuple[str, str]]) -> nx.MultiDiGraph:
+    """A model with species annotated with the given identifiers"""
+    g = nx.MultiDiGraph()
+    g.add_node(model, node=Node(model, "Model", {"name": model}))
+    for uuid, identifier in species:
+        g.add_node(uuid, node=Node(uuid, "Species", {"name": uuid}, [identifier]))
+        edge = Edge(f"{model}-{uuid}", "HAS_SPECIES", model, uuid, {})
+        g.add_edge(model, uuid, key=edge.uuid, edge=edge)
+    return g
+
+
+def test_memory_database():
+    db = MemoryDatabase(MemoryStore())
+
+    async def run():
+        db.store.add_graph(model_graph("m1", [("a", "x"), ("b", "y")]))
+        db.store.add_graph(model_graph("m2", [("c", "x")]))
+
+        model = await db.get_model("m1")
+        assert set(model) == {"m1", "a", "b"}
+        assert model.number_of_edges() == 2
+        assert set(await db.get_model_by_name("m2")) == {"m2", "c"}
+        assert set(await db.get_model_by_node_uuid("b")) == {"m1", "a", "b"}
+
+        assert set(await db.get_subgraphs_by_identifier("x")) == {"m1", "a", "m2", "c"}
+        assert await db.get_model_identifiers() == {"m1": {"x", "y"}, "m2": {"x"}}
+
+        # pages in uuid order
+        page = await db.get_nodes(2)
+        assert [n.uuid for n in page] == ["a", "b"]
+        page = await db.get_nodes(2, after="b")
+        assert [n.uuid for n in page] == ["c", "m1"]
+        assert await db.count_nodes() == 5
+
+        # writing a merge plan removes the merged nodes and moves their relationships
+        g = await db.get_subgraphs_by_uuids(["a", "c"])
+        plan = graph.merge_nodes(g, ["a", "c"])
+        await db.write_merge_plan(plan)
+        assert await db.count_nodes() == 4
+        assert set(await db.get_model("m2")) == set(await db.get_model("m1"))
+
+        await db.delete_all()
+        assert await db.count_nodes() == 0
+        assert await db.count_relationships() == 0
+
+    asyncio.run(run())
@@ -0,0 +1,47 @@
+import asyncio
+
+from biograph import jobs, metrics
+
+
+def test_histogram_render():
+    h = metrics.Histogram("test_seconds", "Test histogram", ("stage",), (0.1, 1.0))
+    h.observe(0.05, "a")
+    h.observe(0.5, "a")
+    h.observe(5.0, "a")
+
+    lines = list(h.render())
+    assert 'test_seconds_bucket{stage="a",le="0.1"} 1' in lines
+    assert 'test_seconds_bucket{stage="a",le="1.0"} 2' in lines
+    assert 'test_seconds_bucket{stage="a",le="+Inf"} 3' in lines
+    assert 'test_seconds_count{stage="a"} 3' in lines
+
+
+def test_span_outside_request():
+    with metrics.span("test"):
+        pass
+    assert any('stage="test"' in line for line in metrics.STAGE_DURATION.render())
+
+
+def test_span_in_job():
+    async def work(job: jobs.Job):
+        with metrics.span("job-test"):
+            pass
+        # like the CPU-bound parts of jobs, which copy the context into the thread
+        await asyncio.to_thread(metrics.observe, "job-thread-test", 0.01)
+
+    async def run():
+        # submitted from a request, which has already finished by the time the job runs
+        request = metrics.RequestTimings()
+        token = metrics._current.set(request)
+        job = jobs.submit("test", work)
+        metrics._current.reset(token)
+
+        while job.finished is None:
+            await asyncio.sleep(0.01)
+        assert job.status == "done"
+        assert request.stages == {}
+
+    asyncio.run(run())
+    lines = list(metrics.JOB_STAGE_DURATION.render())
+    assert any('kind="test",stage="job-test"' in line for line in lines)
+    assert any('kind="test",stage="job-thread-test"' in line for line in lines)
@@ -0,0 +1,21 @@
+import json
+
+import neo4j.time
+
+from biograph import ndjson
+
+
+def test_encode_row():
+    row = {
+        "n": 1,
+        "values": [1.5, None, "x"],
+        "map": {"k": True},
+        "created": neo4j.time.DateTime(2024, 1, 2, 3, 4, 5),
+    }
+    line = ndjson.encode_row(row)
+    assert line.endswith(b"}\n")
+    assert json.loads(line) == {
+        "row": {**row, "created": "2024-01-02T03:04:05.000000000"}
+    }
+
+    assert json.loads(ndjson.encode_truncated("rows")) == {"truncated": "rows"}
@@ -0,0 +1,76 @@
+import io
+import tarfile
+import zipfile
+
+from biograph import memory_database, neo4jsbml, similarity
+
+
+def zip_archive(files: dict[str, bytes]) -> bytes:
+    f = io.BytesIO()
+    with zipfile.ZipFile(f, "w") as z:
+        for name, data in files.items():
+            z.writestr(name, data)
+    return f.getvalue()
+
+
+def tar_archive(files: dict[str, bytes]) -> bytes:
+    f = io.BytesIO()
+    with tarfile.open(fileobj=f, mode="w:gz") as tar:
+        for name, data in files.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+    return f.getvalue()
+
+
+def test_read_sbml_files():
+    files = {"a.xml": b"<a/>", "readme.txt": b"text", "models/b.sbml": b"<b/>"}
+    expected = [("up/a.xml", b"<a/>"), ("up/models/b.sbml", b"<b/>")]
+
+    for archive in (zip_archive(files), tar_archive(files)):
+        assert list(neo4jsbml.read_sbml_files("up", archive)) == expected
+        assert neo4jsbml.count_sbml_files("up", archive) == 2
+
+    assert list(neo4jsbml.read_sbml_files("c.xml", b"<c/>")) == [("c.xml", b"<c/>")]
+
+
+def test_import_batch_not_utf8():
+    try:
+        result = neo4jsbml.import_batch([("bad.xml", b"<sbml>\xff</sbml>")], None, 1)
+    finally:
+        neo4jsbml.close_pool()
+
+    assert result.imported == []
+    assert list(result.failed) == ["bad.xml"]
+
+
+def test_import_pool(monkeypatch):
+    # everything crossing the process boundary has to pickle, the graphs of the
+    # memory backend are sent back to this process
+    store = memory_database.MemoryStore()
+    monkeypatch.setattr(memory_database, "store", store)
+    monkeypatch.setattr(similarity, "index", similarity.LSHIndex())
+    monkeypatch.setattr(neo4jsbml, "_pool", neo4jsbml.ImportPool(2, 1, "memory"))
+
+    stages: list[str] = []
+    try:
+        neo4jsbml.get_pool().submit(
+            open("./tests/models/Malkov2020.xml").read(), None, stages.append
+        ).result()
+        result = neo4jsbml.import_batch(
+            neo4jsbml.read_sbml_paths(["./tests/models"]), None
+        )
+    finally:
+        neo4jsbml.close_pool()
+
+    # all stages are reported before the import is done
+    assert stages == ["parse", "map nodes", "map relationships", "write"]
+    # doesn't validate against the SBML schema
+    assert list(result.failed) == ["./tests/models/BIOMD0000001077.xml"]
+    assert len(result.imported) == neo4jsbml.count_sbml_paths(["./tests/models"]) - 1
+
+    # Malkov2020 was imported twice
+    models = store.labels["Model"]
+    assert len(models) == len(result.imported) + 1
+    for model_uuid in models:
+        assert similarity.index.get(model_uuid) is not None
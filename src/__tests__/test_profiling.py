@@ -0,0 +1,70 @@
+from types import SimpleNamespace
+
+from biograph import profiling
+
+
+def test_template():
+    assert (
+        profiling.template("PROFILE MATCH (n:Model {name: 'a b'})\n  RETURN n LIMIT 10")
+        == "MATCH (n:Model {name: ?}) RETURN n LIMIT ?"
+    )
+    assert profiling.template("MATCH (n {uuid: $uuid}) RETURN n") == (
+        "MATCH (n {uuid: $uuid}) RETURN n"
+    )
+
+
+def test_sampled(monkeypatch):
+    monkeypatch.setattr(
+        profiling.Config, "get", classmethod(lambda cls: cls(sample_rate=1.0))
+    )
+
+    assert profiling.sampled("MATCH (n) RETURN n") == "PROFILE MATCH (n) RETURN n"
+    assert profiling.sampled("CREATE (n:Model)") == "PROFILE CREATE (n:Model)"
+    assert (
+        profiling.sampled("// all\nCYPHER runtime=slotted MATCH (n) RETURN n")
+        == "// all\nCYPHER runtime=slotted PROFILE MATCH (n) RETURN n"
+    )
+    for q in [
+        "CREATE INDEX model_name IF NOT EXISTS FOR (n:Model) ON (n.name)",
+        "SHOW FULLTEXT INDEXES",
+        "CREATE FULLTEXT INDEX identifiers IF NOT EXISTS FOR (n:Entity) ON EACH [n.identifiers]",
+        "DROP INDEX identifiers IF EXISTS",
+        "EXPLAIN MATCH (n) RETURN n",
+        "CYPHER 5 PROFILE MATCH (n) RETURN n",
+    ]:
+        assert profiling.sampled(q) == q
+
+    assert profiling.template("CYPHER 5 PROFILE MATCH (n) RETURN n") == (
+        "CYPHER ? MATCH (n) RETURN n"
+    )
+
+
+def test_record():
+    profiling.reset()
+
+    def summary(q: str, available: int, profile=None):
+        return SimpleNamespace(
+            query=q,
+            result_available_after=available,
+            result_consumed_after=1,
+            profile=profile,
+            plan=None,
+        )
+
+    profiling.record(summary("MATCH (n) RETURN n LIMIT 1", 5), rows=1)
+    profiling.record(summary("MATCH (n) RETURN n LIMIT 2", 7), rows=2)
+    profiling.record(
+        summary(
+            "PROFILE MATCH (m) RETURN m",
+            1,
+            {"dbHits": 3, "children": [{"dbHits": 4}]},
+        )
+    )
+
+    first, second = profiling.top()
+    assert first.template == "MATCH (n) RETURN n LIMIT ?"
+    assert first.count == 2
+    assert first.rows == 3
+    assert first.total_ms == 14
+    assert second.profiled == 1
+    assert second.db_hits == 7
@@ -0,0 +1,47 @@
+import asyncio
+import time
+
+import networkx as nx
+from fastapi import Request
+
+from biograph import snapshots
+from biograph.cache import LRUCache
+from biograph.nodes import Node
+
+
+def request(etag: str | None = None) -> Request:
+    headers = [(b"if-none-match", etag.encode())] if etag else []
+    return Request({"type": "http", "method": "GET", "headers": headers})
+
+
+def model_graph(name: str) -> nx.MultiDiGraph:
+    g = nx.MultiDiGraph()
+    g.add_node("m", node=Node("m", "Model", {"name": name}))
+    return g
+
+
+def test_not_modified_expires(monkeypatch):
+    snapshot_cache = LRUCache(4, 0.05)
+    monkeypatch.setattr(snapshots, "_snapshot_cache", lambda: snapshot_cache)
+
+    # stands in for a write made by another process, which doesn't bump the generation here
+    graphs = [model_graph("a"), model_graph("b")]
+
+    async def build():
+        return graphs[0]
+
+    async def run():
+        response = await snapshots.response(request(), ("all",), build)
+        assert response.status_code == 200
+        etag = response.headers["etag"]
+
+        response = await snapshots.response(request(etag), ("all",), build)
+        assert response.status_code == 304
+
+        graphs.pop(0)
+        time.sleep(0.1)
+        response = await snapshots.response(request(etag), ("all",), build)
+        assert response.status_code == 200
+        assert response.headers["etag"] != etag
+
+    asyncio.run(run())
@@ -0,0 +1,71 @@
+from collections import Counter
+
+import networkx as nx
+import pytest
+
+from biograph import database, neo4jsbml
+
+# needs the database configured in config/neo4j.yml, like test_fastapi
+
+
+@pytest.fixture(scope="module")
+def db():
+    db = database.Database(database.Config.get())
+    with db.rw_session() as session:
+        database.create_indexes(session)
+    yield db
+    db.close()
+
+
+def canonical(g: nx.MultiDiGraph) -> tuple[Counter, Counter]:
+    """The nodes and relationships of a graph, without their uuids"""
+
+    def key(node_uuid: str) -> tuple:
+        node = g.nodes[node_uuid]["node"]
+        return (
+            node.label,
+            tuple(sorted(node.properties.items())),
+            tuple(sorted(node.identifiers)),
+        )
+
+    nodes = Counter(key(n) for n in g)
+    relationships = Counter(
+        (e.typ, tuple(sorted(e.properties.items())), key(a), key(b))
+        for a, b, e in g.edges.data("edge")
+    )
+    return nodes, relationships
+
+
+def write(db: database.Database, method: str, xml: str) -> nx.MultiDiGraph:
+    """Write a model with the given write method and read it back"""
+    model = neo4jsbml.prepare(xml, neo4jsbml.load_schema(neo4jsbml.configured_schema()))
+    if method == "native":
+        sketches = neo4jsbml.write_native(db, model)
+    else:
+        conn = neo4jsbml.connect_neo4j()
+        try:
+            sketches = neo4jsbml.write(conn, model)
+        finally:
+            conn.driver.close()
+
+    (model_uuid,) = sketches
+    with db.rw_session() as session:
+        g = database.get_model(session, model_uuid)
+        database.query(
+            session,
+            "UNWIND $uuids AS uuid MATCH (n:Entity {uuid: uuid}) DETACH DELETE n",
+            {"uuids": list(g)},
+        )
+    return g
+
+
+@pytest.mark.parametrize("name", ["Malkov2020.xml", "Hou2020.xml"])
+def test_write_methods_agree(db, name):
+    with open(f"./tests/models/{name}") as f:
+        xml = f.read()
+
+    native = write(db, "native", xml)
+    expected = write(db, "neo4jsbml", xml)
+
+    assert native.number_of_nodes() > 0
+    assert canonical(native) == canonical(expected)
@@ -1,9 +1,13 @@
 import logging
+from typing import Any
 
 import networkx as nx
+import orjson
+from fastapi import Response
 from pydantic import BaseModel
 
-from . import nodes, edges
+from . import edges, jobs, metrics, nodes
+from .clustering import ClusterMethod
 
 logger = logging.getLogger(__name__)
 
@@ -53,12 +57,63 @@ class Graph(BaseModel):
     relationships: list[Relationship]
 
     @classmethod
+    @metrics.timed("from_graph")
     def from_graph(cls, g: nx.MultiDiGraph):
-        nodes = [Node.from_node(n) for _, n in g.nodes.data("node")]
+        # endpoints of relationships whose nodes weren't read have no node data
+        nodes = [Node.from_node(n) for _, n in g.nodes.data("node") if n is not None]
         relationships = [Relationship.from_edge(e) for _, _, e in g.edges.data("edge")]
         return cls(nodes=nodes, relationships=relationships)
 
 
+# large graphs are serialized straight from the internal nodes and relationships,
+# without building and validating a model per element - the output is the same
+# as the models above
+
+
+def node_dict(node: nodes.Node) -> dict[str, Any]:
+    """The JSON of a Node, as a dict"""
+    return {
+        "id": node.uuid,
+        "label": node.label,
+        "properties": node.properties,
+        "identifiers": node.identifiers,
+    }
+
+
+def relationship_dict(edge: edges.Edge) -> dict[str, Any]:
+    """The JSON of a Relationship, as a dict"""
+    return {
+        "id": edge.uuid,
+        "type": edge.typ,
+        "start_node": edge.start_node,
+        "end_node": edge.end_node,
+        "properties": edge.properties,
+    }
+
+
+@metrics.timed("json")
+def dump_graph(g: nx.MultiDiGraph) -> bytes:
+    """Serialize a graph as the JSON of a Graph"""
+    return orjson.dumps(
+        {
+            "nodes": [node_dict(n) for _, n in g.nodes.data("node") if n is not None],
+            "relationships": [relationship_dict(e) for _, _, e in g.edges.data("edge")],
+        }
+    )
+
+
+class GraphResponse(Response):
+    """A response with a body serialized by dump_graph"""
+
+    media_type = "application/json"
+
+
+class SimilarModelResult(BaseModel):
+    uuid: str
+    # estimated Jaccard similarity of the models' features, between 0 and 1
+    similarity: float
+
+
 class MergeNodesInput(BaseModel):
     uuids: list[str]
     apply: bool = False
@@ -68,6 +123,48 @@ class CalculateSimilarityInput(BaseModel):
     uuids: list[str]
 
 
+class SimilarityMatrixResult(BaseModel):
+    uuids: list[str]
+    # scores[i][j] is the similarity of uuids[i] to uuids[j]
+    scores: list[list[float]]
+
+
 class IdentifierFrequencyResult(BaseModel):
     identifier: str
     frequency: int
+
+
+class FindClustersInput(BaseModel):
+    method: ClusterMethod = "communities"
+    # minimum Jaccard similarity of the models' identifiers for them to be linked
+    threshold: float = 0.5
+    # identifiers shared by more models than this are ignored
+    max_block_size: int = 100
+
+
+class BatchImportResult(BaseModel):
+    imported: list[str]
+    # error message of each file that failed to import, by name
+    failed: dict[str, str]
+
+
+class Job(BaseModel):
+    id: str
+    kind: str
+    status: str
+    stage: str | None
+    progress: float
+    result: Any = None
+    error: str | None = None
+
+    @classmethod
+    def from_job(cls, job: jobs.Job):
+        return cls(
+            id=job.id,
+            kind=job.kind,
+            status=job.status,
+            stage=job.stage,
+            progress=job.progress,
+            result=job.result,
+            error=job.error,
+        )
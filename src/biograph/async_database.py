@@ -0,0 +1,880 @@
+import asyncio
+import logging
+import time
+import typing
+from collections.abc import (
+    AsyncGenerator,
+    AsyncIterable,
+    AsyncIterator,
+    Callable,
+    Iterator,
+)
+from typing import Any, LiteralString, cast
+
+import neo4j
+import neo4j.graph
+import networkx as nx
+
+from . import cache, graph, profiling
+from .database import (
+    IDENTIFIER_INDEX,
+    RELATIONSHIP_TYPES_QUERY,
+    Config,
+    entity_label_backfill_query,
+    identifier_index_labels_query,
+    identifier_search_term,
+    log_summary,
+    merge_plan_queries,
+    quote,
+    relationship_by_uuid_query,
+    schema_queries,
+)
+from .edges import Edge
+from .nodes import ENTITY_LABEL, Node
+
+logger = logging.getLogger(__name__)
+
+# CALL clause returning the subgraph reachable from n
+SUBGRAPH_ALL = (
+    "CALL apoc.path.subgraphAll(n, {}) "
+    "YIELD nodes, relationships "
+    "RETURN nodes, relationships"
+)
+
+# async counterparts of the functions in database.py, used by the API routes so
+# that requests are multiplexed on the event loop rather than the threadpool
+
+
+class AsyncDatabase:
+    """Represents an async database connection"""
+
+    def __init__(self, cfg: Config):
+        self.driver = neo4j.AsyncGraphDatabase.driver(
+            cfg.uri,
+            auth=(cfg.username, cfg.password),
+            database=cfg.database,
+            max_connection_pool_size=cfg.max_connection_pool_size,
+            connection_acquisition_timeout=cfg.connection_acquisition_timeout,
+            max_connection_lifetime=cfg.max_connection_lifetime,
+        )
+        self.query_row_limit = cfg.query_row_limit
+        self.query_timeout = cfg.query_timeout
+        self.health_check_interval = cfg.health_check_interval
+
+    async def __aenter__(self):
+        try:
+            await self.verify_connectivity()
+        except:
+            await self.driver.close()
+            raise
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def close(self):
+        await self.driver.close()
+
+    async def verify_connectivity(self):
+        await self.driver.verify_connectivity()
+
+    async def health_check(self):
+        """Periodically check that the database is reachable, logging any failures"""
+        while True:
+            await asyncio.sleep(self.health_check_interval)
+            try:
+                await self.verify_connectivity()
+            except Exception as e:
+                logger.error("Database health check failed: %s", e)
+
+    def session(self, **kwargs) -> neo4j.AsyncSession:
+        return self.driver.session(default_access_mode=neo4j.READ_ACCESS, **kwargs)
+
+    def rw_session(self, **kwargs) -> neo4j.AsyncSession:
+        return self.driver.session(default_access_mode=neo4j.WRITE_ACCESS, **kwargs)
+
+    # the backend.Backend operations, each run in a session of its own
+
+    async def startup(self):
+        async with self.rw_session() as session:
+            await create_indexes(session)
+
+    async def get_model_sketches(self) -> dict[str, list[int]]:
+        async with self.session() as session:
+            return await get_model_sketches(session)
+
+    async def get_graph(self) -> nx.MultiDiGraph:
+        async with self.session() as session:
+            return await get_graph(session)
+
+    async def get_model(self, uuid: str) -> nx.MultiDiGraph:
+        async with self.session() as session:
+            return await get_model(session, uuid)
+
+    async def get_model_by_name(self, name: str) -> nx.MultiDiGraph:
+        async with self.session() as session:
+            return await get_model_by_name(session, name)
+
+    async def get_model_by_node(
+        self, label: str, property: str, value: str
+    ) -> nx.MultiDiGraph:
+        async with self.session() as session:
+            return await get_model_by_node(session, label, property, value)
+
+    async def get_model_by_node_uuid(self, uuid: str) -> nx.MultiDiGraph:
+        async with self.session() as session:
+            return await get_model_by_node_uuid(session, uuid)
+
+    async def get_subgraphs_by_uuids(self, uuids: list[str]) -> nx.MultiDiGraph:
+        async with self.session() as session:
+            return await get_subgraphs_by_uuids(session, uuids)
+
+    async def get_subgraphs_by_identifier(self, identifier: str) -> nx.MultiDiGraph:
+        async with self.session() as session:
+            return await get_subgraphs_by_identifier(session, identifier)
+
+    async def get_model_identifiers(self) -> dict[str, set[str]]:
+        async with self.session() as session:
+            return await get_model_identifiers(session)
+
+    # the session has to stay open until the whole stream has been read
+
+    async def stream_all(self) -> AsyncGenerator[Node | Edge, None]:
+        async with self.session() as session:
+            async for entity in stream_all(session):
+                yield entity
+
+    async def stream_model(self, uuid: str) -> AsyncGenerator[Node | Edge, None]:
+        async with self.session() as session:
+            async for entity in stream_model(session, uuid):
+                yield entity
+
+    async def stream_model_by_name(
+        self, name: str
+    ) -> AsyncGenerator[Node | Edge, None]:
+        async with self.session() as session:
+            async for entity in stream_model_by_name(session, name):
+                yield entity
+
+    async def stream_model_by_node(
+        self, label: str, property: str, value: str
+    ) -> AsyncGenerator[Node | Edge, None]:
+        async with self.session() as session:
+            async for entity in stream_model_by_node(session, label, property, value):
+                yield entity
+
+    async def stream_model_by_node_uuid(
+        self, uuid: str
+    ) -> AsyncGenerator[Node | Edge, None]:
+        async with self.session() as session:
+            async for entity in stream_model_by_node_uuid(session, uuid):
+                yield entity
+
+    async def stream_subgraphs_by_identifier(
+        self, identifier: str
+    ) -> AsyncGenerator[Node | Edge, None]:
+        async with self.session() as session:
+            async for entity in stream_subgraphs_by_identifier(session, identifier):
+                yield entity
+
+    async def get_nodes(
+        self, limit: int | None = None, after: str | None = None
+    ) -> list[Node]:
+        async with self.session() as session:
+            return await get_nodes(session, limit, after)
+
+    async def count_nodes(self) -> int:
+        async with self.session() as session:
+            return await count_nodes(session)
+
+    async def get_node(self, uuid: str) -> Node:
+        async with self.session() as session:
+            return await get_node(session, uuid)
+
+    async def merge_node(self, node: Node):
+        async with self.rw_session() as session:
+            await merge_node(session, node)
+
+    async def delete_node(self, node: Node):
+        async with self.rw_session() as session:
+            await delete_node(session, node)
+
+    async def get_relationships(
+        self, limit: int | None = None, after: str | None = None
+    ) -> list[Edge]:
+        async with self.session() as session:
+            return await get_relationships(session, limit, after)
+
+    async def count_relationships(self) -> int:
+        async with self.session() as session:
+            return await count_relationships(session)
+
+    async def get_relationship(self, uuid: str) -> Edge:
+        async with self.session() as session:
+            return await get_relationship(session, uuid)
+
+    async def merge_relationship(self, edge: Edge):
+        async with self.rw_session() as session:
+            await merge_relationship(session, edge)
+
+    async def delete_relationship(self, edge: Edge):
+        async with self.rw_session() as session:
+            await delete_relationship(session, edge)
+
+    async def delete_all(self):
+        async with self.rw_session() as session:
+            await delete_all(session)
+
+    async def write_merge_plan(self, plan: graph.MergePlan):
+        async with self.rw_session() as session:
+            await write_merge_plan(session, plan)
+
+    def limited_query(self, q: str, limit: int | None) -> "LimitedQuery":
+        """Return a user query with the row cap and timeout applied - a client can only lower the cap"""
+        if limit is None:
+            limit = self.query_row_limit
+        limit = max(0, min(limit, self.query_row_limit))
+        return LimitedQuery(self.session, q, limit, self.query_timeout)
+
+    async def query_limited(
+        self, q: str, limit: int | None
+    ) -> tuple[list[Any], str | None]:
+        """Execute a user query returning arbitrary data, and why it was cut off, if it was"""
+        records = self.limited_query(q, limit)
+        values = [r.data() async for r in records]
+        return values, records.truncated
+
+    async def query_graph_limited(
+        self, q: str, limit: int | None
+    ) -> tuple[nx.MultiDiGraph, str | None]:
+        """Execute a user query returning a graph, and why it was cut off, if it was"""
+        records = self.limited_query(q, limit)
+        entities = [e async for e in stream_entities(records)]
+        return graph.entities_to_networkx(entities), records.truncated
+
+    async def query_nodes_limited(
+        self, q: str, limit: int | None
+    ) -> tuple[list[Node], str | None]:
+        """Execute a user query returning multiple nodes, and why it was cut off, if it was"""
+        records = self.limited_query(q, limit)
+        nodes = [Node.from_neo4j(r.value()) async for r in records]
+        return nodes, records.truncated
+
+    async def query_relationships_limited(
+        self, q: str, limit: int | None
+    ) -> tuple[list[Edge], str | None]:
+        """Execute a user query returning multiple relationships, and why it was cut off, if it was"""
+        records = self.limited_query(q, limit)
+        edges = [Edge.from_neo4j(r.value()) async for r in records]
+        return edges, records.truncated
+
+
+async def query(
+    session: neo4j.AsyncSession,
+    q: str,
+    params: dict[str, typing.Any] | None = None,
+) -> list[Any]:
+    """Execute a query returning arbitrary data"""
+    result = await session.run(profiling.sampled(q), params)
+    values = await result.data()
+
+    summary = await result.consume()
+    log_summary(summary, len(values))
+
+    return values
+
+
+async def query_single(
+    session: neo4j.AsyncSession,
+    q: str,
+    params: dict[str, typing.Any] | None = None,
+) -> Any:
+    """Execute a query returning one object"""
+    result = await session.run(profiling.sampled(q), params)
+    values = (await result.value())[0]
+
+    summary = await result.consume()
+    log_summary(summary)
+
+    return values
+
+
+async def query_graph(
+    session: neo4j.AsyncSession,
+    q: str,
+    params: dict[str, typing.Any] | None = None,
+) -> nx.MultiDiGraph:
+    """Execute a query returning a graph"""
+    result = await session.run(profiling.sampled(q), params)
+    g = await result.graph()
+
+    summary = await result.consume()
+
+    start = time.perf_counter()
+    ret = graph.neo4j_to_networkx(g)
+    log_summary(
+        summary, len(g.nodes) + len(g.relationships), time.perf_counter() - start
+    )
+
+    return ret
+
+
+def _iter_entities(
+    value: Any,
+) -> Iterator[neo4j.graph.Node | neo4j.graph.Relationship]:
+    """Yield all nodes and relationships contained in a record value"""
+    if isinstance(value, (neo4j.graph.Node, neo4j.graph.Relationship)):
+        yield value
+    elif isinstance(value, neo4j.graph.Path):
+        yield from value.nodes
+        yield from value.relationships
+    elif isinstance(value, list):
+        for v in value:
+            yield from _iter_entities(v)
+
+
+async def stream_entities(
+    records: AsyncIterable[neo4j.Record],
+) -> AsyncGenerator[Node | Edge, None]:
+    """Yield each node and relationship contained in the records once, as they are read"""
+    # only the element ids are kept to skip duplicates, the graph itself is never built
+    seen: set[str] = set()
+    async for record in records:
+        for value in record.values():
+            for entity in _iter_entities(value):
+                if entity.element_id in seen:
+                    continue
+                seen.add(entity.element_id)
+
+                if isinstance(entity, neo4j.graph.Node):
+                    yield Node.from_neo4j(entity)
+                else:
+                    yield Edge.from_neo4j(entity)
+
+
+async def stream_graph(
+    session: neo4j.AsyncSession,
+    q: str,
+    params: dict[str, typing.Any] | None = None,
+) -> AsyncGenerator[Node | Edge, None]:
+    """Execute a query returning a graph, yielding each node and relationship as it is read"""
+    result = await session.run(profiling.sampled(q), params)
+
+    n = 0
+    async for entity in stream_entities(result):
+        n += 1
+        yield entity
+
+    summary = await result.consume()
+    log_summary(summary, n)
+
+
+async def stream_relationships(
+    session: neo4j.AsyncSession,
+    q: str,
+    params: dict[str, typing.Any] | None = None,
+) -> AsyncGenerator[Edge, None]:
+    """Execute a query returning a relationship per record, yielding each as it is read"""
+    result = await session.run(profiling.sampled(q), params)
+
+    n = 0
+    async for record in result:
+        n += 1
+        yield Edge.from_neo4j(record.value())
+
+    summary = await result.consume()
+    log_summary(summary, n)
+
+
+##################
+## user queries ##
+##################
+
+# queries sent to /query are arbitrary, so they are run with a row cap and a
+# transaction timeout, and the results are cut off rather than failing outright
+
+
+class LimitedQuery:
+    """A query yielding at most limit records, in a transaction the server terminates after timeout seconds"""
+
+    # why the results were cut off - "rows" or "timeout", or None if they weren't
+    truncated: str | None
+
+    def __init__(
+        self,
+        session: Callable[[], neo4j.AsyncSession],
+        q: str,
+        limit: int,
+        timeout: float,
+        params: dict[str, typing.Any] | None = None,
+    ) -> None:
+        # a session is only opened once the records are iterated over
+        self.session = session
+        # user queries are run as given, never profiled
+        self.query = neo4j.Query(cast(LiteralString, q), timeout=timeout)
+        self.limit = limit
+        self.params = params
+        self.truncated = None
+
+    async def __aiter__(self) -> AsyncIterator[neo4j.Record]:
+        try:
+            async with self.session() as session:
+                result = await session.run(self.query, self.params)
+
+                n = 0
+                async for record in result:
+                    if n == self.limit:
+                        self.truncated = "rows"
+                        break
+                    n += 1
+                    yield record
+
+                # the rest of the result is discarded on the server
+                summary = await result.consume()
+                log_summary(summary, n)
+        except neo4j.exceptions.ClientError as e:
+            if e.code is None or "TransactionTimedOut" not in e.code:
+                raise
+            logger.warning("Query `%s` timed out", self.query.text)
+            self.truncated = "timeout"
+
+
+async def query_node(
+    session: neo4j.AsyncSession,
+    q: str,
+    params: dict[str, typing.Any] | None = None,
+) -> Node:
+    """Execute a query returning a node"""
+    result = await session.run(profiling.sampled(q), params)
+    node = (await result.value())[0]
+
+    summary = await result.consume()
+    log_summary(summary)
+
+    return Node.from_neo4j(node)
+
+
+async def query_nodes(
+    session: neo4j.AsyncSession,
+    q: str,
+    params: dict[str, typing.Any] | None = None,
+) -> list[Node]:
+    """Execute a query returning multiple nodes"""
+    result = await session.run(profiling.sampled(q), params)
+    nodes = await result.value()
+
+    summary = await result.consume()
+    log_summary(summary, len(nodes))
+
+    return [Node.from_neo4j(n) for n in nodes]
+
+
+async def query_relationship(
+    session: neo4j.AsyncSession,
+    q: str,
+    params: dict[str, typing.Any] | None = None,
+) -> Edge:
+    """Execute a query returning a relationship"""
+    result = await session.run(profiling.sampled(q), params)
+    node = (await result.value())[0]
+
+    summary = await result.consume()
+    log_summary(summary)
+
+    return Edge.from_neo4j(node)
+
+
+async def query_relationships(
+    session: neo4j.AsyncSession,
+    q: str,
+    params: dict[str, typing.Any] | None = None,
+) -> list[Edge]:
+    """Execute a query returning multiple relationships"""
+    result = await session.run(profiling.sampled(q), params)
+    nodes = await result.value()
+
+    summary = await result.consume()
+    log_summary(summary, len(nodes))
+
+    return [Edge.from_neo4j(n) for n in nodes]
+
+
+async def get_graph(session: neo4j.AsyncSession) -> nx.MultiDiGraph:
+    """Return all nodes and relationships in the database"""
+    return await query_graph(session, "MATCH (n) OPTIONAL MATCH (n)-[r]-() RETURN n, r")
+
+
+async def get_model(session: neo4j.AsyncSession, uuid: str) -> nx.MultiDiGraph:
+    """Return the entire model specified by the given uuid"""
+    return await query_graph(
+        session,
+        "MATCH (n:Model {uuid: $uuid}) " + SUBGRAPH_ALL,
+        {"uuid": uuid},
+    )
+
+
+async def get_model_by_name(session: neo4j.AsyncSession, name: str) -> nx.MultiDiGraph:
+    """Return all models with the given name"""
+    return await query_graph(
+        session,
+        "MATCH (n:Model {name: $name}) " + SUBGRAPH_ALL,
+        {"name": name},
+    )
+
+
+async def get_model_by_node(
+    session: neo4j.AsyncSession,
+    label: str,
+    property: str,
+    value: str,
+) -> nx.MultiDiGraph:
+    """Return all models containing a node with the given attributes"""
+    if not label.isalnum():
+        raise ValueError("invalid label")
+    if not property.isalnum():
+        raise ValueError("invalid property")
+
+    return await query_graph(
+        session,
+        f"MATCH (n:{label} {{{property}: $value}}) " + SUBGRAPH_ALL,
+        {"label": label, "property": property, "value": value},
+    )
+
+
+async def get_model_by_node_uuid(
+    session: neo4j.AsyncSession, uuid: str
+) -> nx.MultiDiGraph:
+    """Return all models containing the node with the given uuid"""
+    return await query_graph(
+        session,
+        "MATCH (n:Entity {uuid: $uuid}) " + SUBGRAPH_ALL,
+        {"uuid": uuid},
+    )
+
+
+async def get_subgraphs_by_uuids(
+    session: neo4j.AsyncSession, uuids: list[str]
+) -> nx.MultiDiGraph:
+    """Return the nodes with the given uuids and their immediate neighbours"""
+    return await query_graph(
+        session,
+        "UNWIND $uuids AS uuid "
+        "MATCH (n:Entity {uuid: uuid}) "
+        "MATCH (n)-[r]-(m) "
+        "RETURN n, r, m",
+        {"uuids": uuids},
+    )
+
+
+async def get_subgraphs_by_identifier(
+    session: neo4j.AsyncSession, identifier: str
+) -> nx.MultiDiGraph:
+    """Return all nodes with the given identifier and their immediate neighbours"""
+    return await query_graph(
+        session,
+        "CALL db.index.fulltext.queryNodes($index, $term) YIELD node AS n "
+        "MATCH (n)-[r]-(m) "
+        "RETURN n, r, m",
+        {"index": IDENTIFIER_INDEX, "term": identifier_search_term(identifier)},
+    )
+
+
+async def stream_all(
+    session: neo4j.AsyncSession,
+) -> AsyncGenerator[Node | Edge, None]:
+    """Stream all nodes and then all relationships in the database"""
+    # separate directed queries return every entity exactly once,
+    # so there is no need to track duplicates
+    async for node in stream_graph(session, "MATCH (n) RETURN n"):
+        yield node
+    # the endpoints are returned too, so that the relationships' nodes have their uuids
+    async for edge in stream_relationships(
+        session, "MATCH (a)-[r]->(b) RETURN r, a, b"
+    ):
+        yield edge
+
+
+def stream_model(
+    session: neo4j.AsyncSession, uuid: str
+) -> AsyncGenerator[Node | Edge, None]:
+    """Stream the entire model specified by the given uuid"""
+    return stream_graph(
+        session,
+        "MATCH (n:Model {uuid: $uuid}) " + SUBGRAPH_ALL,
+        {"uuid": uuid},
+    )
+
+
+def stream_model_by_name(
+    session: neo4j.AsyncSession, name: str
+) -> AsyncGenerator[Node | Edge, None]:
+    """Stream all models with the given name"""
+    return stream_graph(
+        session,
+        "MATCH (n:Model {name: $name}) " + SUBGRAPH_ALL,
+        {"name": name},
+    )
+
+
+def stream_model_by_node(
+    session: neo4j.AsyncSession,
+    label: str,
+    property: str,
+    value: str,
+) -> AsyncGenerator[Node | Edge, None]:
+    """Stream all models containing a node with the given attributes"""
+    if not label.isalnum():
+        raise ValueError("invalid label")
+    if not property.isalnum():
+        raise ValueError("invalid property")
+
+    return stream_graph(
+        session,
+        f"MATCH (n:{label} {{{property}: $value}}) " + SUBGRAPH_ALL,
+        {"label": label, "property": property, "value": value},
+    )
+
+
+def stream_model_by_node_uuid(
+    session: neo4j.AsyncSession, uuid: str
+) -> AsyncGenerator[Node | Edge, None]:
+    """Stream all models containing the node with the given uuid"""
+    return stream_graph(
+        session,
+        "MATCH (n:Entity {uuid: $uuid}) " + SUBGRAPH_ALL,
+        {"uuid": uuid},
+    )
+
+
+def stream_subgraphs_by_uuids(
+    session: neo4j.AsyncSession, uuids: list[str]
+) -> AsyncGenerator[Node | Edge, None]:
+    """Stream the nodes with the given uuids and their immediate neighbours"""
+    return stream_graph(
+        session,
+        "UNWIND $uuids AS uuid "
+        "MATCH (n:Entity {uuid: uuid}) "
+        "MATCH (n)-[r]-(m) "
+        "RETURN n, r, m",
+        {"uuids": uuids},
+    )
+
+
+def stream_subgraphs_by_identifier(
+    session: neo4j.AsyncSession, identifier: str
+) -> AsyncGenerator[Node | Edge, None]:
+    """Stream all nodes with the given identifier and their immediate neighbours"""
+    return stream_graph(
+        session,
+        "CALL db.index.fulltext.queryNodes($index, $term) YIELD node AS n "
+        "MATCH (n)-[r]-(m) "
+        "RETURN n, r, m",
+        {"index": IDENTIFIER_INDEX, "term": identifier_search_term(identifier)},
+    )
+
+
+async def get_model_identifiers(session: neo4j.AsyncSession) -> dict[str, set[str]]:
+    """Return the identifiers of the nodes in each model, without loading the models themselves"""
+    records = await query(
+        session,
+        "MATCH (m:Model) "
+        "CALL apoc.path.subgraphNodes(m, {}) YIELD node "
+        "UNWIND coalesce(node.identifiers, []) AS identifier "
+        "RETURN m.uuid AS uuid, collect(DISTINCT identifier) AS identifiers",
+    )
+    return {r["uuid"]: set(r["identifiers"]) for r in records}
+
+
+async def get_model_sketches(session: neo4j.AsyncSession) -> dict[str, list[int]]:
+    """Return the similarity sketches stored on the models"""
+    records = await query(
+        session,
+        "MATCH (m:Model) WHERE m.minhash IS NOT NULL "
+        "RETURN m.uuid AS uuid, m.minhash AS minhash",
+    )
+    return {r["uuid"]: r["minhash"] for r in records}
+
+
+def _page(var: str, limit: int | None, after: str | None) -> tuple[str, str]:
+    """Return the WHERE and ORDER BY/LIMIT clauses selecting a page ordered by uuid"""
+    # the IS NOT NULL lets the planner read a uuid index in order
+    where = (
+        f"WHERE {var}.uuid > $after "
+        if after is not None
+        else f"WHERE {var}.uuid IS NOT NULL "
+    )
+    order = f"ORDER BY {var}.uuid" + (" LIMIT $limit" if limit is not None else "")
+    return where, order
+
+
+async def get_nodes(
+    session: neo4j.AsyncSession,
+    limit: int | None = None,
+    after: str | None = None,
+) -> list[Node]:
+    """Return the nodes in the database ordered by uuid, up to limit nodes with a uuid after the given one"""
+    where, order = _page("n", limit, after)
+    return await query_nodes(
+        session,
+        f"MATCH (n:Entity) {where}RETURN n {order}",
+        {"limit": limit, "after": after},
+    )
+
+
+async def count_nodes(session: neo4j.AsyncSession) -> int:
+    """Return the number of nodes in the database, from the label count store"""
+    return await query_single(session, "MATCH (n:Entity) RETURN count(n)")
+
+
+async def get_node(session: neo4j.AsyncSession, uuid: str) -> Node:
+    """Return the node with the given uuid"""
+    return await query_node(
+        session,
+        "MATCH (n:Entity {uuid: $uuid}) RETURN n",
+        {"uuid": uuid},
+    )
+
+
+async def merge_node(session: neo4j.AsyncSession, node: Node):
+    """Create or update the given node"""
+    uuid = node.uuid
+    props = node.properties
+    identifiers = node.identifiers
+
+    await query(
+        session,
+        "MERGE (n:Entity {uuid: $uuid}) "
+        "ON CREATE SET n += $props "
+        "ON MATCH SET n += $props "
+        f"SET n:{node.label}, n.identifiers = $identifiers",
+        {"uuid": uuid, "props": props, "identifiers": identifiers},
+    )
+    cache.generation.bump()
+
+
+async def delete_node(session: neo4j.AsyncSession, node: Node):
+    """Delete the given node"""
+    await query(
+        session,
+        "MATCH (n:Entity {uuid: $uuid}) DETACH DELETE n",
+        {"uuid": node.uuid},
+    )
+    cache.generation.bump()
+
+
+async def get_relationships(
+    session: neo4j.AsyncSession,
+    limit: int | None = None,
+    after: str | None = None,
+) -> list[Edge]:
+    """Return the relationships in the database ordered by uuid, up to limit relationships with a uuid after the given one"""
+    types = await query(session, RELATIONSHIP_TYPES_QUERY)
+    if not types:
+        return []
+
+    where, order = _page("r", limit, after)
+    # a relationship index only covers one type, so each type's page is read from
+    # its own index and the pages are merged - the endpoints are returned too, so
+    # that the relationships' nodes have their uuids
+    pages = " UNION ALL ".join(
+        f"MATCH (a)-[r:{quote(r['relationshipType'])}]->(b) "
+        f"{where}RETURN r, a, b {order}"
+        for r in types
+    )
+    return await query_relationships(
+        session,
+        f"CALL {{ {pages} }} RETURN r, a, b {order}",
+        {"limit": limit, "after": after},
+    )
+
+
+async def count_relationships(session: neo4j.AsyncSession) -> int:
+    """Return the number of relationships in the database, from the count store"""
+    return await query_single(session, "MATCH ()-[r]->() RETURN count(r)")
+
+
+async def get_relationship(session: neo4j.AsyncSession, uuid: str) -> Edge:
+    """Return the relationship with the given uuid"""
+    types = await query(session, RELATIONSHIP_TYPES_QUERY)
+    return await query_relationship(
+        session,
+        relationship_by_uuid_query(r["relationshipType"] for r in types),
+        {"uuid": uuid},
+    )
+
+
+async def merge_relationship(session: neo4j.AsyncSession, edge: Edge):
+    """Create or update the given relationship"""
+    start = edge.start_node
+    end = edge.end_node
+    uuid = edge.uuid
+    props = edge.properties
+
+    await query(
+        session,
+        "MATCH (start:Entity {uuid: $start}) "
+        "MATCH (end:Entity {uuid: $end}) "
+        f"MERGE (start)-[r:{edge.typ} {{uuid: $uuid}}]->(end) "
+        "ON CREATE SET r += $props "
+        "ON MATCH SET r += $props",
+        {"start": start, "end": end, "uuid": uuid, "props": props},
+    )
+    cache.generation.bump()
+
+
+async def delete_relationship(session: neo4j.AsyncSession, edge: Edge):
+    """Delete the given relationship"""
+    await query(
+        session,
+        f"MATCH ()-[r:{edge.typ} {{uuid: $uuid}}]->() DELETE r",
+        {"uuid": edge.uuid},
+    )
+    cache.generation.bump()
+
+
+async def delete_all(session: neo4j.AsyncSession):
+    """Delete all nodes and relationships in the database"""
+    await query(session, "MATCH (n) DETACH DELETE n")
+    cache.generation.bump()
+
+
+async def create_indexes(session: neo4j.AsyncSession) -> int:
+    """Create the constraints and indexes used by lookup queries if they don't exist yet, after adding the common label they rely on to existing nodes - returns the number of nodes labelled"""
+    count = await backfill_entity_label(session)
+
+    # older versions indexed the identifiers of each node label instead
+    labels = await query(session, identifier_index_labels_query())
+    if labels and labels[0]["labelsOrTypes"] != [ENTITY_LABEL]:
+        await query(session, f"DROP INDEX {IDENTIFIER_INDEX} IF EXISTS")
+
+    # relationship types from the schema, which have no Edge subclass
+    types = await query(session, RELATIONSHIP_TYPES_QUERY)
+    for q in schema_queries(r["relationshipType"] for r in types):
+        await query(session, q)
+    return count
+
+
+async def backfill_entity_label(
+    session: neo4j.AsyncSession, batch_size: int = 10000
+) -> int:
+    """Add the common label to all nodes with a uuid that don't have it yet, returns the number of nodes updated"""
+    count = 0
+    while True:
+        updated = await query_single(
+            session, entity_label_backfill_query(), {"limit": batch_size}
+        )
+        if not updated:
+            return count
+        count += updated
+
+
+async def _write_merge_plan(tx: neo4j.AsyncManagedTransaction, plan: graph.MergePlan):
+    for q, params in merge_plan_queries(plan):
+        result = await tx.run(cast(LiteralString, q), params)
+        log_summary(await result.consume())
+
+
+async def write_merge_plan(session: neo4j.AsyncSession, plan: graph.MergePlan):
+    """Apply a merge plan from graph.merge_nodes atomically, in a single transaction"""
+    await session.execute_write(_write_merge_plan, plan)
+    cache.generation.bump()
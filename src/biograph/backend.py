@@ -0,0 +1,111 @@
+import logging
+from collections.abc import AsyncIterator
+from typing import Annotated, Any, Literal, Protocol
+
+import networkx as nx
+from fastapi import Depends, Query, Request
+from pydantic import BaseModel
+
+from . import config, graph
+from .async_database import LimitedQuery
+from .edges import Edge
+from .nodes import Node
+
+logger = logging.getLogger(__name__)
+
+
+class Config(BaseModel):
+    # where the graph is stored - "memory" keeps it in the server process only,
+    # for load tests and small deployments, and doesn't support /query
+    type: Literal["neo4j", "memory"] = "neo4j"
+
+    @classmethod
+    def get(cls):
+        return config.get(cls, "backend", optional=True)
+
+
+######################
+## storage backends ##
+######################
+
+# the API routes only use the operations below, so that the graph can be stored
+# somewhere other than Neo4j
+
+
+class UnsupportedError(Exception):
+    """Raised by a backend for an operation it can't perform"""
+
+
+class Backend(Protocol):
+    async def startup(self): ...
+    async def health_check(self): ...
+
+    async def get_graph(self) -> nx.MultiDiGraph: ...
+    async def get_model(self, uuid: str) -> nx.MultiDiGraph: ...
+    async def get_model_by_name(self, name: str) -> nx.MultiDiGraph: ...
+    async def get_model_by_node(
+        self, label: str, property: str, value: str
+    ) -> nx.MultiDiGraph: ...
+    async def get_model_by_node_uuid(self, uuid: str) -> nx.MultiDiGraph: ...
+    async def get_subgraphs_by_uuids(self, uuids: list[str]) -> nx.MultiDiGraph: ...
+    async def get_subgraphs_by_identifier(self, identifier: str) -> nx.MultiDiGraph: ...
+    async def get_model_identifiers(self) -> dict[str, set[str]]: ...
+
+    def stream_all(self) -> AsyncIterator[Node | Edge]: ...
+    def stream_model(self, uuid: str) -> AsyncIterator[Node | Edge]: ...
+    def stream_model_by_name(self, name: str) -> AsyncIterator[Node | Edge]: ...
+    def stream_model_by_node(
+        self, label: str, property: str, value: str
+    ) -> AsyncIterator[Node | Edge]: ...
+    def stream_model_by_node_uuid(self, uuid: str) -> AsyncIterator[Node | Edge]: ...
+    def stream_subgraphs_by_identifier(
+        self, identifier: str
+    ) -> AsyncIterator[Node | Edge]: ...
+
+    async def get_nodes(
+        self, limit: int | None = None, after: str | None = None
+    ) -> list[Node]: ...
+    async def count_nodes(self) -> int: ...
+    async def get_node(self, uuid: str) -> Node: ...
+    async def merge_node(self, node: Node): ...
+    async def delete_node(self, node: Node): ...
+
+    async def get_relationships(
+        self, limit: int | None = None, after: str | None = None
+    ) -> list[Edge]: ...
+    async def count_relationships(self) -> int: ...
+    async def get_relationship(self, uuid: str) -> Edge: ...
+    async def merge_relationship(self, edge: Edge): ...
+    async def delete_relationship(self, edge: Edge): ...
+
+    async def delete_all(self): ...
+    async def write_merge_plan(self, plan: graph.MergePlan): ...
+
+    # user queries, with the row cap and timeout applied
+    async def query_limited(
+        self, q: str, limit: int | None
+    ) -> tuple[list[Any], str | None]: ...
+    async def query_graph_limited(
+        self, q: str, limit: int | None
+    ) -> tuple[nx.MultiDiGraph, str | None]: ...
+    async def query_nodes_limited(
+        self, q: str, limit: int | None
+    ) -> tuple[list[Node], str | None]: ...
+    async def query_relationships_limited(
+        self, q: str, limit: int | None
+    ) -> tuple[list[Edge], str | None]: ...
+    def limited_query(self, q: str, limit: int | None) -> LimitedQuery: ...
+
+
+def get_db(request: Request) -> Backend:
+    """Return the shared backend created in the app lifespan"""
+    return request.app.state.db
+
+
+# FastAPI dependency
+DbDep = Annotated[Backend, Depends(get_db)]
+
+# max page size of /node/all and /relationship/all, like the neo4j query_row_limit default
+MAX_PAGE_SIZE = 10000
+# FastAPI query parameter
+PageLimit = Annotated[int | None, Query(ge=1, le=MAX_PAGE_SIZE)]
@@ -0,0 +1,156 @@
+import functools
+import logging
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+from pydantic import BaseModel
+
+from . import config
+
+logger = logging.getLogger(__name__)
+
+
+class Config(BaseModel):
+    # max number of parsed node annotations to keep
+    annotation_size: int = 10000
+    # max number of parsed Arrows schemas to keep, per process
+    schema_size: int = 8
+
+    # max number of converted model and node results to keep
+    read_size: int = 256
+    # max number of serialized /model/all and /model/by-id responses to keep
+    snapshot_size: int = 32
+    # seconds before a cached result expires - only needed to pick up writes
+    # made by other processes, writes made by this process invalidate it immediately
+    read_ttl: float = 60.0
+
+    @classmethod
+    def get(cls):
+        return config.get(cls, "cache", optional=True)
+
+
+class CacheStats(BaseModel):
+    size: int
+    maxsize: int
+    hits: int
+    misses: int
+    evictions: int
+    expirations: int
+    hit_rate: float
+
+
+class LRUCache[K, V]:
+    """A thread-safe, size-bounded least recently used cache, with optional expiry"""
+
+    def __init__(self, maxsize: int, ttl: float | None = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        # key -> (expiry time, value)
+        self._data: OrderedDict[K, tuple[float, V]] = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: K) -> V | None:
+        """Return the cached value for key, or None if it isn't cached"""
+        with self._lock:
+            try:
+                expires, value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return None
+            if expires < time.monotonic():
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: K, value: V):
+        """Cache value under key, evicting the least recently used entry if full"""
+        expires = time.monotonic() + self.ttl if self.ttl is not None else float("inf")
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> CacheStats:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return CacheStats(
+                size=len(self._data),
+                maxsize=self.maxsize,
+                hits=self.hits,
+                misses=self.misses,
+                evictions=self.evictions,
+                expirations=self.expirations,
+                hit_rate=self.hits / lookups if lookups else 0.0,
+            )
+
+
+# all named caches, for reporting
+caches: dict[str, LRUCache] = {}
+
+
+def register[T: LRUCache](name: str, cache: T) -> T:
+    """Register a cache so that its stats are reported by /debug/caches"""
+    caches[name] = cache
+    return cache
+
+
+#####################
+## read-side cache ##
+#####################
+
+# results of read routes are cached under the database generation they were read
+# in, which every write made through this process bumps - so a cached result is
+# never returned after a write, without having to know what the write touched
+
+
+class Generation:
+    """A counter of the writes made to the database"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0
+
+    def bump(self):
+        with self._lock:
+            self.value += 1
+
+
+generation = Generation()
+
+
+@functools.cache
+def read_cache() -> LRUCache[tuple, Any]:
+    cfg = Config.get()
+    return register("reads", LRUCache(cfg.read_size, cfg.read_ttl))
+
+
+async def cached[T](key: tuple, fetch: Callable[[], Awaitable[T]]) -> T:
+    """Return the cached result for key in the current generation, fetching it if needed"""
+    # take the generation before fetching, so that a write racing the fetch
+    # leaves its result under the old generation
+    full_key = (generation.value, *key)
+
+    c = read_cache()
+    value = c.get(full_key)
+    if value is None:
+        value = await fetch()
+        c.put(full_key, value)
+    return value
@@ -0,0 +1,92 @@
+import itertools
+import logging
+from collections import Counter
+from collections.abc import Callable
+from typing import Literal
+
+import networkx as nx
+
+logger = logging.getLogger(__name__)
+
+######################
+## model clustering ##
+######################
+
+# rather than comparing every pair of models, only models sharing at least one
+# identifier are compared (blocking), which gives a sparse similarity graph that
+# cliques or communities can be found in
+
+ClusterMethod = Literal["cliques", "communities"]
+
+
+def blocks(
+    model_identifiers: dict[str, set[str]], max_block_size: int
+) -> list[list[str]]:
+    """Group the models by identifier, skipping identifiers used by more than max_block_size models"""
+    inverted: dict[str, list[str]] = {}
+    for uuid, identifiers in model_identifiers.items():
+        for identifier in identifiers:
+            inverted.setdefault(identifier, []).append(uuid)
+
+    # identifiers used by a large fraction of models (e.g. the organism) say little
+    # about similarity, and would make the number of pairs quadratic again
+    ret = [sorted(b) for b in inverted.values() if len(b) <= max_block_size]
+
+    logger.debug(
+        "%d blocks from %d identifiers (%d skipped)",
+        len(ret),
+        len(inverted),
+        len(inverted) - len(ret),
+    )
+    return ret
+
+
+def candidate_pairs(
+    blocks: list[list[str]],
+    progress: Callable[[float], None] | None = None,
+) -> Counter[tuple[str, str]]:
+    """Count the shared blocks of every pair of models sharing at least one block"""
+    shared: Counter[tuple[str, str]] = Counter()
+    for i, block in enumerate(blocks):
+        shared.update(itertools.combinations(block, 2))
+        if progress is not None and i % 1000 == 0:
+            progress(i / len(blocks))
+    return shared
+
+
+def similarity_graph(
+    model_identifiers: dict[str, set[str]],
+    threshold: float,
+    max_block_size: int,
+    progress: Callable[[float], None] | None = None,
+) -> nx.Graph:
+    """Build a graph of models, with an edge between models whose identifier Jaccard similarity is at least the threshold"""
+    b = blocks(model_identifiers, max_block_size)
+
+    # skipped identifiers are left out of the similarity entirely
+    sizes = Counter(uuid for block in b for uuid in block)
+
+    g = nx.Graph()
+    g.add_nodes_from(model_identifiers)
+
+    for (m1, m2), n in candidate_pairs(b, progress).items():
+        weight = n / (sizes[m1] + sizes[m2] - n)
+        if weight >= threshold:
+            g.add_edge(m1, m2, weight=weight)
+
+    return g
+
+
+def find_clusters(g: nx.Graph, method: ClusterMethod) -> list[list[str]]:
+    """Find the clusters of at least two models in a similarity graph, largest first"""
+    # isolated models can't be part of a cluster, and only slow down the search
+    g = g.subgraph(n for n, d in g.degree if d > 0)
+
+    if method == "cliques":
+        clusters = nx.find_cliques(g)
+    else:
+        clusters = nx.community.louvain_communities(g, weight="weight", seed=0)
+
+    ret = [sorted(c) for c in clusters if len(c) > 1]
+    ret.sort(key=len, reverse=True)
+    return ret
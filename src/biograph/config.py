@@ -1,16 +1,22 @@
+import os
+
 import yaml
 from pydantic import BaseModel
 
 _cache = {}
 
 
-def get[T: BaseModel](cls: type[T], name: str) -> T:
-    """Get the config object at config/{name}.yml"""
+def get[T: BaseModel](cls: type[T], name: str, optional: bool = False) -> T:
+    """Get the config object at config/{name}.yml - if optional, the file may be missing and the defaults are used"""
     if name in _cache:
         return _cache[name]
 
-    with open(f"config/{name}.yml") as f:
-        cfg = yaml.safe_load(f)
+    path = f"config/{name}.yml"
+    if optional and not os.path.exists(path):
+        cfg = {}
+    else:
+        with open(path) as f:
+            cfg = yaml.safe_load(f)
 
     ret = cls.model_validate(cfg)
     _cache[name] = ret
@@ -1,18 +1,30 @@
+from __future__ import annotations
+
 import logging
+import time
 import typing
-from typing import Annotated, Any, LiteralString, cast
+from collections.abc import Iterable
+from typing import Any, LiteralString, cast
 
 import neo4j
 import networkx as nx
-from fastapi import Depends
 from pydantic import BaseModel
 
-from . import config, graph
+from . import cache, config, graph, metrics, profiling
 from .edges import Edge
-from .nodes import Node
+from .nodes import ENTITY_LABEL, Node, parse_identifiers
+from .utils import get_subclasses
 
 logger = logging.getLogger(__name__)
 
+# name of the full-text index over the identifiers list property
+IDENTIFIER_INDEX = "identifiers"
+
+# all relationship types in the database, from the token store
+RELATIONSHIP_TYPES_QUERY = (
+    "CALL db.relationshipTypes() YIELD relationshipType RETURN relationshipType"
+)
+
 
 class Config(BaseModel):
     uri: str
@@ -20,6 +32,20 @@ class Config(BaseModel):
     username: str
     password: str
 
+    # connection pool settings - see the neo4j driver documentation
+    max_connection_pool_size: int = 100
+    connection_acquisition_timeout: float = 60.0
+    max_connection_lifetime: float = 3600.0
+
+    # seconds between background connectivity checks
+    health_check_interval: float = 30.0
+
+    # limits on the user queries run through /query - results are cut off after
+    # this many rows, and transactions running longer than this many seconds are
+    # terminated by the server
+    query_row_limit: int = 10000
+    query_timeout: float = 30.0
+
     @classmethod
     def get(cls):
         return config.get(cls, "neo4j")
@@ -33,11 +59,14 @@ class Database:
             cfg.uri,
             auth=(cfg.username, cfg.password),
             database=cfg.database,
+            max_connection_pool_size=cfg.max_connection_pool_size,
+            connection_acquisition_timeout=cfg.connection_acquisition_timeout,
+            max_connection_lifetime=cfg.max_connection_lifetime,
         )
 
     def __enter__(self):
         try:
-            self.driver.verify_connectivity()
+            self.verify_connectivity()
         except:
             self.driver.close()
             raise
@@ -49,6 +78,9 @@ class Database:
     def close(self):
         self.driver.close()
 
+    def verify_connectivity(self):
+        self.driver.verify_connectivity()
+
     def session(self, **kwargs) -> neo4j.Session:
         return self.driver.session(default_access_mode=neo4j.READ_ACCESS, **kwargs)
 
@@ -56,12 +88,21 @@ class Database:
         return self.driver.session(default_access_mode=neo4j.WRITE_ACCESS, **kwargs)
 
 
-def log_summary(summary: neo4j.ResultSummary):
+def log_summary(
+    summary: neo4j.ResultSummary,
+    rows: int | None = None,
+    convert_time: float = 0.0,
+):
     logger.info(
         "Query `%s` completed in %d ms",
         summary.query,
         summary.result_available_after,
     )
+    profiling.record(summary, rows, convert_time)
+    # the time reported by the server, which excludes the network
+    available = summary.result_available_after or 0
+    consumed = summary.result_consumed_after or 0
+    metrics.observe("neo4j", (available + consumed) / 1000)
 
 
 def query(
@@ -70,11 +111,11 @@ def query(
     params: dict[str, typing.Any] | None = None,
 ) -> list[Any]:
     """Execute a query returning arbitrary data"""
-    result = session.run(cast(LiteralString, q), params)
+    result = session.run(profiling.sampled(q), params)
     values = result.data()
 
     summary = result.consume()
-    log_summary(summary)
+    log_summary(summary, len(values))
 
     return values
 
@@ -85,7 +126,7 @@ def query_single(
     params: dict[str, typing.Any] | None = None,
 ) -> Any:
     """Execute a query returning one object"""
-    result = session.run(cast(LiteralString, q), params)
+    result = session.run(profiling.sampled(q), params)
     values = result.value()[0]
 
     summary = result.consume()
@@ -100,13 +141,18 @@ def query_graph(
     params: dict[str, typing.Any] | None = None,
 ) -> nx.MultiDiGraph:
     """Execute a query returning a graph"""
-    result = session.run(cast(LiteralString, q), params)
+    result = session.run(profiling.sampled(q), params)
     g = result.graph()
 
     summary = result.consume()
-    log_summary(summary)
 
-    return graph.neo4j_to_networkx(g)
+    start = time.perf_counter()
+    ret = graph.neo4j_to_networkx(g)
+    log_summary(
+        summary, len(g.nodes) + len(g.relationships), time.perf_counter() - start
+    )
+
+    return ret
 
 
 def query_node(
@@ -115,7 +161,7 @@ def query_node(
     params: dict[str, typing.Any] | None = None,
 ) -> Node:
     """Execute a query returning a node"""
-    result = session.run(cast(LiteralString, q), params)
+    result = session.run(profiling.sampled(q), params)
     node = result.value()[0]
 
     summary = result.consume()
@@ -130,11 +176,11 @@ def query_nodes(
     params: dict[str, typing.Any] | None = None,
 ) -> list[Node]:
     """Execute a query returning multiple nodes"""
-    result = session.run(cast(LiteralString, q), params)
+    result = session.run(profiling.sampled(q), params)
     nodes = result.value()
 
     summary = result.consume()
-    log_summary(summary)
+    log_summary(summary, len(nodes))
 
     return [Node.from_neo4j(n) for n in nodes]
 
@@ -145,7 +191,7 @@ def query_relationship(
     params: dict[str, typing.Any] | None = None,
 ) -> Edge:
     """Execute a query returning a relationship"""
-    result = session.run(cast(LiteralString, q), params)
+    result = session.run(profiling.sampled(q), params)
     node = result.value()[0]
 
     summary = result.consume()
@@ -160,11 +206,11 @@ def query_relationships(
     params: dict[str, typing.Any] | None = None,
 ) -> list[Edge]:
     """Execute a query returning multiple relationships"""
-    result = session.run(cast(LiteralString, q), params)
+    result = session.run(profiling.sampled(q), params)
     nodes = result.value()
 
     summary = result.consume()
-    log_summary(summary)
+    log_summary(summary, len(nodes))
 
     return [Edge.from_neo4j(n) for n in nodes]
 
@@ -224,7 +270,7 @@ def get_model_by_node_uuid(session: neo4j.Session, uuid: str) -> nx.MultiDiGraph
     """Return all models containing the node with the given uuid"""
     return query_graph(
         session,
-        "MATCH (n) WHERE n.uuid = $uuid "
+        "MATCH (n:Entity {uuid: $uuid}) "
         "CALL apoc.path.subgraphAll(n, {}) "
         "YIELD nodes, relationships "
         "RETURN nodes, relationships",
@@ -237,26 +283,31 @@ def get_subgraphs_by_uuids(session: neo4j.Session, uuids: list[str]) -> nx.Multi
     return query_graph(
         session,
         "UNWIND $uuids AS uuid "
-        "MATCH (n {uuid: uuid}) "
+        "MATCH (n:Entity {uuid: uuid}) "
         "MATCH (n)-[r]-(m) "
         "RETURN n, r, m",
         {"uuids": uuids},
     )
 
 
+def identifier_search_term(identifier: str) -> str:
+    """Build a full-text query matching exactly the given identifier"""
+    # the index uses the keyword analyzer, so a quoted phrase is a single exact term
+    escaped = identifier.replace("\\", "\\\\").replace('"', '\\"')
+    return f'"{escaped}"'
+
+
 def get_subgraphs_by_identifier(
     session: neo4j.Session, identifier: str
 ) -> nx.MultiDiGraph:
     """Return all nodes with the given identifier and their immediate neighbours"""
-    graph = get_graph(session)
-
-    uuids = []
-    for n, node in graph.nodes.data("node"):
-        node = cast(Node, node)
-        if identifier in node.identifiers:
-            uuids.append(n)
-
-    return get_subgraphs_by_uuids(session, uuids)
+    return query_graph(
+        session,
+        "CALL db.index.fulltext.queryNodes($index, $term) YIELD node AS n "
+        "MATCH (n)-[r]-(m) "
+        "RETURN n, r, m",
+        {"index": IDENTIFIER_INDEX, "term": identifier_search_term(identifier)},
+    )
 
 
 def get_nodes(session: neo4j.Session) -> list[Node]:
@@ -268,7 +319,7 @@ def get_node(session: neo4j.Session, uuid: str) -> Node:
     """Return the node with the given uuid"""
     return query_node(
         session,
-        "MATCH (n) WHERE n.uuid = $uuid RETURN n",
+        "MATCH (n:Entity {uuid: $uuid}) RETURN n",
         {"uuid": uuid},
     )
 
@@ -277,35 +328,53 @@ def merge_node(session: neo4j.Session, node: Node):
     """Create or update the given node"""
     uuid = node.uuid
     props = node.properties
+    identifiers = node.identifiers
 
     query(
         session,
-        f"MERGE (n:{node.label} {{uuid: $uuid}}) "
+        "MERGE (n:Entity {uuid: $uuid}) "
         "ON CREATE SET n += $props "
-        "ON MATCH SET n += $props",
-        {"uuid": uuid, "props": props},
+        "ON MATCH SET n += $props "
+        f"SET n:{node.label}, n.identifiers = $identifiers",
+        {"uuid": uuid, "props": props, "identifiers": identifiers},
     )
+    cache.generation.bump()
 
 
 def delete_node(session: neo4j.Session, node: Node):
     """Delete the given node"""
     query(
         session,
-        "MATCH (n {uuid: $uuid}) DETACH DELETE n",
+        "MATCH (n:Entity {uuid: $uuid}) DETACH DELETE n",
         {"uuid": node.uuid},
     )
+    cache.generation.bump()
 
 
 def get_relationships(session: neo4j.Session) -> list[Edge]:
     """Return all relationships in the database"""
-    return query_relationships(session, "MATCH ()-[r]-() RETURN r")
+    return query_relationships(session, "MATCH (a)-[r]->(b) RETURN r, a, b")
+
+
+def relationship_by_uuid_query(types: Iterable[str]) -> str:
+    """Return the query looking up a relationship by uuid, through the uuid index of each of the given types"""
+    # range indexes need a relationship type, an untyped match scans every relationship -
+    # the endpoints are returned too, so that the relationship's nodes have their uuids
+    types = list(types)
+    if not types:
+        raise IndexError("no relationship types in the database")
+    return " UNION ALL ".join(
+        f"MATCH (a)-[r:{quote(typ)} {{uuid: $uuid}}]->(b) RETURN r, a, b"
+        for typ in types
+    )
 
 
 def get_relationship(session: neo4j.Session, uuid: str) -> Edge:
     """Return the relationship with the given uuid"""
+    types = query(session, RELATIONSHIP_TYPES_QUERY)
     return query_relationship(
         session,
-        "MATCH ()-[r]-() WHERE n.uuid = $uuid RETURN r",
+        relationship_by_uuid_query(r["relationshipType"] for r in types),
         {"uuid": uuid},
     )
 
@@ -319,62 +388,373 @@ def merge_relationship(session: neo4j.Session, edge: Edge):
 
     query(
         session,
-        "MATCH (start{uuid: $start}) "
-        "MATCH (end{uuid: $end}) "
+        "MATCH (start:Entity {uuid: $start}) "
+        "MATCH (end:Entity {uuid: $end}) "
         f"MERGE (start)-[r:{edge.typ} {{uuid: $uuid}}]->(end) "
         "ON CREATE SET r += $props "
         "ON MATCH SET r += $props",
         {"start": start, "end": end, "uuid": uuid, "props": props},
     )
+    cache.generation.bump()
 
 
 def delete_relationship(session: neo4j.Session, edge: Edge):
     """Delete the given relationship"""
     query(
         session,
-        "MATCH ()-(r{uuid: $uuid})-() DELETE r",
+        f"MATCH ()-[r:{edge.typ} {{uuid: $uuid}}]->() DELETE r",
         {"uuid": edge.uuid},
     )
+    cache.generation.bump()
+
+
+def merge_plan_queries(plan: graph.MergePlan) -> list[tuple[str, dict[str, Any]]]:
+    """Build the batched queries that apply a merge plan"""
+    queries: list[tuple[str, dict[str, Any]]] = []
+
+    # relationship types can't be parameterised, so batch the edges by type
+    rows_by_type: dict[str, list[dict[str, Any]]] = {}
+    for edge in plan.relationships.values():
+        rows_by_type.setdefault(edge.typ, []).append(
+            {
+                "uuid": edge.uuid,
+                "start": edge.start_node,
+                "end": edge.end_node,
+                "props": edge.properties,
+            }
+        )
+    for typ, rows in rows_by_type.items():
+        queries.append(
+            (
+                "UNWIND $rows AS row "
+                "MATCH (start:Entity {uuid: row.start}) "
+                "MATCH (end:Entity {uuid: row.end}) "
+                f"MERGE (start)-[r:{typ} {{uuid: row.uuid}}]->(end) "
+                "SET r += row.props",
+                {"rows": rows},
+            )
+        )
+
+    if plan.deleted:
+        queries.append(
+            (
+                "UNWIND $uuids AS uuid MATCH (n:Entity {uuid: uuid}) DETACH DELETE n",
+                {"uuids": plan.deleted},
+            )
+        )
+
+    node = plan.node
+    if node is not None:
+        queries.append(
+            (
+                "MERGE (n:Entity {uuid: $uuid}) "
+                f"SET n:{node.label}, n += $props, n.identifiers = $identifiers",
+                {
+                    "uuid": node.uuid,
+                    "props": node.properties,
+                    "identifiers": node.identifiers,
+                },
+            )
+        )
+
+    return queries
+
+
+def _write_merge_plan(tx: neo4j.ManagedTransaction, plan: graph.MergePlan):
+    for q, params in merge_plan_queries(plan):
+        result = tx.run(cast(LiteralString, q), params)
+        log_summary(result.consume())
+
+
+def write_merge_plan(session: neo4j.Session, plan: graph.MergePlan):
+    """Apply a merge plan from graph.merge_nodes atomically, in a single transaction"""
+    session.execute_write(_write_merge_plan, plan)
+    cache.generation.bump()
+
+
+def _write_model(
+    tx: neo4j.ManagedTransaction,
+    g: nx.MultiDiGraph,
+    sketches: dict[str, list[int]],
+):
+    # labels and relationship types can't be parameterised, so batch by label/type
+    rows_by_label: dict[str, list[dict[str, Any]]] = {}
+    for _, node in g.nodes.data("node"):
+        node = cast(Node, node)
+        props = {**node.properties, "uuid": node.uuid, "identifiers": node.identifiers}
+        if node.uuid in sketches:
+            props["minhash"] = sketches[node.uuid]
+        rows_by_label.setdefault(node.label, []).append(props)
+
+    # element ids of the created nodes, so that relationships don't need a uuid lookup
+    element_ids: dict[str, str] = {}
+    for label, rows in rows_by_label.items():
+        result = tx.run(
+            cast(
+                LiteralString,
+                "UNWIND $rows AS row "
+                f"CREATE (n:`{label}`:Entity) SET n = row "
+                "RETURN row.uuid AS uuid, elementId(n) AS id",
+            ),
+            {"rows": rows},
+        )
+        element_ids.update((r["uuid"], r["id"]) for r in result)
+        log_summary(result.consume())
+
+    rows_by_type: dict[str, list[dict[str, Any]]] = {}
+    for _, _, edge in g.edges.data("edge"):
+        edge = cast(Edge, edge)
+        rows_by_type.setdefault(edge.typ, []).append(
+            {
+                "start": element_ids[edge.start_node],
+                "end": element_ids[edge.end_node],
+                "props": {**edge.properties, "uuid": edge.uuid},
+            }
+        )
+
+    for typ, rows in rows_by_type.items():
+        result = tx.run(
+            cast(
+                LiteralString,
+                "UNWIND $rows AS row "
+                "MATCH (start) WHERE elementId(start) = row.start "
+                "MATCH (end) WHERE elementId(end) = row.end "
+                f"CREATE (start)-[r:`{typ}`]->(end) SET r = row.props",
+            ),
+            {"rows": rows},
+        )
+        log_summary(result.consume())
+
+
+def write_model(
+    session: neo4j.Session,
+    g: nx.MultiDiGraph,
+    sketches: dict[str, list[int]],
+):
+    """Create all nodes and relationships of a new model graph in a single transaction, storing the given model sketches"""
+    session.execute_write(_write_model, g, sketches)
+    cache.generation.bump()
 
 
 def delete_all(session: neo4j.Session):
     """Delete all nodes and relationships in the database"""
     query(session, "MATCH (n) DETACH DELETE n")
+    cache.generation.bump()
+
+
+def quote(name: str) -> str:
+    """Quote a label, relationship type or schema name for use in a query"""
+    return "`" + name.replace("`", "``") + "`"
+
+
+def _label_expression(labels: Iterable[str]) -> str:
+    """Return a label disjunction matching any of the given labels"""
+    return "|".join(quote(label) for label in sorted(labels))
+
+
+def label_by_tag(session: neo4j.Session, tag: str, labels: set[str]):
+    """Add the common label to all nodes with the given tag, so the other tag queries can use the Entity tag index
+
+    The nodes are found through the per-label tag indexes, labels are those of the nodes written
+    """
+    if not labels:
+        return
+    query(
+        session,
+        f"MATCH (n:{_label_expression(labels)}) WHERE n.tag = $tag SET n:{ENTITY_LABEL}",
+        {"tag": tag},
+    )
 
 
 def assign_uuids_by_tag(session: neo4j.Session, tag: str):
     """Assign random uuids to all nodes with the given tag"""
-    query(session, "MATCH (n{tag: $tag}) SET n.uuid = randomUUID()", {"tag": tag})
-    query(session, "MATCH ()-[r{tag: $tag}]-() SET r.uuid = randomUUID()", {"tag": tag})
+    query(
+        session,
+        f"MATCH (n:{ENTITY_LABEL} {{tag: $tag}}) SET n.uuid = randomUUID()",
+        {"tag": tag},
+    )
+    # tagged relationships only connect tagged nodes
+    query(
+        session,
+        f"MATCH (:{ENTITY_LABEL} {{tag: $tag}})-[r {{tag: $tag}}]->() "
+        "SET r.uuid = randomUUID()",
+        {"tag": tag},
+    )
 
 
-def delete_all_by_tag(session: neo4j.Session, tag: str):
-    """Delete all nodes and relationships with the given tag"""
-    query(session, "MATCH (n{tag: $tag}) DETACH DELETE n", {"tag": tag})
-    query(session, "MATCH ()-[r{tag: $tag}]-() DELETE r", {"tag": tag})
+def delete_all_by_tag(session: neo4j.Session, tag: str, labels: set[str]):
+    """Delete all nodes and relationships with the given tag, labels are those of the nodes written"""
+    # the nodes may not have the common label yet, and tagged relationships only
+    # connect tagged nodes, so detaching deletes those too
+    if not labels:
+        return
+    query(
+        session,
+        f"MATCH (n:{_label_expression(labels)}) WHERE n.tag = $tag DETACH DELETE n",
+        {"tag": tag},
+    )
+    cache.generation.bump()
 
 
 def remove_tag(session: neo4j.Session, tag: str):
     """Remove the given tag from all nodes and relationships that have it"""
-    query(session, "MATCH (n{tag: $tag}) REMOVE n.tag", {"tag": tag})
-    query(session, "MATCH ()-[r{tag: $tag}]-() REMOVE r.tag", {"tag": tag})
+    query(
+        session,
+        f"MATCH (:{ENTITY_LABEL} {{tag: $tag}})-[r {{tag: $tag}}]->() REMOVE r.tag",
+        {"tag": tag},
+    )
+    query(session, f"MATCH (n:{ENTITY_LABEL} {{tag: $tag}}) REMOVE n.tag", {"tag": tag})
+    cache.generation.bump()
 
 
 def delete_dangling_nodes_by_tag(session: neo4j.Session, tag: str):
-    """Remove all unreachable nodes with the given tag"""
+    """Remove all nodes with the given tag that aren't connected to a Model with the tag"""
+    # tagged nodes are only ever connected to other tagged nodes, so everything
+    # reachable from the tagged models is kept - the reachable element ids go in
+    # a map to keep the lookup per node constant
     query(
         session,
-        "MATCH (n{tag: $tag}) WHERE NOT EXISTS { (m:Model)-[*]-(n) } DETACH DELETE n",
+        f"MATCH (m:{ENTITY_LABEL}:Model {{tag: $tag}}) "
+        "WITH collect(m) AS models "
+        "CALL apoc.path.subgraphNodes(models, {}) YIELD node "
+        "WITH apoc.map.fromLists(collect(elementId(node)), collect(true)) AS reachable "
+        f"MATCH (n:{ENTITY_LABEL} {{tag: $tag}}) "
+        "WHERE reachable[elementId(n)] IS NULL "
+        "DETACH DELETE n",
         {"tag": tag},
     )
 
 
-def get_db():
-    cfg = Config.get()
+def identifier_index_query() -> str:
+    """Return the query creating the full-text index over node identifiers"""
+    return (
+        f"CREATE FULLTEXT INDEX {IDENTIFIER_INDEX} IF NOT EXISTS "
+        f"FOR (n:{ENTITY_LABEL}) ON EACH [n.identifiers] "
+        "OPTIONS {indexConfig: {`fulltext.analyzer`: 'keyword'}}"
+    )
+
+
+def schema_queries(relationship_types: Iterable[str] = ()) -> list[str]:
+    """Return the queries creating the constraints and indexes used by lookup queries
+
+    Relationship uuid indexes are created for the types of the Edge subclasses and the given types
+    """
+    queries = [
+        f"CREATE CONSTRAINT entity_uuid IF NOT EXISTS "
+        f"FOR (n:{ENTITY_LABEL}) REQUIRE n.uuid IS UNIQUE",
+        f"CREATE INDEX entity_tag IF NOT EXISTS FOR (n:{ENTITY_LABEL}) ON (n.tag)",
+        "CREATE INDEX model_name IF NOT EXISTS FOR (n:Model) ON (n.name)",
+        identifier_index_query(),
+    ]
+    for sub in get_subclasses(Node):
+        label = sub.__name__
+        queries.append(
+            f"CREATE CONSTRAINT {label.lower()}_uuid IF NOT EXISTS "
+            f"FOR (n:{label}) REQUIRE n.uuid IS UNIQUE"
+        )
+        # nodes written by neo4jsbml only have their own label until label_by_tag
+        queries.append(
+            f"CREATE INDEX {label.lower()}_tag IF NOT EXISTS "
+            f"FOR (n:{label}) ON (n.tag)"
+        )
+    # range indexes need a relationship type, so paging through all relationships
+    # in uuid order walks one index per type
+    types = {sub.TYPE for sub in get_subclasses(Edge)} | set(relationship_types)
+    for typ in sorted(types):
+        queries.append(
+            f"CREATE INDEX {quote(typ.lower() + '_uuid')} IF NOT EXISTS "
+            f"FOR ()-[r:{quote(typ)}]-() ON (r.uuid)"
+        )
+    return queries
+
+
+def identifier_index_labels_query() -> str:
+    """Return the query returning the labels of an existing full-text identifier index"""
+    return (
+        "SHOW FULLTEXT INDEXES YIELD name, labelsOrTypes "
+        f"WHERE name = '{IDENTIFIER_INDEX}' RETURN labelsOrTypes"
+    )
+
+
+def entity_label_backfill_query() -> str:
+    """Return the query adding the common label to a batch of nodes with a uuid that don't have it yet"""
+    return (
+        f"MATCH (n) WHERE n.uuid IS NOT NULL AND NOT n:{ENTITY_LABEL} "
+        "WITH n LIMIT $limit "
+        f"SET n:{ENTITY_LABEL} "
+        "RETURN count(n)"
+    )
+
+
+def create_indexes(session: neo4j.Session) -> int:
+    """Create the constraints and indexes used by lookup queries if they don't exist yet, after adding the common label they rely on to existing nodes - returns the number of nodes labelled"""
+    count = backfill_entity_label(session)
+
+    # older versions indexed the identifiers of each node label instead
+    labels = query(session, identifier_index_labels_query())
+    if labels and labels[0]["labelsOrTypes"] != [ENTITY_LABEL]:
+        query(session, f"DROP INDEX {IDENTIFIER_INDEX} IF EXISTS")
+
+    # relationship types from the schema, which have no Edge subclass
+    types = query(session, RELATIONSHIP_TYPES_QUERY)
+    for q in schema_queries(r["relationshipType"] for r in types):
+        query(session, q)
+    return count
 
-    with Database(cfg) as db:
-        yield db
+
+def _set_identifiers(session: neo4j.Session, records: list[dict[str, Any]]):
+    """Parse the annotations returned by a query and store the identifiers on the nodes"""
+    rows = [
+        {
+            "id": r["id"],
+            "identifiers": parse_identifiers(r["annotation"], r["metaid"]),
+        }
+        for r in records
+    ]
+    query(
+        session,
+        "UNWIND $rows AS row "
+        "MATCH (n) WHERE elementId(n) = row.id "
+        "SET n.identifiers = row.identifiers",
+        {"rows": rows},
+    )
 
 
-# FastAPI dependency
-DbDep = Annotated[Database, Depends(get_db)]
+def set_identifiers_by_tag(session: neo4j.Session, tag: str):
+    """Store the annotation identifiers of all nodes with the given tag"""
+    records = query(
+        session,
+        f"MATCH (n:{ENTITY_LABEL} {{tag: $tag}}) "
+        "RETURN elementId(n) AS id, n.annotation AS annotation, n.metaid AS metaid",
+        {"tag": tag},
+    )
+    _set_identifiers(session, records)
+
+
+def backfill_identifiers(session: neo4j.Session, batch_size: int = 1000) -> int:
+    """Store the annotation identifiers of all nodes that don't have them yet, returns the number of nodes updated"""
+    count = 0
+    while True:
+        records = query(
+            session,
+            "MATCH (n) WHERE n.identifiers IS NULL "
+            "RETURN elementId(n) AS id, n.annotation AS annotation, n.metaid AS metaid "
+            "LIMIT $limit",
+            {"limit": batch_size},
+        )
+        if not records:
+            return count
+        _set_identifiers(session, records)
+        count += len(records)
+
+
+def backfill_entity_label(session: neo4j.Session, batch_size: int = 10000) -> int:
+    """Add the common label to all nodes with a uuid that don't have it yet, returns the number of nodes updated"""
+    count = 0
+    while True:
+        updated = query_single(
+            session, entity_label_backfill_query(), {"limit": batch_size}
+        )
+        if not updated:
+            return count
+        count += updated
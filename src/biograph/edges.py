@@ -1,5 +1,5 @@
 import logging
-from typing import Any, Self
+from typing import Any, ClassVar, Self
 
 import neo4j.graph
 
@@ -13,6 +13,11 @@ logger = logging.getLogger(__name__)
 
 
 class Edge:
+    __slots__ = ("uuid", "typ", "start_node", "end_node", "properties")
+
+    # the relationship type of each subclass
+    TYPE: ClassVar[str]
+
     uuid: str
 
     typ: str
@@ -67,7 +72,6 @@ class Edge:
         uuid = properties.pop("uuid")
 
         typ = relationship.type
-        typ_name = typ.casefold().replace("_", "")
 
         start_node, end_node = relationship.nodes
         if start_node is None:
@@ -82,48 +86,77 @@ class Edge:
         if end_node is None:
             raise ValueError(f"relationship {uuid} end node has no UUID")
 
-        for sub in get_subclasses(Edge):
-            if sub.__name__.casefold() == typ_name:
-                return sub(uuid, typ, start_node, end_node, properties)
+        return Edge.create(uuid, typ, start_node, end_node, properties)
 
-        return Edge(uuid, typ, start_node, end_node, properties)
+    @staticmethod
+    def create(
+        uuid: str,
+        typ: str,
+        start_node: str,
+        end_node: str,
+        properties: dict[str, str],
+    ) -> "Edge":
+        """Create an Edge of the subclass corresponding to the given type"""
+        cls = _edge_classes.get(typ.casefold().replace("_", ""), Edge)
+        return cls(uuid, typ, start_node, end_node, properties)
 
 
 class HasCompartment(Edge):
-    pass
+    __slots__ = ()
+    TYPE = "HAS_COMPARTMENT"
 
 
 class HasKineticLaw(Edge):
-    pass
+    __slots__ = ()
+    TYPE = "HAS_KINETICLAW"
 
 
 class HasParameter(Edge):
-    pass
+    __slots__ = ()
+    TYPE = "HAS_PARAMETER"
 
 
 class HasProduct(Edge):
-    pass
+    __slots__ = ()
+    TYPE = "HAS_PRODUCT"
 
 
 class HasReaction(Edge):
-    pass
+    __slots__ = ()
+    TYPE = "HAS_REACTION"
 
 
 class HasSpecies(Edge):
-    pass
+    __slots__ = ()
+    TYPE = "HAS_SPECIES"
+
+
+class HasUnitDefinition(Edge):
+    __slots__ = ()
+    TYPE = "HAS_UNITDEFINITION"
 
 
 class HasUnits(Edge):
-    pass
+    __slots__ = ()
+    TYPE = "HAS_UNITS"
 
 
 class InCompartment(Edge):
-    pass
+    __slots__ = ()
+    TYPE = "IN_COMPARTMENT"
 
 
 class IsComposed(Edge):
-    pass
+    __slots__ = ()
+    TYPE = "IS_COMPOSED"
 
 
 class IsReactant(Edge):
-    pass
+    __slots__ = ()
+    TYPE = "IS_REACTANT"
+
+
+# casefolded type name -> class lookup for from_neo4j, built once all subclasses are defined
+_edge_classes: dict[str, type[Edge]] = {
+    sub.__name__.casefold(): sub for sub in get_subclasses(Edge)
+}
@@ -1,12 +1,14 @@
 import itertools
 import logging
 from collections import Counter
+from collections.abc import Iterable
 from typing import cast
 
 import neo4j.graph
 import networkx as nx
+import numpy as np
 
-from . import database
+from . import database, metrics
 from .edges import Edge
 from .nodes import Node
 
@@ -18,6 +20,24 @@ logger = logging.getLogger(__name__)
 ################################
 
 
+@metrics.timed("neo4j_to_networkx")
+def entities_to_networkx(entities: Iterable[Node | Edge]) -> nx.MultiDiGraph:
+    """Build a networkx Graph from already converted nodes and relationships"""
+    ret = nx.MultiDiGraph()
+    for entity in entities:
+        if isinstance(entity, Node):
+            ret.add_node(entity.uuid, node=entity)
+        else:
+            ret.add_edge(
+                entity.start_node,
+                entity.end_node,
+                key=entity.uuid,
+                edge=entity,
+            )
+    return ret
+
+
+@metrics.timed("neo4j_to_networkx")
 def neo4j_to_networkx(graph: neo4j.graph.Graph) -> nx.MultiDiGraph:
     """Convert a neo4j Graph object to a networkx Graph"""
     ret = nx.MultiDiGraph()
@@ -126,6 +146,97 @@ def _calc_similarity(graph: nx.MultiDiGraph, a: str, b: str) -> float:
     return s
 
 
+def _signatures(
+    graph: nx.MultiDiGraph,
+    uuids: list[str],
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Encode the neighbours of each node as edge counts over (direction, label, edge type)"""
+    # returns the count matrix with one row per node, the first column
+    # of each (direction, label) group and the weight of each group
+    node_counts: list[Counter[tuple[bool, str, str]]] = []
+    for uuid in uuids:
+        counts: Counter[tuple[bool, str, str]] = Counter()
+        for nbr, edges in graph.succ[uuid].items():
+            nbr_node = cast(Node, graph.nodes[nbr]["node"])
+            for edgedict in edges.values():
+                edge = cast(Edge, edgedict["edge"])
+                counts[(True, nbr_node.label, edge.typ)] += 1
+        for nbr, edges in graph.pred[uuid].items():
+            nbr_node = cast(Node, graph.nodes[nbr]["node"])
+            for edgedict in edges.values():
+                edge = cast(Edge, edgedict["edge"])
+                counts[(False, nbr_node.label, edge.typ)] += 1
+        node_counts.append(counts)
+
+    # sort the columns so that each (direction, label) group is contiguous
+    columns = sorted(set().union(*node_counts))
+    column_index = {c: i for i, c in enumerate(columns)}
+
+    matrix = np.zeros((len(uuids), max(len(columns), 1)), dtype=np.int64)
+    for row, counts in enumerate(node_counts):
+        for column, count in counts.items():
+            matrix[row, column_index[column]] = count
+
+    starts = []
+    weights = []
+    for i, (succ, label, _) in enumerate(columns):
+        if i == 0 or columns[i - 1][:2] != (succ, label):
+            starts.append(i)
+            # uncommon edges are worth more for successors than predecessors
+            weights.append(2 if succ else 1)
+    if not starts:
+        starts.append(0)
+        weights.append(0)
+
+    return matrix, np.array(starts), np.array(weights, dtype=np.int64)
+
+
+def similarity_matrix(
+    graph: nx.MultiDiGraph,
+    uuids: list[str],
+    chunk_size: int = 1 << 22,
+) -> np.ndarray:
+    """Calculate the similarity score out of 100 between every pair of the given nodes"""
+    # element [i, j] is identical to _calc_similarity(graph, uuids[i], uuids[j])
+    unique = list(dict.fromkeys(uuids))
+    counts, starts, weights = _signatures(graph, unique)
+
+    # edge counts per (direction, label) group
+    lengths = np.add.reduceat(counts, starts, axis=1)
+
+    n = len(unique)
+    scores = np.empty((n, n), dtype=np.float64)
+
+    # process the rows in blocks to bound the size of the (block, n, columns) array
+    block = max(1, chunk_size // max(1, n * counts.shape[1]))
+    for begin in range(0, n, block):
+        end = min(begin + block, n)
+
+        mins = np.minimum(counts[begin:end, None, :], counts[None, :, :])
+        common = np.add.reduceat(mins, starts, axis=2)
+
+        a_lengths = lengths[begin:end, None, :]
+        b_lengths = lengths[None, :, :]
+
+        a_uncommon = a_lengths - common
+        b_uncommon = b_lengths - common
+        uncommon = np.minimum(a_uncommon, b_uncommon)
+        extra = np.abs(a_uncommon - uncommon)
+
+        score = (3 * common + weights * uncommon - extra).sum(axis=2)
+        max_score = (3 * np.maximum(a_lengths, b_lengths)).sum(axis=2)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            block_scores = score / max_score * 100
+        # two nodes without any edges are identical
+        block_scores[max_score == 0] = 100.0
+        scores[begin:end] = block_scores
+
+    position = {uuid: i for i, uuid in enumerate(unique)}
+    index = [position[uuid] for uuid in uuids]
+    return scores[np.ix_(index, index)]
+
+
 def calc_similarity(
     graph: nx.MultiDiGraph,
     uuids: list[str],
@@ -134,11 +245,13 @@ def calc_similarity(
     if len(uuids) < 2:
         return 100
 
+    matrix = similarity_matrix(graph, uuids).tolist()
+
     score = 0
     i = 0
 
-    for a, b in itertools.combinations(uuids, 2):
-        score += _calc_similarity(graph, a, b)
+    for a, b in itertools.combinations(range(len(uuids)), 2):
+        score += matrix[a][b]
         i += 1
 
     return max(int(score / i), 0)
@@ -162,14 +275,31 @@ def get_identifier_frequency(graph: nx.MultiDiGraph) -> list[tuple[str, int]]:
     return ret
 
 
+class MergePlan:
+    """The database changes needed to apply a merge done by merge_nodes"""
+
+    # relationships to create or update, by uuid
+    relationships: dict[str, Edge]
+    # uuids of the nodes to delete
+    deleted: list[str]
+    # the merged node to update
+    node: Node | None
+
+    def __init__(self) -> None:
+        self.relationships = {}
+        self.deleted = []
+        self.node = None
+
+
 def merge_nodes(
     graph: nx.MultiDiGraph,
     uuids: list[str],
     session: neo4j.Session | None = None,
-):
-    """Merge the given nodes in-place. If session is not None, merge the nodes in the database as well."""
+) -> MergePlan:
+    """Merge the given nodes in-place, returning the changes to apply to the database. If session is not None, apply them as well."""
+    plan = MergePlan()
     if len(uuids) < 2:
-        return
+        return plan
 
     dst_uuid = uuids[0]
     dst = cast(Node, graph.nodes[dst_uuid]["node"])
@@ -209,8 +339,8 @@ def merge_nodes(
                     key=new_edge.uuid,
                     edge=new_edge,
                 )
-                if session is not None:
-                    database.merge_relationship(session, new_edge)
+                # later versions of the same edge replace earlier ones
+                plan.relationships[new_edge.uuid] = new_edge
 
         for edges in graph.pred[src_uuid].values():
             for edgedict in edges.values():
@@ -242,8 +372,8 @@ def merge_nodes(
                     key=new_edge.uuid,
                     edge=new_edge,
                 )
-                if session is not None:
-                    database.merge_relationship(session, new_edge)
+                # later versions of the same edge replace earlier ones
+                plan.relationships[new_edge.uuid] = new_edge
 
         # merge properties without overwriting
         for k, v in src.properties.items():
@@ -252,13 +382,19 @@ def merge_nodes(
 
         # remove src
         graph.remove_node(src_uuid)
-        if session is not None:
-            database.delete_node(session, src)
+        plan.deleted.append(src.uuid)
 
     # update node object in graph
     new_dst = dst.copy(properties=node_props)
     graph.nodes[dst_uuid]["node"] = new_dst
+    plan.node = new_dst
+
+    # edges to deleted nodes would only be removed again by DETACH DELETE
+    for uuid, edge in list(plan.relationships.items()):
+        if edge.start_node in plan.deleted or edge.end_node in plan.deleted:
+            del plan.relationships[uuid]
+
     if session is not None:
-        database.merge_node(session, new_dst)
+        database.write_merge_plan(session, plan)
 
-    return graph
+    return plan
@@ -0,0 +1,112 @@
+import asyncio
+import logging
+import time
+import uuid
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+#####################
+## background jobs ##
+#####################
+
+# long running work is run as an asyncio task on the event loop, with
+# CPU-bound parts pushed to threads or processes by the job itself, so that
+# the request starting it can return the job id immediately - the task starts
+# out with a copy of the request's context, so the stages it times are collected
+# for the job instead and recorded by its kind
+
+# finished jobs are kept for status queries, up to this many
+MAX_FINISHED_JOBS = 1000
+
+
+class Job:
+    id: str
+    kind: str
+
+    # one of "pending", "running", "done", "failed"
+    status: str
+    # name of the step currently running, and the fraction of it that is done
+    stage: str | None
+    progress: float
+
+    result: Any
+    error: str | None
+
+    created: float
+    finished: float | None
+
+    def __init__(self, kind: str) -> None:
+        self.id = str(uuid.uuid4())
+        self.kind = kind
+
+        self.status = "pending"
+        self.stage = None
+        self.progress = 0.0
+
+        self.result = None
+        self.error = None
+
+        self.created = time.time()
+        self.finished = None
+
+    def update(self, stage: str | None = None, progress: float | None = None):
+        """Report progress - safe to call from worker threads"""
+        if stage is not None and stage != self.stage:
+            self.stage = stage
+            self.progress = 0.0
+        if progress is not None:
+            self.progress = progress
+
+
+_jobs: dict[str, Job] = {}
+# references to running tasks, so they aren't garbage collected
+_tasks: set[asyncio.Task] = set()
+
+
+def get(job_id: str) -> Job | None:
+    return _jobs.get(job_id)
+
+
+def all_jobs() -> list[Job]:
+    return list(_jobs.values())
+
+
+def submit(kind: str, fn: Callable[[Job], Awaitable[Any]]) -> Job:
+    """Start running fn(job) in the background and return the job"""
+    job = Job(kind)
+    _jobs[job.id] = job
+
+    task = asyncio.create_task(_run(job, fn))
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+
+    return job
+
+
+async def _run(job: Job, fn: Callable[[Job], Awaitable[Any]]):
+    job.status = "running"
+    try:
+        with metrics.job_timings(job.kind):
+            job.result = await fn(job)
+        job.status = "done"
+        job.progress = 1.0
+    except Exception as e:
+        logger.exception("Job %s (%s) failed", job.id, job.kind)
+        job.status = "failed"
+        job.error = str(e)
+    finally:
+        job.finished = time.time()
+        _prune()
+
+
+def _prune():
+    """Forget the oldest finished jobs"""
+    finished = [j for j in _jobs.values() if j.finished is not None]
+    if len(finished) > MAX_FINISHED_JOBS:
+        finished.sort(key=lambda j: j.created)
+        for j in finished[: len(finished) - MAX_FINISHED_JOBS]:
+            del _jobs[j.id]
@@ -1,10 +1,25 @@
+import asyncio
 import logging
+from contextlib import asynccontextmanager, suppress
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse
 
+from . import (
+    async_database,
+    backend,
+    database,
+    memory_database,
+    metrics,
+    neo4jsbml,
+    similarity,
+)
+from .routes import debug as debug_routes
+from .routes import jobs as job_routes
 from .routes import merge as merge_routes
+from .routes import metrics as metrics_routes
 from .routes import model as model_routes
 from .routes import node as node_routes
 from .routes import query as query_routes
@@ -14,8 +29,37 @@ from .routes import subgraph as subgraph_routes
 logger = logging.getLogger(__name__)
 
 
+def open_backend() -> async_database.AsyncDatabase | memory_database.MemoryDatabase:
+    """Create the configured storage backend"""
+    if backend.Config.get().type == "memory":
+        return memory_database.MemoryDatabase()
+    return async_database.AsyncDatabase(database.Config.get())
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # a single backend (and connection pool) is shared by all requests,
+    # connectivity is verified once here and then periodically in the background
+    async with open_backend() as db:
+        app.state.db = db
+
+        await db.startup()
+        await similarity.load_index(db)
+
+        health_check = asyncio.create_task(db.health_check())
+        try:
+            yield
+        finally:
+            health_check.cancel()
+            # let it finish before the driver is closed
+            with suppress(asyncio.CancelledError):
+                await health_check
+            # waits for running imports, keep the event loop responsive meanwhile
+            await asyncio.to_thread(neo4jsbml.close_pool)
+
+
 # main api object
-api = FastAPI()
+api = FastAPI(lifespan=lifespan)
 
 api.add_middleware(GZipMiddleware)
 api.add_middleware(
@@ -25,6 +69,13 @@ api.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# outermost, so that response sizes are measured after compression
+api.add_middleware(metrics.MetricsMiddleware)
+
+
+@api.exception_handler(backend.UnsupportedError)
+async def unsupported(request: Request, e: backend.UnsupportedError) -> JSONResponse:
+    return JSONResponse({"detail": str(e)}, status_code=501)
 
 
 api.include_router(model_routes.router)
@@ -33,3 +84,6 @@ api.include_router(relationship_routes.router)
 api.include_router(merge_routes.router)
 api.include_router(query_routes.router)
 api.include_router(subgraph_routes.router)
+api.include_router(job_routes.router)
+api.include_router(debug_routes.router)
+api.include_router(metrics_routes.router)
@@ -0,0 +1,400 @@
+import bisect
+import logging
+import threading
+from collections.abc import AsyncGenerator, Iterable
+from typing import Any, cast
+
+import networkx as nx
+
+from . import cache, graph
+from .backend import UnsupportedError
+from .edges import Edge
+from .nodes import Node
+
+logger = logging.getLogger(__name__)
+
+#####################
+## in-memory graph ##
+#####################
+
+# the whole graph held in a networkx graph in the server process, with the same
+# node/edge attributes as the graphs read from Neo4j, and indexes by uuid, label
+# and identifier - it isn't persisted, and isn't shared between processes
+
+
+class MemoryStore:
+    """A graph indexed by uuid, label and identifier, safe to use from several threads"""
+
+    graph: nx.MultiDiGraph
+    # endpoints of every relationship, by uuid
+    edges: dict[str, tuple[str, str]]
+    # node uuids by label, and by identifier
+    labels: dict[str, set[str]]
+    identifiers: dict[str, set[str]]
+
+    def __init__(self) -> None:
+        self.graph = nx.MultiDiGraph()
+        self.edges = {}
+        self.labels = {}
+        self.identifiers = {}
+
+        # imports write from worker threads
+        self.lock = threading.RLock()
+
+        # sorted uuids for paging, rebuilt after writes
+        self._node_order: list[str] | None = None
+        self._edge_order: list[str] | None = None
+
+    def _changed(self):
+        self._node_order = None
+        self._edge_order = None
+        cache.generation.bump()
+
+    def _index(self, node: Node):
+        self.labels.setdefault(node.label, set()).add(node.uuid)
+        for identifier in node.identifiers:
+            self.identifiers.setdefault(identifier, set()).add(node.uuid)
+
+    def _unindex(self, node: Node):
+        self.labels.get(node.label, set()).discard(node.uuid)
+        for identifier in node.identifiers:
+            self.identifiers.get(identifier, set()).discard(node.uuid)
+
+    def node(self, uuid: str) -> Node:
+        return cast(Node, self.graph.nodes[uuid]["node"])
+
+    def edge(self, uuid: str) -> Edge:
+        start, end = self.edges[uuid]
+        return cast(Edge, self.graph.edges[start, end, uuid]["edge"])
+
+    ############
+    ## writes ##
+    ############
+
+    def _merge_node(self, node: Node):
+        existing = self.graph.nodes.get(node.uuid)
+        if existing is not None:
+            old = cast(Node, existing["node"])
+            self._unindex(old)
+            # like SET n += $props, existing properties are kept
+            node = Node.create(
+                node.uuid,
+                node.label,
+                {**old.properties, **node.properties},
+                node.identifiers,
+            )
+        self.graph.add_node(node.uuid, node=node)
+        self._index(node)
+
+    def _merge_edge(self, edge: Edge):
+        if edge.start_node not in self.graph or edge.end_node not in self.graph:
+            return
+
+        if edge.uuid in self.edges:
+            old = self.edge(edge.uuid)
+            self._delete_edge(edge.uuid)
+            # like SET r += $props, existing properties are kept
+            edge = edge.copy(properties={**old.properties, **edge.properties})
+
+        self.graph.add_edge(edge.start_node, edge.end_node, key=edge.uuid, edge=edge)
+        self.edges[edge.uuid] = (edge.start_node, edge.end_node)
+
+    def _delete_node(self, uuid: str):
+        if uuid not in self.graph:
+            return
+        for _, _, key in list(self.graph.in_edges(uuid, keys=True)):
+            del self.edges[key]
+        for _, _, key in list(self.graph.out_edges(uuid, keys=True)):
+            self.edges.pop(key, None)
+        self._unindex(self.node(uuid))
+        self.graph.remove_node(uuid)
+
+    def _delete_edge(self, uuid: str):
+        ends = self.edges.pop(uuid, None)
+        if ends is not None:
+            self.graph.remove_edge(*ends, key=uuid)
+
+    def add_graph(self, g: nx.MultiDiGraph):
+        """Add all nodes and relationships of a graph, like an import"""
+        with self.lock:
+            for _, node in g.nodes.data("node"):
+                self._merge_node(node)
+            for _, _, edge in g.edges.data("edge"):
+                self._merge_edge(edge)
+            self._changed()
+
+    def merge_node(self, node: Node):
+        with self.lock:
+            self._merge_node(node)
+            self._changed()
+
+    def delete_node(self, uuid: str):
+        with self.lock:
+            self._delete_node(uuid)
+            self._changed()
+
+    def merge_edge(self, edge: Edge):
+        with self.lock:
+            self._merge_edge(edge)
+            self._changed()
+
+    def delete_edge(self, uuid: str):
+        with self.lock:
+            self._delete_edge(uuid)
+            self._changed()
+
+    def apply(self, plan: graph.MergePlan):
+        """Apply a merge plan from graph.merge_nodes, in the same order as the Neo4j backend"""
+        with self.lock:
+            for edge in plan.relationships.values():
+                self._merge_edge(edge)
+            for uuid in plan.deleted:
+                self._delete_node(uuid)
+            if plan.node is not None:
+                self._merge_node(plan.node)
+            self._changed()
+
+    def clear(self):
+        with self.lock:
+            self.graph.clear()
+            self.edges.clear()
+            self.labels.clear()
+            self.identifiers.clear()
+            self._changed()
+
+    ###########
+    ## reads ##
+    ###########
+
+    def subgraph(self, uuids: Iterable[str]) -> nx.MultiDiGraph:
+        """Return a copy of the subgraph induced by the given nodes"""
+        with self.lock:
+            return nx.MultiDiGraph(self.graph.subgraph(uuids))
+
+    def components(self, uuids: Iterable[str]) -> nx.MultiDiGraph:
+        """Return everything reachable from the given nodes, in either direction, like apoc.path.subgraphAll"""
+        with self.lock:
+            undirected = self.graph.to_undirected(as_view=True)
+            reachable: set[str] = set()
+            for uuid in uuids:
+                if uuid in self.graph and uuid not in reachable:
+                    reachable |= nx.node_connected_component(undirected, uuid)
+            return nx.MultiDiGraph(self.graph.subgraph(reachable))
+
+    def neighbourhoods(self, uuids: Iterable[str]) -> nx.MultiDiGraph:
+        """Return the given nodes, their relationships and their immediate neighbours"""
+        ret = nx.MultiDiGraph()
+        with self.lock:
+            for uuid in uuids:
+                if uuid not in self.graph:
+                    continue
+                for start, end, key, edge in [
+                    *self.graph.out_edges(uuid, keys=True, data="edge"),
+                    *self.graph.in_edges(uuid, keys=True, data="edge"),
+                ]:
+                    ret.add_node(start, node=self.node(start))
+                    ret.add_node(end, node=self.node(end))
+                    ret.add_edge(start, end, key=key, edge=edge)
+        return ret
+
+    def find(self, label: str, property: str, value: str) -> list[str]:
+        """Return the uuids of the nodes with the given label and property value"""
+        with self.lock:
+            return [
+                uuid
+                for uuid in self.labels.get(label, ())
+                if self.node(uuid).properties.get(property) == value
+            ]
+
+    def model_identifiers(self) -> dict[str, set[str]]:
+        with self.lock:
+            undirected = self.graph.to_undirected(as_view=True)
+            return {
+                uuid: {
+                    identifier
+                    for n in nx.node_connected_component(undirected, uuid)
+                    for identifier in self.node(n).identifiers
+                }
+                for uuid in self.labels.get("Model", ())
+            }
+
+    def node_page(self, limit: int | None, after: str | None) -> list[Node]:
+        with self.lock:
+            if self._node_order is None:
+                self._node_order = sorted(self.graph)
+            uuids = _page(self._node_order, limit, after)
+            return [self.node(uuid) for uuid in uuids]
+
+    def edge_page(self, limit: int | None, after: str | None) -> list[Edge]:
+        with self.lock:
+            if self._edge_order is None:
+                self._edge_order = sorted(self.edges)
+            uuids = _page(self._edge_order, limit, after)
+            return [self.edge(uuid) for uuid in uuids]
+
+
+def _page(order: list[str], limit: int | None, after: str | None) -> list[str]:
+    start = 0 if after is None else bisect.bisect_right(order, after)
+    end = None if limit is None else start + limit
+    return order[start:end]
+
+
+# the store of this process, shared by the backend and the import writers
+store = MemoryStore()
+
+
+async def _stream(g: nx.MultiDiGraph) -> AsyncGenerator[Node | Edge, None]:
+    for _, node in g.nodes.data("node"):
+        yield node
+    for _, _, edge in g.edges.data("edge"):
+        yield edge
+
+
+class MemoryDatabase:
+    """Backend keeping the graph in memory, see backend.Backend"""
+
+    def __init__(self, s: MemoryStore = store) -> None:
+        self.store = s
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        pass
+
+    async def startup(self):
+        pass
+
+    async def health_check(self):
+        pass
+
+    async def get_model_sketches(self) -> dict[str, list[int]]:
+        # sketches are added to the similarity index at import time
+        return {}
+
+    async def get_graph(self) -> nx.MultiDiGraph:
+        with self.store.lock:
+            return nx.MultiDiGraph(self.store.graph)
+
+    async def get_model(self, uuid: str) -> nx.MultiDiGraph:
+        if uuid not in self.store.labels.get("Model", ()):
+            return nx.MultiDiGraph()
+        return self.store.components([uuid])
+
+    async def get_model_by_name(self, name: str) -> nx.MultiDiGraph:
+        return self.store.components(self.store.find("Model", "name", name))
+
+    async def get_model_by_node(
+        self, label: str, property: str, value: str
+    ) -> nx.MultiDiGraph:
+        if not label.isalnum():
+            raise ValueError("invalid label")
+        if not property.isalnum():
+            raise ValueError("invalid property")
+        return self.store.components(self.store.find(label, property, value))
+
+    async def get_model_by_node_uuid(self, uuid: str) -> nx.MultiDiGraph:
+        return self.store.components([uuid])
+
+    async def get_subgraphs_by_uuids(self, uuids: list[str]) -> nx.MultiDiGraph:
+        return self.store.neighbourhoods(uuids)
+
+    async def get_subgraphs_by_identifier(self, identifier: str) -> nx.MultiDiGraph:
+        with self.store.lock:
+            uuids = list(self.store.identifiers.get(identifier, ()))
+        return self.store.neighbourhoods(uuids)
+
+    async def get_model_identifiers(self) -> dict[str, set[str]]:
+        return self.store.model_identifiers()
+
+    async def stream_all(self) -> AsyncGenerator[Node | Edge, None]:
+        async for entity in _stream(await self.get_graph()):
+            yield entity
+
+    async def stream_model(self, uuid: str) -> AsyncGenerator[Node | Edge, None]:
+        async for entity in _stream(await self.get_model(uuid)):
+            yield entity
+
+    async def stream_model_by_name(
+        self, name: str
+    ) -> AsyncGenerator[Node | Edge, None]:
+        async for entity in _stream(await self.get_model_by_name(name)):
+            yield entity
+
+    async def stream_model_by_node(
+        self, label: str, property: str, value: str
+    ) -> AsyncGenerator[Node | Edge, None]:
+        g = await self.get_model_by_node(label, property, value)
+        async for entity in _stream(g):
+            yield entity
+
+    async def stream_model_by_node_uuid(
+        self, uuid: str
+    ) -> AsyncGenerator[Node | Edge, None]:
+        async for entity in _stream(await self.get_model_by_node_uuid(uuid)):
+            yield entity
+
+    async def stream_subgraphs_by_identifier(
+        self, identifier: str
+    ) -> AsyncGenerator[Node | Edge, None]:
+        async for entity in _stream(await self.get_subgraphs_by_identifier(identifier)):
+            yield entity
+
+    async def get_nodes(
+        self, limit: int | None = None, after: str | None = None
+    ) -> list[Node]:
+        return self.store.node_page(limit, after)
+
+    async def count_nodes(self) -> int:
+        return self.store.graph.number_of_nodes()
+
+    async def get_node(self, uuid: str) -> Node:
+        with self.store.lock:
+            return self.store.node(uuid)
+
+    async def merge_node(self, node: Node):
+        self.store.merge_node(node)
+
+    async def delete_node(self, node: Node):
+        self.store.delete_node(node.uuid)
+
+    async def get_relationships(
+        self, limit: int | None = None, after: str | None = None
+    ) -> list[Edge]:
+        return self.store.edge_page(limit, after)
+
+    async def count_relationships(self) -> int:
+        return len(self.store.edges)
+
+    async def get_relationship(self, uuid: str) -> Edge:
+        with self.store.lock:
+            return self.store.edge(uuid)
+
+    async def merge_relationship(self, edge: Edge):
+        self.store.merge_edge(edge)
+
+    async def delete_relationship(self, edge: Edge):
+        self.store.delete_edge(edge.uuid)
+
+    async def delete_all(self):
+        self.store.clear()
+
+    async def write_merge_plan(self, plan: graph.MergePlan):
+        self.store.apply(plan)
+
+    # Cypher queries need Neo4j
+
+    def limited_query(self, q: str, limit: int | None) -> Any:
+        raise UnsupportedError("queries aren't supported by the memory backend")
+
+    async def query_limited(self, q: str, limit: int | None) -> Any:
+        self.limited_query(q, limit)
+
+    async def query_graph_limited(self, q: str, limit: int | None) -> Any:
+        self.limited_query(q, limit)
+
+    async def query_nodes_limited(self, q: str, limit: int | None) -> Any:
+        self.limited_query(q, limit)
+
+    async def query_relationships_limited(self, q: str, limit: int | None) -> Any:
+        self.limited_query(q, limit)
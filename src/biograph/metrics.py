@@ -0,0 +1,287 @@
+import bisect
+import functools
+import logging
+import threading
+import time
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from pydantic import BaseModel
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from . import config
+
+logger = logging.getLogger(__name__)
+
+
+class Config(BaseModel):
+    # add a Server-Timing header with the time spent in each stage to responses
+    server_timing: bool = False
+
+    @classmethod
+    def get(cls):
+        return config.get(cls, "metrics", optional=True)
+
+
+#############
+## metrics ##
+#############
+
+# a minimal in-process implementation of Prometheus histograms and gauges,
+# rendered in the text exposition format on /metrics
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (1e3, 1e4, 1e5, 1e6, 1e7, 1e8)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: tuple[str, ...], values: tuple[str, ...]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class Histogram:
+    name: str
+    help: str
+    labels: tuple[str, ...]
+    buckets: tuple[float, ...]
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labels: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+    ) -> None:
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+
+        self._lock = threading.Lock()
+        # per label values: the count of each bucket, then the sum
+        self._values: dict[tuple[str, ...], list[float]] = {}
+
+    def observe(self, value: float, *labels: str):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            values = self._values.get(labels)
+            if values is None:
+                values = self._values[labels] = [0] * (len(self.buckets) + 2)
+            values[i] += 1
+            values[-1] += value
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            items = [(k, list(v)) for k, v in sorted(self._values.items())]
+
+        for labels, values in items:
+            # buckets are cumulative
+            count = 0
+            for le, n in zip((*self.buckets, "+Inf"), values):
+                count += int(n)
+                bucket = _format_labels((*self.labels, "le"), (*labels, str(le)))
+                yield f"{self.name}_bucket{bucket} {count}"
+            lbl = _format_labels(self.labels, labels)
+            yield f"{self.name}_sum{lbl} {values[-1]}"
+            yield f"{self.name}_count{lbl} {count}"
+
+
+class Gauge:
+    name: str
+    help: str
+
+    def __init__(self, name: str, help: str) -> None:
+        self.name = name
+        self.help = help
+
+        self._lock = threading.Lock()
+        self._value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount: float = 1.0):
+        self.inc(-amount)
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} gauge"
+        yield f"{self.name} {self._value}"
+
+
+REQUEST_DURATION = Histogram(
+    "biograph_request_duration_seconds",
+    "Time taken to handle a request",
+    ("method", "route", "status"),
+)
+STAGE_DURATION = Histogram(
+    "biograph_stage_duration_seconds",
+    "Time spent in each stage of handling a request",
+    ("route", "stage"),
+)
+JOB_STAGE_DURATION = Histogram(
+    "biograph_job_stage_duration_seconds",
+    "Time spent in each stage of running a background job",
+    ("kind", "stage"),
+)
+RESPONSE_SIZE = Histogram(
+    "biograph_response_size_bytes",
+    "Size of response bodies as sent, after compression",
+    ("route",),
+    SIZE_BUCKETS,
+)
+IN_FLIGHT = Gauge(
+    "biograph_requests_in_flight",
+    "Number of requests currently being handled",
+)
+
+registry: list[Histogram | Gauge] = [
+    REQUEST_DURATION,
+    STAGE_DURATION,
+    JOB_STAGE_DURATION,
+    RESPONSE_SIZE,
+    IN_FLIGHT,
+]
+
+
+def render() -> str:
+    """Render all metrics in the Prometheus text format"""
+    return "\n".join(line for m in registry for line in m.render()) + "\n"
+
+
+###########
+## spans ##
+###########
+
+# stages timed while handling a request are collected per request, and only
+# added to the histograms once the route is known - background jobs collect
+# theirs the same way and record them by job kind, as they outlive the request
+# that started them - stages timed elsewhere (by scripts, or in threads and
+# processes that don't copy the context) are recorded without a route
+
+
+class RequestTimings:
+    """Seconds spent in each stage while handling a request or running a job"""
+
+    stages: dict[str, float]
+
+    def __init__(self) -> None:
+        self.stages = {}
+        # stages are also timed in threads started with asyncio.to_thread
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, seconds: float):
+        with self._lock:
+            self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def header(self) -> str:
+        return ", ".join(f"{s};dur={t * 1000:.1f}" for s, t in self.stages.items())
+
+
+_current: ContextVar[RequestTimings | None] = ContextVar("timings", default=None)
+
+
+def observe(stage: str, seconds: float):
+    """Record time spent in a stage"""
+    timings = _current.get()
+    if timings is None:
+        STAGE_DURATION.observe(seconds, "", stage)
+    else:
+        timings.add(stage, seconds)
+
+
+@contextmanager
+def span(stage: str):
+    """Time the body of the with statement as a stage"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(stage, time.perf_counter() - start)
+
+
+@contextmanager
+def job_timings(kind: str):
+    """Collect the stages timed in the body of the with statement, and record them for a job of the given kind"""
+    timings = RequestTimings()
+    token = _current.set(timings)
+    try:
+        yield
+    finally:
+        _current.reset(token)
+        for stage, seconds in timings.stages.items():
+            JOB_STAGE_DURATION.observe(seconds, kind, stage)
+
+
+def timed[**P, R](stage: str) -> Callable[[Callable[P, R]], Callable[P, R]]:
+    """Decorator timing every call of a function as a stage"""
+
+    def decorator(fn: Callable[P, R]) -> Callable[P, R]:
+        @functools.wraps(fn)
+        def wrapper(*args: P.args, **kwargs: P.kwargs) -> R:
+            with span(stage):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording request latency, response size and in-flight requests"""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+        self.server_timing = Config.get().server_timing
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings = RequestTimings()
+        token = _current.set(timings)
+        start = time.perf_counter()
+        status = 500
+        size = 0
+
+        async def send_wrapper(message: Message):
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if self.server_timing:
+                    timings.add("app", time.perf_counter() - start)
+                    headers = list(message.get("headers", []))
+                    headers.append((b"server-timing", timings.header().encode()))
+                    message = {**message, "headers": headers}
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            IN_FLIGHT.dec()
+            _current.reset(token)
+
+            # the router stores the matched route in the scope, the path template
+            # is used rather than the path to keep the number of label values bounded
+            route = getattr(scope.get("route"), "path", "<unmatched>")
+            REQUEST_DURATION.observe(
+                time.perf_counter() - start, scope["method"], route, str(status)
+            )
+            RESPONSE_SIZE.observe(size, route)
+            for stage, seconds in timings.stages.items():
+                if stage != "app":
+                    STAGE_DURATION.observe(seconds, route, stage)
@@ -0,0 +1,101 @@
+import logging
+from collections.abc import AsyncIterator
+from typing import Annotated, Any
+
+import neo4j.time
+import orjson
+from fastapi import Header
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+
+from . import api_models
+from .async_database import LimitedQuery, stream_entities
+from .edges import Edge
+from .nodes import Node
+
+logger = logging.getLogger(__name__)
+
+#########################
+## NDJSON graph export ##
+#########################
+
+# graph routes stream their result as newline delimited JSON when the client
+# sends `Accept: application/x-ndjson`, one {"node": ...} or {"relationship": ...}
+# object per line, without ever building the whole graph in memory
+
+MEDIA_TYPE = "application/x-ndjson"
+
+# OpenAPI documentation for the alternative response type
+RESPONSES: dict[int | str, dict[str, Any]] = {
+    200: {"content": {MEDIA_TYPE: {"schema": {"type": "string"}}}},
+}
+
+# FastAPI dependency
+AcceptHeader = Annotated[str | None, Header()]
+
+
+def accepts(accept: str | None) -> bool:
+    """Check if the client asked for an NDJSON response"""
+    return accept is not None and MEDIA_TYPE in accept
+
+
+def encode(entity: Node | Edge) -> bytes:
+    """Encode a node or relationship as a single NDJSON line"""
+    if isinstance(entity, Node):
+        return orjson.dumps({"node": api_models.node_dict(entity)}) + b"\n"
+    else:
+        return (
+            orjson.dumps({"relationship": api_models.relationship_dict(entity)}) + b"\n"
+        )
+
+
+def response(stream: AsyncIterator[Node | Edge]) -> StreamingResponse:
+    """Build a streaming response from one of the backend stream_* methods"""
+
+    async def body():
+        async for entity in stream:
+            yield encode(entity)
+
+    return StreamingResponse(body(), media_type=MEDIA_TYPE)
+
+
+# user queries returning arbitrary data are streamed as one {"row": ...} object
+# per record, and a cut off result ends with a {"truncated": reason} line
+
+
+def _default(value: Any) -> Any:
+    # neo4j temporal values, which orjson doesn't know - anything else is left to
+    # FastAPI's encoder, like in JSON responses
+    if isinstance(
+        value,
+        (neo4j.time.Date, neo4j.time.Time, neo4j.time.DateTime, neo4j.time.Duration),
+    ):
+        return value.iso_format()
+    return jsonable_encoder(value)
+
+
+def encode_row(row: dict[str, Any]) -> bytes:
+    """Encode a record as a single NDJSON line"""
+    return orjson.dumps({"row": row}, default=_default) + b"\n"
+
+
+def encode_truncated(reason: str) -> bytes:
+    """Encode the marker ending a cut off result"""
+    return orjson.dumps({"truncated": reason}) + b"\n"
+
+
+def query_response(records: LimitedQuery, graph: bool = False) -> StreamingResponse:
+    """Build a streaming response from a user query, forwarding records as they are pulled"""
+
+    async def body():
+        if graph:
+            async for entity in stream_entities(records):
+                yield encode(entity)
+        else:
+            async for record in records:
+                yield encode_row(record.data())
+
+        if records.truncated is not None:
+            yield encode_truncated(records.truncated)
+
+    return StreamingResponse(body(), media_type=MEDIA_TYPE)
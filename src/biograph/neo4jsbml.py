@@ -1,15 +1,38 @@
+import asyncio
+import functools
+import hashlib
+import io
 import logging
-from typing import cast
+import multiprocessing
+import multiprocessing.util
+import os
+import tarfile
+import threading
+import zipfile
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Future,
+    ProcessPoolExecutor,
+    wait,
+)
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Literal, cast
 from urllib.parse import urlparse
 from tempfile import NamedTemporaryFile
 import uuid
 
 import libsbml
 import neo4j
+import networkx as nx
+import numpy as np
 from neo4jsbml import arrows, connect, sbml
 from pydantic import BaseModel
 
-from . import config, database
+from . import backend, cache, config, database, memory_database, similarity
+from .cache import LRUCache
+from .edges import Edge
+from .nodes import Node
 
 logger = logging.getLogger(__name__)
 
@@ -17,15 +40,111 @@ logger = logging.getLogger(__name__)
 class Config(BaseModel):
     schema_path: str
 
+    # number of processes importing (parsing, mapping and writing) SBML files,
+    # shared by all imports - defaults to the number of CPUs
+    parse_processes: int | None = None
+    # number of models being written to the database at the same time, by all
+    # of those processes
+    writers: int = 4
+
+    # how mapped models are written to the database - "neo4jsbml" uses neo4jsbml's
+    # own writer followed by tag-based cleanup, "native" writes each model with
+    # batched queries in a single transaction
+    write_method: Literal["neo4jsbml", "native"] = "neo4jsbml"
+
     @classmethod
     def get(cls):
         return config.get(cls, "neo4jsbml")
 
 
-# this is mostly copied from neo4jsbml, but edited
-# to allow passing in the sbml model as a string
-def sbml_to_neo4j(xml: str, schema: str | None):
+SBML_EXTENSIONS = (".xml", ".sbml")
+
+
+class PreparedModel:
+    """An SBML model mapped onto the schema, ready to be written to the database"""
+
+    # random tag to prevent neo4jsbml from auto-merging nodes, it is removed
+    # from all nodes and edges after the import is done
+    tag: str
+
+    nodes: Any
+    relationships: Any | None
+
+    def __init__(self, tag: str, nodes: Any, relationships: Any | None) -> None:
+        self.tag = tag
+        self.nodes = nodes
+        self.relationships = relationships
+
+
+class BatchResult:
+    """The outcome of import_batch"""
+
+    # names of the files that were imported
+    imported: list[str]
+    # error message of each file that failed to import, by name
+    failed: dict[str, str]
+
+    def __init__(self) -> None:
+        self.imported = []
+        self.failed = {}
+
+
+@functools.cache
+def _schema_cache() -> LRUCache[bytes, arrows.Arrows]:
+    cfg = cache.Config.get()
+    return cache.register("schemas", LRUCache(cfg.schema_size))
+
+
+def load_schema(schema: str) -> arrows.Arrows:
+    """Parse an Arrows schema JSON, memoized by content hash"""
+    key = hashlib.blake2b(schema.encode(), digest_size=16).digest()
+
+    schema_cache = _schema_cache()
+    arr = schema_cache.get(key)
+    if arr is None:
+        # need a tempfile because neo4jsbml needs a file name
+        with NamedTemporaryFile("w+") as f:
+            f.write(schema)
+            f.flush()
+            arr = arrows.Arrows.from_json(f.name)
+        schema_cache.put(key, arr)
+
+    return arr
+
+
+# (path, modification time, contents) of the configured schema file
+_configured_schema: tuple[str, int, str] | None = None
+
+
+def configured_schema() -> str:
+    """Return the contents of the configured schema file, only reading it again when it changes"""
+    global _configured_schema
+    cfg = Config.get()
+
+    # checking the modification time also picks up schemas uploaded to other workers
+    mtime = os.stat(cfg.schema_path).st_mtime_ns
+    cached = _configured_schema
+    if cached is not None and cached[0] == cfg.schema_path and cached[1] == mtime:
+        return cached[2]
+
+    with open(cfg.schema_path) as f:
+        schema = f.read()
+    _configured_schema = (cfg.schema_path, mtime, schema)
+    return schema
+
+
+def set_configured_schema(schema: str):
+    """Replace the configured schema file"""
+    global _configured_schema
     cfg = Config.get()
+
+    with open(cfg.schema_path, "w") as f:
+        f.write(schema)
+    _configured_schema = None
+
+
+def connect_neo4j() -> connect.Connect:
+    """Create a neo4jsbml connection using the database config"""
     db_cfg = database.Config.get()
 
     parsed_uri = urlparse(db_cfg.uri)
@@ -41,50 +160,545 @@ def sbml_to_neo4j(xml: str, schema: str | None):
     driver = cast(neo4j.Driver, conn.driver)
     driver.verify_connectivity()
 
+    return conn
+
+
+# called with the name of each import stage as it starts
+StageCallback = Callable[[str], None]
+
+
+def _no_stage(stage: str):
+    pass
+
+
+# this is mostly copied from neo4jsbml, but edited
+# to allow passing in the sbml model as a string
+def prepare(
+    xml: str, arr: arrows.Arrows, stage: StageCallback = _no_stage
+) -> PreparedModel:
+    """Parse an SBML model and map it onto the schema - CPU-bound, doesn't touch the database"""
+    stage("parse")
     logger.info("Loading SBML")
     doc = libsbml.readSBMLFromString(xml)
     errors = doc.getNumErrors()
     if errors > 0:
         raise ValueError("SBML parse error")
 
-    # use a random tag to prevent neo4jsbml from auto-merging nodes
-    # will remove the tag from all nodes and edges after import is done
     tag = str(uuid.uuid4())
 
     sbm = sbml.SbmlToNeo4j(tag, document=doc)
 
-    logger.info("Loading schema")
-    if schema is not None:
-        # need a tempfile because neo4jsbml needs a file name
-        with NamedTemporaryFile("w+") as f:
-            f.write(schema)
-            arr = arrows.Arrows.from_json(f.name)
-    else:
-        arr = arrows.Arrows.from_json(cfg.schema_path)
-
+    stage("map nodes")
     logging.info("Map schema to data - nodes")
     nod = sbm.format_nodes(nodes=arr.nodes)
 
     rel = None
     if arr.relationships:
+        stage("map relationships")
         logging.info("Map schema to data - relationships")
         rel = sbm.format_relationships(relationships=arr.relationships)
 
+    return PreparedModel(tag, nod, rel)
+
+
+def write(
+    conn: connect.Connect, model: PreparedModel, stage: StageCallback = _no_stage
+) -> dict[str, np.ndarray]:
+    """Write a prepared model to the database, removing everything written so far on error - returns the sketches of the models written"""
+    driver = cast(neo4j.Driver, conn.driver)
+    tag = model.tag
+    labels = {n.label for n in model.nodes}
+
     try:
+        stage("write")
         logging.info("Import into neo4j - nodes")
-        conn.create_nodes(nodes=nod)
+        conn.create_nodes(nodes=model.nodes)
 
-        if rel:
+        if model.relationships:
             logging.info("Import into neo4j - relationships")
-            conn.create_relationships(relationships=rel)
+            conn.create_relationships(relationships=model.relationships)
         else:
             logging.info("No relationships created")
 
+        stage("cleanup")
         with driver.session(default_access_mode=neo4j.WRITE_ACCESS) as session:
+            database.label_by_tag(session, tag, labels)
             database.delete_dangling_nodes_by_tag(session, tag)
             database.assign_uuids_by_tag(session, tag)
+            database.set_identifiers_by_tag(session, tag)
+            sketches = similarity.set_sketches_by_tag(session, tag)
             database.remove_tag(session, tag)
+
+        return sketches
     except Exception as e:
         logging.error("Error importing sbml into neo4j: %s", e)
         with driver.session(default_access_mode=neo4j.WRITE_ACCESS) as session:
-            database.delete_all_by_tag(session, tag)
+            database.delete_all_by_tag(session, tag, labels)
+        raise
+
+
+def _node_key(label: str, properties: dict[str, Any]) -> tuple:
+    # neo4jsbml identifies nodes by label and properties - relationships refer to
+    # their endpoints by value, not by reference
+    return (label, tuple(sorted((k, repr(v)) for k, v in properties.items())))
+
+
+def to_graph(model: PreparedModel) -> nx.MultiDiGraph:
+    """Build the graph of a mapped model with new uuids, leaving out nodes that aren't connected to a Model"""
+    g = nx.MultiDiGraph()
+    uuids: dict[tuple, str] = {}
+
+    def add_node(n: Any) -> str:
+        properties = {k: v for k, v in n.properties.items() if k != "tag"}
+        key = _node_key(n.label, properties)
+        node_uuid = uuids.get(key)
+        if node_uuid is None:
+            node_uuid = str(uuid.uuid4())
+            uuids[key] = node_uuid
+            g.add_node(node_uuid, node=Node.create(node_uuid, n.label, properties))
+        return node_uuid
+
+    for n in model.nodes:
+        add_node(n)
+
+    for r in model.relationships or []:
+        start = add_node(r.source)
+        end = add_node(r.target)
+        properties = {k: v for k, v in r.properties.items() if k != "tag"}
+        edge = Edge.create(str(uuid.uuid4()), r.label, start, end, properties)
+        g.add_edge(start, end, key=edge.uuid, edge=edge)
+
+    reachable: set[str] = set()
+    undirected = g.to_undirected(as_view=True)
+    for node_uuid, node in g.nodes.data("node"):
+        if node.label == "Model" and node_uuid not in reachable:
+            reachable |= nx.node_connected_component(undirected, node_uuid)
+    g.remove_nodes_from([n for n in list(g) if n not in reachable])
+
+    return g
+
+
+def _model_sketches(g: nx.MultiDiGraph) -> dict[str, np.ndarray]:
+    """Compute the similarity sketch of every model in a graph built by to_graph"""
+    undirected = g.to_undirected(as_view=True)
+    return {
+        node_uuid: similarity.sketch(
+            similarity.shingles(
+                g.subgraph(nx.node_connected_component(undirected, node_uuid))
+            )
+        )
+        for node_uuid, node in g.nodes.data("node")
+        if node.label == "Model"
+    }
+
+
+def write_native(
+    db: database.Database, model: PreparedModel, stage: StageCallback = _no_stage
+) -> dict[str, np.ndarray]:
+    """Write a prepared model to the database in a single transaction - returns the sketches of the models written"""
+    stage("write")
+    g = to_graph(model)
+    sketches = _model_sketches(g)
+
+    with db.rw_session() as session:
+        database.write_model(session, g, {k: v.tolist() for k, v in sketches.items()})
+
+    return sketches
+
+
+#################
+## import pool ##
+#################
+
+# libsbml is CPU-bound and holds the GIL, so SBML files are imported in a pool of
+# processes shared by all imports, so that imports never run on the event loop -
+# each file is parsed, mapped and written in the same process, so that only the
+# XML goes in and only plain data comes back: neo4jsbml's objects never cross a
+# process boundary, and are never used by more than one thread at a time
+
+
+class ImportedModel:
+    """What a pool process sends back after importing a model, only plain data so that it pickles"""
+
+    # similarity sketch of each imported model, by uuid
+    sketches: dict[str, np.ndarray]
+    # with the memory backend, the graph to add to the store of the server process
+    nodes: list[tuple[str, str, dict[str, Any]]]
+    relationships: list[tuple[str, str, str, str, dict[str, Any]]]
+
+    def __init__(
+        self, sketches: dict[str, np.ndarray], g: nx.MultiDiGraph | None = None
+    ) -> None:
+        self.sketches = sketches
+        self.nodes = []
+        self.relationships = []
+        if g is not None:
+            for _, n in g.nodes.data("node"):
+                self.nodes.append((n.uuid, n.label, n.properties))
+            for _, _, e in g.edges.data("edge"):
+                self.relationships.append(
+                    (e.uuid, e.typ, e.start_node, e.end_node, e.properties)
+                )
+
+    def to_graph(self) -> nx.MultiDiGraph:
+        g = nx.MultiDiGraph()
+        for node_uuid, label, properties in self.nodes:
+            g.add_node(node_uuid, node=Node.create(node_uuid, label, properties))
+        for edge_uuid, typ, start, end, properties in self.relationships:
+            edge = Edge.create(edge_uuid, typ, start, end, properties)
+            g.add_edge(start, end, key=edge_uuid, edge=edge)
+        return g
+
+
+# in pool processes: the queue that stage changes are reported back through, the
+# semaphore bounding the number of models written at the same time by all
+# processes, and how they are written
+_stage_queue: Any = None
+_write_slots: Any = None
+_write_method = "neo4jsbml"
+
+# in pool processes: the connections used to write, opened on first use
+_conn: connect.Connect | None = None
+_db: database.Database | None = None
+
+
+def _init_worker(stages: Any, write_slots: Any, write_method: str):
+    global _stage_queue, _write_slots, _write_method
+    _stage_queue = stages
+    _write_slots = write_slots
+    _write_method = write_method
+
+
+def _connection() -> connect.Connect:
+    global _conn
+    if _conn is None:
+        _conn = connect_neo4j()
+        driver = cast(neo4j.Driver, _conn.driver)
+        multiprocessing.util.Finalize(None, driver.close, exitpriority=10)
+    return _conn
+
+
+def _database() -> database.Database:
+    global _db
+    if _db is None:
+        _db = database.Database(database.Config.get())
+        multiprocessing.util.Finalize(None, _db.close, exitpriority=10)
+    return _db
+
+
+def _import_in_worker(key: str, xml: str, schema: str) -> ImportedModel:
+    def stage(name: str):
+        _stage_queue.put((key, name))
+
+    try:
+        model = prepare(xml, load_schema(schema), stage)
+
+        if _write_method == "memory":
+            # the store is in the server process, send the graph back to it
+            stage("write")
+            g = to_graph(model)
+            return ImportedModel(_model_sketches(g), g)
+
+        with _write_slots:
+            if _write_method == "native":
+                return ImportedModel(write_native(_database(), model, stage))
+            else:
+                return ImportedModel(write(_connection(), model, stage))
+    finally:
+        # the result comes back through the executor, separately from the stages -
+        # this marks that no more stages follow for the key
+        _stage_queue.put((key, None))
+
+
+class _PendingImport:
+    """An import submitted to the pool, finished once both its result and its last stage have arrived"""
+
+    stage: StageCallback
+    ret: Future[None]
+    result: Future[ImportedModel] | None
+    stages_done: bool
+
+    def __init__(self, stage: StageCallback) -> None:
+        self.stage = stage
+        self.ret = Future()
+        self.ret.set_running_or_notify_cancel()
+        self.result = None
+        self.stages_done = False
+
+
+class ImportPool:
+    """Process pool importing SBML models, with stage reporting"""
+
+    def __init__(self, processes: int, writers: int, write_method: str) -> None:
+        # spawn rather than fork, the server process is multi-threaded
+        mp_context = multiprocessing.get_context("spawn")
+
+        self._stages = mp_context.SimpleQueue()
+        self._pending: dict[str, _PendingImport] = {}
+        self._lock = threading.Lock()
+
+        self._write_method = write_method
+        self._processes = ProcessPoolExecutor(
+            processes,
+            mp_context,
+            initializer=_init_worker,
+            initargs=(self._stages, mp_context.BoundedSemaphore(writers), write_method),
+        )
+
+        threading.Thread(target=self._forward_stages, daemon=True).start()
+
+    def _forward_stages(self):
+        while True:
+            item = self._stages.get()
+            if item is None:
+                return
+            key, name = item
+            pending = self._pending.get(key)
+            if pending is None:
+                continue
+            if name is not None:
+                pending.stage(name)
+                continue
+            with self._lock:
+                pending.stages_done = True
+                finished = pending.result is not None
+            if finished:
+                self._complete(key)
+
+    def _result_done(self, key: str, fut: Future[ImportedModel]):
+        pending = self._pending[key]
+        with self._lock:
+            pending.result = fut
+            # a cancelled import never ran, and a crashed process sends no marker
+            finished = (
+                pending.stages_done
+                or fut.cancelled()
+                or isinstance(fut.exception(), BrokenProcessPool)
+            )
+        if finished:
+            self._complete(key)
+
+    def _complete(self, key: str):
+        pending = self._pending.pop(key)
+        assert pending.result is not None
+        try:
+            self._finish(pending.result.result())
+        except BaseException as e:
+            # the process may have written part of the model before cleaning it up
+            cache.generation.bump()
+            pending.ret.set_exception(e)
+        else:
+            pending.ret.set_result(None)
+
+    def _finish(self, model: ImportedModel):
+        """Apply the parts of an import that belong to the server process"""
+        if self._write_method == "memory":
+            memory_database.store.add_graph(model.to_graph())
+        for model_uuid, sketch in model.sketches.items():
+            similarity.index.add(model_uuid, sketch)
+        # the database writes were made in a pool process, which only bumped its own
+        # generation - this one is what the read caches of the server are keyed on
+        cache.generation.bump()
+
+    def submit(
+        self, xml: str, schema: str | None, stage: StageCallback = _no_stage
+    ) -> Future[None]:
+        """Import an SBML model in a pool process, using the given or the configured schema
+
+        The returned future is resolved after all of the model's stages have been reported
+        """
+        if schema is None:
+            schema = configured_schema()
+
+        key = str(uuid.uuid4())
+        pending = self._pending[key] = _PendingImport(stage)
+
+        try:
+            fut = self._processes.submit(_import_in_worker, key, xml, schema)
+        except BaseException:
+            del self._pending[key]
+            raise
+        fut.add_done_callback(functools.partial(self._result_done, key))
+        return pending.ret
+
+    def close(self):
+        """Stop the pool processes, waiting for the running imports - blocks, so run it in a thread from the event loop"""
+        self._processes.shutdown(cancel_futures=True)
+        self._stages.put(None)
+
+
+_pool: ImportPool | None = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ImportPool:
+    """Return the import pool of this process, creating it on first use"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            cfg = Config.get()
+            # the memory backend has no database to write to
+            if backend.Config.get().type == "memory":
+                write_method = "memory"
+            else:
+                write_method = cfg.write_method
+            _pool = ImportPool(
+                cfg.parse_processes or os.cpu_count() or 1,
+                cfg.writers,
+                write_method,
+            )
+        return _pool
+
+
+def close_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
+
+async def import_sbml(xml: str, schema: str | None, stage: StageCallback = _no_stage):
+    """Import an SBML model using the import pool, without blocking the event loop"""
+    await asyncio.wrap_future(get_pool().submit(xml, schema, stage))
+
+
+def sbml_to_neo4j(xml: str, schema: str | None):
+    """Import an SBML model using the import pool, blocking until it is done"""
+    get_pool().submit(xml, schema).result()
+
+
+##################
+## batch import ##
+##################
+
+
+def _sbml_entries(name: str, data: bytes) -> Iterator[tuple[str, Callable[[], bytes]]]:
+    """Yield the name of each SBML file in a file that is either SBML itself, or a zip or tar archive, and a function reading it"""
+    f = io.BytesIO(data)
+    if zipfile.is_zipfile(f):
+        with zipfile.ZipFile(f) as z:
+            for info in z.infolist():
+                if not info.is_dir() and info.filename.endswith(SBML_EXTENSIONS):
+                    yield f"{name}/{info.filename}", functools.partial(z.read, info)
+        return
+
+    f.seek(0)
+    try:
+        tar = tarfile.open(fileobj=f, mode="r:*")
+    except tarfile.TarError:
+        yield name, lambda: data
+        return
+
+    with tar:
+        for member in tar:
+            if member.isfile() and member.name.endswith(SBML_EXTENSIONS):
+                yield f"{name}/{member.name}", functools.partial(
+                    _read_member, tar, member
+                )
+
+
+def _read_member(tar: tarfile.TarFile, member: tarfile.TarInfo) -> bytes:
+    extracted = tar.extractfile(member)
+    return extracted.read() if extracted is not None else b""
+
+
+def _read_path(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def _sbml_path_entries(
+    paths: Iterable[str],
+) -> Iterator[tuple[str, Callable[[], bytes]]]:
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                for name in sorted(files):
+                    if name.endswith(SBML_EXTENSIONS):
+                        file = os.path.join(root, name)
+                        yield file, functools.partial(_read_path, file)
+        else:
+            yield from _sbml_entries(path, _read_path(path))
+
+
+# files are only read (and archives decompressed) one at a time, as the batch
+# import asks for them - they are yielded undecoded, import_batch reports files
+# that aren't UTF-8 text as failed
+
+
+def read_sbml_files(name: str, data: bytes) -> Iterator[tuple[str, bytes]]:
+    """Yield the (name, contents) of each SBML file in a file that is either SBML itself, or a zip or tar archive"""
+    for file, read in _sbml_entries(name, data):
+        yield file, read()
+
+
+def count_sbml_files(name: str, data: bytes) -> int:
+    """Count the SBML files read_sbml_files would yield, without reading them"""
+    return sum(1 for _ in _sbml_entries(name, data))
+
+
+def read_sbml_paths(paths: Iterable[str]) -> Iterator[tuple[str, bytes]]:
+    """Yield the (name, contents) of each SBML file in the given files, archives or directories"""
+    for file, read in _sbml_path_entries(paths):
+        yield file, read()
+
+
+def count_sbml_paths(paths: Iterable[str]) -> int:
+    """Count the SBML files read_sbml_paths would yield, without reading them"""
+    return sum(1 for _ in _sbml_path_entries(paths))
+
+
+def import_batch(
+    files: Iterable[tuple[str, bytes]],
+    schema: str | None,
+    total: int | None = None,
+    progress: Callable[[float], None] | None = None,
+) -> BatchResult:
+    """Import many (name, contents) SBML files using the import pool, continuing past files that fail"""
+    cfg = Config.get()
+    pool = get_pool()
+
+    processes = cfg.parse_processes or os.cpu_count() or 1
+    result = BatchResult()
+
+    # limit the number of files held in memory at once
+    max_importing = 2 * processes
+
+    files = iter(files)
+    importing: dict[Future[None], str] = {}
+
+    def fill():
+        while len(importing) < max_importing:
+            file = next(files, None)
+            if file is None:
+                return
+            name, data = file
+            try:
+                xml = data.decode()
+            except UnicodeDecodeError as e:
+                logger.warning("Skipping %s, it isn't UTF-8 text: %s", name, e)
+                result.failed[name] = f"not UTF-8 text: {e}"
+                continue
+            importing[pool.submit(xml, schema)] = name
+
+    fill()
+    while importing:
+        done, _ = wait(importing, return_when=FIRST_COMPLETED)
+        for fut in done:
+            name = importing.pop(fut)
+            try:
+                fut.result()
+                result.imported.append(name)
+            except Exception as e:
+                logger.error("Error importing %s: %s", name, e)
+                result.failed[name] = str(e)
+
+        if progress is not None and total:
+            progress((len(result.imported) + len(result.failed)) / total)
+        fill()
+
+    logger.info(
+        "Imported %d SBML files, %d failed", len(result.imported), len(result.failed)
+    )
+    return result
@@ -1,11 +1,15 @@
 from __future__ import annotations
 
+import functools
+import hashlib
 import logging
 from typing import Self
 
 import neo4j.graph
 from lxml import etree as xml
 
+from . import cache
+from .cache import LRUCache
 from .utils import get_subclasses
 
 logger = logging.getLogger(__name__)
@@ -21,55 +25,120 @@ ANNOTATION_NS = {
 }
 
 
+def get_identifiers(annotation: xml._Element | None, metaid: str | None) -> list[str]:
+    """Extract the identifiers from the RDF annotation of the element with the given metaid"""
+    identifiers = []
+    if annotation is not None and metaid:
+        for el_description in annotation.xpath(
+            "rdf:RDF/rdf:Description[@rdf:about=$metaid]",
+            metaid=f"#{metaid}",
+            namespaces=ANNOTATION_NS,
+        ):
+            for el_qualifier in el_description:
+                prefix = el_qualifier.prefix
+
+                tag = xml.QName(el_qualifier.tag)
+                localname = tag.localname
+
+                qualifier = f"{prefix}:{localname}"
+
+                for el_identifier in el_qualifier.xpath(
+                    "rdf:Bag/rdf:li/@rdf:resource",
+                    namespaces=ANNOTATION_NS,
+                ):
+                    identifier = f'{qualifier}="{el_identifier}"'
+                    identifiers.append(identifier)
+    return identifiers
+
+
+@functools.cache
+def _annotation_cache() -> LRUCache[bytes, tuple[str, ...]]:
+    cfg = cache.Config.get()
+    return cache.register("annotations", LRUCache(cfg.annotation_size))
+
+
+def parse_identifiers(annotation: str | None, metaid: str | None) -> list[str]:
+    """Extract the identifiers from an unparsed annotation string, memoized by content hash"""
+    if annotation is None or not metaid:
+        return []
+
+    # keyed by a digest so that the cache doesn't keep the annotations themselves alive
+    key = hashlib.blake2b(f"{metaid}\0{annotation}".encode(), digest_size=16).digest()
+
+    annotation_cache = _annotation_cache()
+    identifiers = annotation_cache.get(key)
+    if identifiers is None:
+        identifiers = tuple(get_identifiers(xml.fromstring(annotation), metaid))
+        annotation_cache.put(key, identifiers)
+
+    return list(identifiers)
+
+
+# label shared by all nodes, with a uniqueness constraint on uuid
+ENTITY_LABEL = "Entity"
+
+# marks an annotation that hasn't been parsed yet
+_UNPARSED = object()
+
+
 class Node:
+    # nodes are created for every record read from the database, so use slots to keep them
+    # small - everything derived from properties is computed on access
+    __slots__ = ("uuid", "label", "properties", "_identifiers", "_annotation")
+
     uuid: str
 
     label: str
     properties: dict[str, str]
 
-    annotation: xml._Element | None
-    id: str | None
-    metaid: str | None
-    name: str | None
-
-    identifiers: list[str]
+    _identifiers: list[str] | None
 
-    def __init__(self, uuid: str, label: str, properties: dict[str, str]) -> None:
+    def __init__(
+        self,
+        uuid: str,
+        label: str,
+        properties: dict[str, str],
+        identifiers: list[str] | None = None,
+    ) -> None:
         self.uuid = uuid
         self.label = label
         self.properties = properties
 
-        annotation = properties.get("annotation")
-        if annotation is not None:
-            self.annotation = xml.fromstring(annotation)
-        else:
-            self.annotation = None
-
-        self.id = properties.get("id")
-        self.metaid = properties.get("metaid")
-        self.name = properties.get("name")
-
-        self.identifiers = []
-        if self.annotation is not None and self.metaid:
-            for el_description in self.annotation.xpath(
-                "rdf:RDF/rdf:Description[@rdf:about=$metaid]",
-                metaid=f"#{self.metaid}",
-                namespaces=ANNOTATION_NS,
-            ):
-                for el_qualifier in el_description:
-                    prefix = el_qualifier.prefix
-
-                    tag = xml.QName(el_qualifier.tag)
-                    localname = tag.localname
-
-                    qualifier = f"{prefix}:{localname}"
-
-                    for el_identifier in el_qualifier.xpath(
-                        "rdf:Bag/rdf:li/@rdf:resource",
-                        namespaces=ANNOTATION_NS,
-                    ):
-                        identifier = f'{qualifier}="{el_identifier}"'
-                        self.identifiers.append(identifier)
+        # identifiers are stored on the node at import time, otherwise
+        # they are parsed from the annotation on first access
+        self._identifiers = identifiers
+        self._annotation = _UNPARSED
+
+    @property
+    def id(self) -> str | None:
+        return self.properties.get("id")
+
+    @property
+    def metaid(self) -> str | None:
+        return self.properties.get("metaid")
+
+    @property
+    def name(self) -> str | None:
+        return self.properties.get("name")
+
+    @property
+    def annotation(self) -> xml._Element | None:
+        """The parsed RDF annotation"""
+        if self._annotation is _UNPARSED:
+            annotation = self.properties.get("annotation")
+            if annotation is not None:
+                self._annotation = xml.fromstring(annotation)
+            else:
+                self._annotation = None
+        return self._annotation
+
+    @property
+    def identifiers(self) -> list[str]:
+        if self._identifiers is None:
+            self._identifiers = parse_identifiers(
+                self.properties.get("annotation"), self.metaid
+            )
+        return self._identifiers
 
     def copy(
         self,
@@ -85,7 +154,10 @@ class Node:
             label = self.label
         if properties is None:
             properties = self.properties
-        return cls(uuid, label, properties)
+            identifiers = self._identifiers
+        else:
+            identifiers = None
+        return cls(uuid, label, properties, identifiers)
 
     @staticmethod
     def from_neo4j(node: neo4j.graph.Node) -> Node:
@@ -96,108 +168,108 @@ class Node:
             raise ValueError(f"node {node.element_id} has no UUID")
 
         uuid = properties.pop("uuid")
+        identifiers = properties.pop("identifiers", None)
+        # internal, used only for model similarity search
+        properties.pop("minhash", None)
 
-        labels = node.labels
+        # every node also has the common label used for uuid lookups
+        labels = node.labels - {ENTITY_LABEL}
         if len(labels) == 0:
             logger.warning("node %s has no labels", uuid)
             label = "Node"
         else:
             if len(labels) > 1:
                 logger.warning("node %s has >1 labels (%d)", uuid, len(labels))
-            label = next(iter(node.labels))
+            label = next(iter(labels))
 
-        for sub in get_subclasses(Node):
-            if sub.__name__ == label:
-                return sub(uuid, label, properties)
+        return Node.create(uuid, label, properties, identifiers)
 
-        return Node(uuid, label, properties)
+    @staticmethod
+    def create(
+        uuid: str,
+        label: str,
+        properties: dict[str, str],
+        identifiers: list[str] | None = None,
+    ) -> Node:
+        """Create a Node of the subclass corresponding to the given label"""
+        cls = _node_classes.get(label, Node)
+        return cls(uuid, label, properties, identifiers)
+
+
+def _optional[T](properties: dict[str, str], key: str, typ: type[T]) -> T | None:
+    """Convert the given property if it is set"""
+    value = properties.get(key)
+    if value is not None:
+        return typ(value)
+    else:
+        return None
 
 
 class Model(Node):
-    pass
+    __slots__ = ()
 
 
 class Compartment(Node):
-    size: float | None
+    __slots__ = ()
 
-    def __init__(self, uuid: str, label: str, properties: dict[str, str]) -> None:
-        super().__init__(uuid, label, properties)
-
-        size = properties.get("size")
-        if size is not None:
-            self.size = float(size)
-        else:
-            self.size = None
+    @property
+    def size(self) -> float | None:
+        return _optional(self.properties, "size", float)
 
 
 class Species(Node):
-    pass
+    __slots__ = ()
 
 
 class Reaction(Node):
-    reversible: bool | None
+    __slots__ = ()
 
-    def __init__(self, uuid: str, label: str, properties: dict[str, str]) -> None:
-        super().__init__(uuid, label, properties)
-
-        reversible = properties.get("reversible")
-        if reversible is not None:
-            self.reversible = bool(reversible)
-        else:
-            self.reversible = None
+    @property
+    def reversible(self) -> bool | None:
+        return _optional(self.properties, "reversible", bool)
 
 
 class KineticLaw(Node):
-    formula: str | None
+    __slots__ = ()
 
-    def __init__(self, uuid: str, label: str, properties: dict[str, str]) -> None:
-        super().__init__(uuid, label, properties)
-
-        self.formula = properties.get("formula")
+    @property
+    def formula(self) -> str | None:
+        return self.properties.get("formula")
 
 
 class Parameter(Node):
-    value: str | None
-
-    def __init__(self, uuid: str, label: str, properties: dict[str, str]) -> None:
-        super().__init__(uuid, label, properties)
+    __slots__ = ()
 
-        self.value = properties.get("value")
+    @property
+    def value(self) -> str | None:
+        return self.properties.get("value")
 
 
 class UnitDefinition(Node):
-    pass
+    __slots__ = ()
 
 
 class Unit(Node):
-    exponent: int | None
-    kind: int | None
-    multiplier: float | None
-    scale: int | None
+    __slots__ = ()
 
-    def __init__(self, uuid: str, label: str, properties: dict[str, str]) -> None:
-        super().__init__(uuid, label, properties)
+    @property
+    def exponent(self) -> int | None:
+        return _optional(self.properties, "exponent", int)
 
-        exponent = properties.get("exponent")
-        if exponent is not None:
-            self.exponent = int(exponent)
-        else:
-            self.exponent = None
+    @property
+    def kind(self) -> int | None:
+        return _optional(self.properties, "kind", int)
 
-        kind = properties.get("kind")
-        if kind is not None:
-            self.kind = int(kind)
-        else:
-            self.kind = None
+    @property
+    def multiplier(self) -> float | None:
+        return _optional(self.properties, "multiplier", float)
 
-        multiplier = properties.get("multiplier")
-        if multiplier is not None:
-            self.multiplier = float(multiplier)
-        else:
-            self.multiplier = None
+    @property
+    def scale(self) -> int | None:
+        return _optional(self.properties, "scale", int)
 
-        scale = properties.get("scale")
-        if scale is not None:
-            self.scale = int(scale)
-        else:
-            self.scale = None
+
+# label -> class lookup for from_neo4j, built once all subclasses are defined
+_node_classes: dict[str, type[Node]] = {
+    sub.__name__: sub for sub in get_subclasses(Node)
+}
@@ -0,0 +1,205 @@
+import functools
+import logging
+import random
+import re
+import threading
+from typing import Any, LiteralString, cast
+
+import neo4j
+from pydantic import BaseModel, computed_field
+
+from . import config
+
+logger = logging.getLogger(__name__)
+
+
+class Config(BaseModel):
+    # fraction of queries run with PROFILE, to record their db hits
+    sample_rate: float = 0.0
+    # queries taking longer than this many ms are logged at WARNING, and the
+    # next run of the same template is profiled so that its plan can be logged
+    slow_query_ms: float = 1000.0
+    # max number of query templates to keep statistics for
+    max_templates: int = 1000
+
+    @classmethod
+    def get(cls):
+        return config.get(cls, "profiling", optional=True)
+
+
+######################
+## query statistics ##
+######################
+
+# every query summary passed to database.log_summary is recorded against its
+# template - the query text with literals replaced - so that timings can be
+# aggregated even for queries built by string formatting
+
+
+class QueryStats(BaseModel):
+    template: str
+    count: int
+    # ms until the first record was available, and until the result was consumed
+    available_ms: float
+    consumed_ms: float
+    max_ms: float
+    # records (or graph entities) returned
+    rows: int
+    # time spent converting results to networkx graphs in Python
+    convert_ms: float
+    # db hits of the profiled runs, and the number of them
+    profiled: int
+    db_hits: int
+
+    @computed_field
+    @property
+    def total_ms(self) -> float:
+        return self.available_ms + self.consumed_ms + self.convert_ms
+
+
+# comments and a CYPHER version/options preamble have to stay in front of PROFILE
+_PREAMBLE = re.compile(
+    r"^(?:\s+|//[^\n]*(?:\n|$)|/\*.*?\*/)*"
+    r"(?:CYPHER(?:\s+(?:\d+(?:\.\d+)?|\w+\s*=\s*\w+))*\s+)?",
+    re.IGNORECASE | re.DOTALL,
+)
+_PROFILE_PREFIX = re.compile(r"(PROFILE|EXPLAIN)\s+", re.IGNORECASE)
+# schema commands, administration commands and periodic commits can't be profiled
+_UNPROFILABLE = re.compile(
+    r"(?:CREATE|DROP)(?:\s+OR\s+REPLACE)?(?:\s+\w+)?"
+    r"\s+(?:INDEX|CONSTRAINT|DATABASE|ALIAS|USER|ROLE)\b"
+    r"|(?:SHOW|ALTER|GRANT|DENY|REVOKE|START|STOP|TERMINATE|USING)\b",
+    re.IGNORECASE,
+)
+_STRING = re.compile(r"'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_SPACE = re.compile(r"\s+")
+
+
+@functools.lru_cache(maxsize=1024)
+def template(q: str) -> str:
+    """Return the template of a query, with PROFILE, literals and extra whitespace removed"""
+    preamble = _PREAMBLE.match(q)
+    start = preamble.end() if preamble else 0
+    profile = _PROFILE_PREFIX.match(q, start)
+    if profile is not None:
+        q = q[:start] + q[profile.end() :]
+    q = _STRING.sub("?", q)
+    q = _NUMBER.sub("?", q)
+    return _SPACE.sub(" ", q).strip()
+
+
+def _db_hits(profile: dict[str, Any]) -> int:
+    """Sum the db hits of a profiled plan"""
+    return profile.get("dbHits", 0) + sum(
+        _db_hits(c) for c in profile.get("children", [])
+    )
+
+
+# the stats are updated from the event loop and from import threads
+_lock = threading.Lock()
+_stats: dict[str, QueryStats] = {}
+# templates whose next run should be profiled, because they were slow
+_slow: set[str] = set()
+
+
+def sampled(q: str) -> LiteralString:
+    """Return the query to run for q, with PROFILE inserted after any preamble if it has been sampled
+
+    Only meant for the queries built by this package, user queries should be run as given
+    """
+    cfg = Config.get()
+    preamble = _PREAMBLE.match(q)
+    start = preamble.end() if preamble else 0
+    if _PROFILE_PREFIX.match(q, start) or _UNPROFILABLE.match(q, start):
+        return cast(LiteralString, q)
+    if template(q) in _slow or random.random() < cfg.sample_rate:
+        q = q[:start] + "PROFILE " + q[start:]
+    return cast(LiteralString, q)
+
+
+def record(
+    summary: neo4j.ResultSummary,
+    rows: int | None = None,
+    convert_time: float = 0.0,
+):
+    """Record the timings of a completed query, and log it if it was slow"""
+    cfg = Config.get()
+    key = template(summary.query or "")
+
+    available = summary.result_available_after or 0
+    consumed = summary.result_consumed_after or 0
+    convert_ms = convert_time * 1000
+    elapsed = available + consumed + convert_ms
+
+    with _lock:
+        stats = _stats.get(key)
+        if stats is None:
+            if len(_stats) >= cfg.max_templates:
+                key = "<other>"
+                stats = _stats.get(key)
+            if stats is None:
+                stats = _stats[key] = QueryStats(
+                    template=key,
+                    count=0,
+                    available_ms=0.0,
+                    consumed_ms=0.0,
+                    max_ms=0.0,
+                    rows=0,
+                    convert_ms=0.0,
+                    profiled=0,
+                    db_hits=0,
+                )
+
+        stats.count += 1
+        stats.available_ms += available
+        stats.consumed_ms += consumed
+        stats.max_ms = max(stats.max_ms, elapsed)
+        stats.rows += rows or 0
+        stats.convert_ms += convert_ms
+        if summary.profile is not None:
+            stats.profiled += 1
+            stats.db_hits += _db_hits(summary.profile)
+
+        if elapsed < cfg.slow_query_ms:
+            return
+        plan = summary.profile or summary.plan
+        if plan is None:
+            # the plan is only known for profiled runs
+            _slow.add(key)
+        else:
+            _slow.discard(key)
+
+    logger.warning(
+        "Slow query (%.0f ms): `%s`%s",
+        elapsed,
+        key,
+        "" if plan is None else f"\n{format_plan(plan)}",
+    )
+
+
+def format_plan(plan: dict[str, Any], depth: int = 0) -> str:
+    """Format a query plan as an indented tree of operators"""
+    line = "  " * depth + plan.get("operatorType", "?")
+    args = plan.get("args", {})
+    if "Details" in args:
+        line += f" {args['Details']}"
+    if "dbHits" in plan:
+        line += f" (rows={plan.get('rows', 0)}, db hits={plan['dbHits']})"
+    return "\n".join(
+        [line] + [format_plan(c, depth + 1) for c in plan.get("children", [])]
+    )
+
+
+def top(n: int = 20) -> list[QueryStats]:
+    """Return the n templates with the highest total time"""
+    with _lock:
+        stats = [s.model_copy() for s in _stats.values()]
+    stats.sort(key=lambda s: s.total_ms, reverse=True)
+    return stats[:n]
+
+
+def reset():
+    with _lock:
+        _stats.clear()
+        _slow.clear()
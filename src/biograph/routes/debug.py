@@ -0,0 +1,27 @@
+from fastapi import APIRouter
+
+from .. import cache, profiling
+from ..cache import CacheStats
+from ..profiling import QueryStats
+
+#######################
+## /debug API routes ##
+#######################
+
+router = APIRouter(prefix="/debug", tags=["debug"])
+
+
+@router.get("/caches")
+async def cache_stats() -> dict[str, CacheStats]:
+    return {name: c.stats() for name, c in cache.caches.items()}
+
+
+@router.get("/queries")
+async def query_stats(top: int = 20) -> list[QueryStats]:
+    """Return the query templates with the highest total time"""
+    return profiling.top(top)
+
+
+@router.delete("/queries")
+async def reset_query_stats() -> None:
+    profiling.reset()
@@ -0,0 +1,23 @@
+from fastapi import APIRouter, HTTPException
+
+from .. import jobs
+from ..api_models import Job
+
+######################
+## /jobs API routes ##
+######################
+
+router = APIRouter(prefix="/jobs", tags=["jobs"])
+
+
+@router.get("/all")
+async def all_jobs() -> list[Job]:
+    return [Job.from_job(job) for job in jobs.all_jobs()]
+
+
+@router.get("/{job_id}")
+async def job_by_id(job_id: str) -> Job:
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(404, "job not found")
+    return Job.from_job(job)
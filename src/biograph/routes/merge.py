@@ -2,12 +2,15 @@ import logging
 
 from fastapi import APIRouter
 
-from .. import database, graph
+from .. import backend, graph, similarity
 from ..api_models import (
     CalculateSimilarityInput,
     IdentifierFrequencyResult,
     Graph,
+    GraphResponse,
     MergeNodesInput,
+    SimilarityMatrixResult,
+    dump_graph,
 )
 
 logger = logging.getLogger(__name__)
@@ -20,28 +23,38 @@ router = APIRouter(prefix="/merge", tags=["merge"])
 
 
 @router.post("/nodes")
-def merge_nodes(db: database.DbDep, input: MergeNodesInput) -> Graph:
+async def merge_nodes(db: backend.DbDep, input: MergeNodesInput) -> Graph:
+    g = await db.get_subgraphs_by_uuids(input.uuids)
+    plan = graph.merge_nodes(g, input.uuids)
     if input.apply:
-        session = db.rw_session()
-    else:
-        session = db.session()
-    with session:
-        g = database.get_subgraphs_by_uuids(session, input.uuids)
-        graph.merge_nodes(g, input.uuids, session if input.apply else None)
+        await db.write_merge_plan(plan)
+        for uuid in plan.deleted:
+            similarity.index.remove(uuid)
 
-    return Graph.from_graph(g)
+    return GraphResponse(dump_graph(g))
 
 
 @router.post("/similarity")
-def calculate_similarity(db: database.DbDep, input: CalculateSimilarityInput) -> int:
-    with db.session() as session:
-        g = database.get_subgraphs_by_uuids(session, input.uuids)
+async def calculate_similarity(
+    db: backend.DbDep, input: CalculateSimilarityInput
+) -> int:
+    g = await db.get_subgraphs_by_uuids(input.uuids)
     return graph.calc_similarity(g, input.uuids)
 
 
+@router.post("/similarity-matrix")
+async def calculate_similarity_matrix(
+    db: backend.DbDep, input: CalculateSimilarityInput
+) -> SimilarityMatrixResult:
+    g = await db.get_subgraphs_by_uuids(input.uuids)
+    matrix = graph.similarity_matrix(g, input.uuids)
+    return SimilarityMatrixResult(uuids=input.uuids, scores=matrix.tolist())
+
+
 @router.get("/identifier-frequency")
-def identifier_frequency(db: database.DbDep) -> list[IdentifierFrequencyResult]:
-    with db.session() as session:
-        g = database.get_graph(session)
+async def identifier_frequency(
+    db: backend.DbDep,
+) -> list[IdentifierFrequencyResult]:
+    g = await db.get_graph()
     ret = graph.get_identifier_frequency(g)
     return [IdentifierFrequencyResult(identifier=x[0], frequency=x[1]) for x in ret]
@@ -0,0 +1,16 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from .. import metrics
+
+#########################
+## /metrics API routes ##
+#########################
+
+router = APIRouter(tags=["metrics"])
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics() -> str:
+    """Return the request and stage metrics in the Prometheus text format"""
+    return metrics.render()
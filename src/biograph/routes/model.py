@@ -1,11 +1,35 @@
+import asyncio
 import logging
-
-from fastapi import APIRouter, UploadFile
-
-from .. import database
-from ..api_models import Graph
-from ..neo4jsbml import Config as Neo4jSbmlConfig
-from ..neo4jsbml import sbml_to_neo4j
+from typing import Annotated
+
+import networkx as nx
+from fastapi import APIRouter, HTTPException, Query, Request, UploadFile
+
+from .. import (
+    backend,
+    cache,
+    clustering,
+    jobs,
+    ndjson,
+    similarity,
+    snapshots,
+)
+from ..api_models import (
+    BatchImportResult,
+    FindClustersInput,
+    Graph,
+    GraphResponse,
+    Job,
+    SimilarModelResult,
+    dump_graph,
+)
+from ..neo4jsbml import (
+    count_sbml_files,
+    import_batch,
+    import_sbml,
+    read_sbml_files,
+    set_configured_schema,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -16,82 +40,188 @@ logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/model", tags=["models"])
 
 
-@router.get("/all")
-def all_models(db: database.DbDep) -> Graph:
-    with db.session() as session:
-        g = database.get_graph(session)
-    return Graph.from_graph(g)
+@router.get("/all", responses=ndjson.RESPONSES)
+async def all_models(
+    request: Request,
+    db: backend.DbDep,
+    accept: ndjson.AcceptHeader = None,
+) -> Graph:
+    if ndjson.accepts(accept):
+        return ndjson.response(db.stream_all())
+
+    return await snapshots.response(request, ("all",), db.get_graph)
 
 
 @router.delete("/all")
-def clear_database(db: database.DbDep) -> None:
-    with db.rw_session() as session:
-        database.delete_all(session)
+async def clear_database(db: backend.DbDep) -> None:
+    await db.delete_all()
+    similarity.index.clear()
 
 
-@router.get("/by-id/{model_uuid}")
-def model_by_uuid(
-    db: database.DbDep,
+@router.get("/by-id/{model_uuid}", responses=ndjson.RESPONSES)
+async def model_by_uuid(
+    request: Request,
+    db: backend.DbDep,
     model_uuid: str,
+    accept: ndjson.AcceptHeader = None,
 ) -> Graph:
-    with db.session() as session:
-        g = database.get_model(session, model_uuid)
-    return Graph.from_graph(g)
+    if ndjson.accepts(accept):
+        return ndjson.response(db.stream_model(model_uuid))
+
+    async def build() -> nx.MultiDiGraph:
+        return await db.get_model(model_uuid)
 
+    return await snapshots.response(request, ("model", model_uuid), build)
 
-@router.get("/by-name/{model_name}")
-def model_by_name(
-    db: database.DbDep,
+
+@router.get("/by-name/{model_name}", responses=ndjson.RESPONSES)
+async def model_by_name(
+    db: backend.DbDep,
     model_name: str,
+    accept: ndjson.AcceptHeader = None,
 ) -> Graph:
-    with db.session() as session:
-        g = database.get_model_by_name(session, model_name)
-    return Graph.from_graph(g)
+    if ndjson.accepts(accept):
+        return ndjson.response(db.stream_model_by_name(model_name))
+
+    async def fetch() -> bytes:
+        return dump_graph(await db.get_model_by_name(model_name))
+
+    return GraphResponse(await cache.cached(("model-by-name", model_name), fetch))
 
 
-@router.get("/by-node")
-def model_by_node(
-    db: database.DbDep,
+@router.get("/by-node", responses=ndjson.RESPONSES)
+async def model_by_node(
+    db: backend.DbDep,
     label: str,
     property: str,
     value: str,
+    accept: ndjson.AcceptHeader = None,
 ) -> Graph:
-    with db.session() as session:
-        g = database.get_model_by_node(session, label, property, value)
-    return Graph.from_graph(g)
+    if ndjson.accepts(accept):
+        return ndjson.response(db.stream_model_by_node(label, property, value))
 
+    g = await db.get_model_by_node(label, property, value)
+    return GraphResponse(dump_graph(g))
 
-@router.get("/by-node-id/{node_uuid}")
-def model_by_node_uuid(db: database.DbDep, node_uuid: str) -> Graph:
-    with db.session() as session:
-        g = database.get_model_by_node_uuid(session, node_uuid)
-    return Graph.from_graph(g)
 
+@router.get("/by-node-id/{node_uuid}", responses=ndjson.RESPONSES)
+async def model_by_node_uuid(
+    db: backend.DbDep,
+    node_uuid: str,
+    accept: ndjson.AcceptHeader = None,
+) -> Graph:
+    if ndjson.accepts(accept):
+        return ndjson.response(db.stream_model_by_node_uuid(node_uuid))
 
-@router.post("/upload")
-async def upload_sbml(file: UploadFile, arrows_json: UploadFile | None = None) -> None:
+    async def fetch() -> bytes:
+        return dump_graph(await db.get_model_by_node_uuid(node_uuid))
+
+    return GraphResponse(await cache.cached(("model-by-node", node_uuid), fetch))
+
+
+# max number of similar models returned by /model/{uuid}/similar
+MAX_SIMILAR_MODELS = 1000
+
+
+@router.get("/{model_uuid}/similar")
+async def similar_models(
+    model_uuid: str, k: Annotated[int, Query(ge=1, le=MAX_SIMILAR_MODELS)] = 10
+) -> list[SimilarModelResult]:
+    sketch = similarity.index.get(model_uuid)
+    if sketch is None:
+        raise HTTPException(404, "model not found in the similarity index")
+
+    return [
+        SimilarModelResult(uuid=uuid, similarity=score)
+        for uuid, score in similarity.index.query(sketch, k, exclude=model_uuid)
+    ]
+
+
+@router.post("/clusters")
+async def find_clusters(db: backend.DbDep, data: FindClustersInput) -> Job:
+    """Start finding clusters of similar models - the result is a list of clusters of model UUIDs"""
+
+    async def run(job: jobs.Job) -> list[list[str]]:
+        job.update("load identifiers")
+        model_identifiers = await db.get_model_identifiers()
+
+        job.update("compare models")
+        g = await asyncio.to_thread(
+            clustering.similarity_graph,
+            model_identifiers,
+            data.threshold,
+            data.max_block_size,
+            lambda p: job.update(progress=p),
+        )
+
+        job.update("find clusters")
+        return await asyncio.to_thread(clustering.find_clusters, g, data.method)
+
+    return Job.from_job(jobs.submit("clusters", run))
+
+
+async def _read_text(file: UploadFile) -> str:
+    """Read an uploaded file as UTF-8 text"""
     b = await file.read()
-    xml = b.decode()
+    try:
+        return b.decode()
+    except UnicodeDecodeError as e:
+        raise HTTPException(400, f"{file.filename} isn't UTF-8 text: {e}")
+
+
+@router.post("/upload")
+async def upload_sbml(file: UploadFile, arrows_json: UploadFile | None = None) -> Job:
+    """Start importing an SBML file"""
+    xml = await _read_text(file)
 
     logger.info("Importing SBML")
 
     if arrows_json is not None:
-        b = await arrows_json.read()
-        schema = b.decode()
+        schema = await _read_text(arrows_json)
     else:
         schema = None
 
-    sbml_to_neo4j(xml, schema)
+    async def run(job: jobs.Job) -> None:
+        await import_sbml(xml, schema, lambda stage: job.update(stage))
+
+    return Job.from_job(jobs.submit("upload", run))
+
+
+@router.post("/upload-batch")
+async def upload_sbml_batch(
+    files: list[UploadFile], arrows_json: UploadFile | None = None
+) -> Job:
+    """Start importing many SBML files, or zip/tar archives of SBML files"""
+    uploads = [(file.filename or "upload", await file.read()) for file in files]
+    # archives are only extracted one file at a time, as the import pool takes them
+    total = sum(count_sbml_files(name, data) for name, data in uploads)
+    sbml_files = (f for name, data in uploads for f in read_sbml_files(name, data))
+
+    logger.info("Importing %d SBML files", total)
+
+    if arrows_json is not None:
+        schema = await _read_text(arrows_json)
+    else:
+        schema = None
+
+    async def run(job: jobs.Job) -> BatchImportResult:
+        job.update("import")
+        result = await asyncio.to_thread(
+            import_batch,
+            sbml_files,
+            schema,
+            total,
+            lambda p: job.update(progress=p),
+        )
+        return BatchImportResult(imported=result.imported, failed=result.failed)
+
+    return Job.from_job(jobs.submit("upload-batch", run))
 
 
 @router.post("/upload-schema")
 async def upload_schema(file: UploadFile) -> None:
-    cfg = Neo4jSbmlConfig.get()
-
-    b = await file.read()
-    json = b.decode()
+    json = await _read_text(file)
 
     logger.info("Updating schema")
 
-    with open(cfg.schema_path, "w") as f:
-        f.write(json)
+    set_configured_schema(json)
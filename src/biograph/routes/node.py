@@ -1,6 +1,6 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Response
 
-from .. import database
+from .. import backend, cache
 from ..api_models import Node
 
 ######################
@@ -11,13 +11,23 @@ router = APIRouter(prefix="/node", tags=["nodes"])
 
 
 @router.get("/all")
-def all_nodes(db: database.DbDep) -> list[Node]:
-    with db.session() as session:
-        return [Node.from_node(n) for n in database.get_nodes(session)]
+async def all_nodes(
+    db: backend.DbDep,
+    response: Response,
+    limit: backend.PageLimit = None,
+    after: str | None = None,
+) -> list[Node]:
+    """Page through all nodes by uuid - pass the last uuid of a page as `after` to get the next one"""
+    nodes = await db.get_nodes(limit, after)
+    total = await db.count_nodes()
+    response.headers["X-Total-Count"] = str(total)
+    return [Node.from_node(n) for n in nodes]
 
 
 @router.get("/by-id/{node_uuid}")
-def node_by_uuid(db: database.DbDep, node_id: str) -> Node:
-    with db.session() as session:
-        n = database.get_node(session, node_id)
-    return Node.from_node(n)
+async def node_by_uuid(db: backend.DbDep, node_uuid: str) -> Node:
+    async def fetch() -> Node:
+        n = await db.get_node(node_uuid)
+        return Node.from_node(n)
+
+    return await cache.cached(("node", node_uuid), fetch)
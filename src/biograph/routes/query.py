@@ -1,10 +1,10 @@
 import logging
 from typing import Any
 
-from fastapi import APIRouter
+from fastapi import APIRouter, Response
 
-from .. import database
-from ..api_models import Graph, Node, Relationship
+from .. import backend, ndjson
+from ..api_models import Graph, GraphResponse, Node, Relationship, dump_graph
 
 logger = logging.getLogger(__name__)
 
@@ -12,31 +12,71 @@ logger = logging.getLogger(__name__)
 ## /query API routes ##
 #######################
 
+# queries are run with the row cap and timeout from the neo4j config - a client
+# can ask for fewer rows with `limit`, and a cut off result is marked by an
+# X-Truncated header (or a final NDJSON line) saying why - queries are Cypher,
+# so these routes answer 501 with the memory backend
+
 router = APIRouter(prefix="/query", tags=["queries"])
 
 
-@router.get("/raw")
-def raw_query(db: database.DbDep, q: str) -> list[Any]:
-    with db.session() as session:
-        return database.query(session, q)
+def _mark_truncated(response: Response, truncated: str | None):
+    if truncated is not None:
+        response.headers["X-Truncated"] = truncated
+
+
+@router.get("/raw", responses=ndjson.RESPONSES)
+async def raw_query(
+    db: backend.DbDep,
+    response: Response,
+    q: str,
+    limit: int | None = None,
+    accept: ndjson.AcceptHeader = None,
+) -> list[Any]:
+    if ndjson.accepts(accept):
+        return ndjson.query_response(db.limited_query(q, limit))
+
+    values, truncated = await db.query_limited(q, limit)
+    _mark_truncated(response, truncated)
+    return values
+
 
+@router.get("/graph", responses=ndjson.RESPONSES)
+async def graph_query(
+    db: backend.DbDep,
+    q: str,
+    limit: int | None = None,
+    accept: ndjson.AcceptHeader = None,
+) -> Graph:
+    if ndjson.accepts(accept):
+        return ndjson.query_response(db.limited_query(q, limit), graph=True)
 
-@router.get("/graph")
-def graph_query(db: database.DbDep, q: str) -> Graph:
-    with db.session() as session:
-        g = database.query_graph(session, q)
-        return Graph.from_graph(g)
+    g, truncated = await db.query_graph_limited(q, limit)
+    # headers set on an injected Response aren't applied to a returned one
+    response = GraphResponse(dump_graph(g))
+    _mark_truncated(response, truncated)
+    return response
 
 
 @router.get("/nodes")
-def nodes_query(db: database.DbDep, q: str) -> list[Node]:
-    with db.session() as session:
-        return [Node.from_node(n) for n in database.query_nodes(session, q)]
+async def nodes_query(
+    db: backend.DbDep,
+    response: Response,
+    q: str,
+    limit: int | None = None,
+) -> list[Node]:
+    nodes, truncated = await db.query_nodes_limited(q, limit)
+    _mark_truncated(response, truncated)
+    return [Node.from_node(n) for n in nodes]
 
 
 @router.get("/relationships")
-def relationships_query(db: database.DbDep, q: str) -> list[Relationship]:
-    with db.session() as session:
-        return [
-            Relationship.from_edge(e) for e in database.query_relationships(session, q)
-        ]
+async def relationships_query(
+    db: backend.DbDep,
+    response: Response,
+    q: str,
+    limit: int | None = None,
+) -> list[Relationship]:
+    edges, truncated = await db.query_relationships_limited(q, limit)
+    _mark_truncated(response, truncated)
+    return [Relationship.from_edge(e) for e in edges]
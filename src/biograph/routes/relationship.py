@@ -1,6 +1,6 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Response
 
-from .. import database
+from .. import backend
 from ..api_models import Relationship
 
 ##############################
@@ -11,13 +11,22 @@ router = APIRouter(prefix="/relationship", tags=["relationships"])
 
 
 @router.get("/all")
-def all_relationships(db: database.DbDep) -> list[Relationship]:
-    with db.session() as session:
-        return [Relationship.from_edge(e) for e in database.get_relationships(session)]
+async def all_relationships(
+    db: backend.DbDep,
+    response: Response,
+    limit: backend.PageLimit = None,
+    after: str | None = None,
+) -> list[Relationship]:
+    """Page through all relationships by uuid - pass the last uuid of a page as `after` to get the next one"""
+    edges = await db.get_relationships(limit, after)
+    total = await db.count_relationships()
+    response.headers["X-Total-Count"] = str(total)
+    return [Relationship.from_edge(e) for e in edges]
 
 
 @router.get("/by-id/{relationship_uuid}")
-def relationship_by_uuid(db: database.DbDep, relationship_uuid: str) -> Relationship:
-    with db.session() as session:
-        e = database.get_relationship(session, relationship_uuid)
+async def relationship_by_uuid(
+    db: backend.DbDep, relationship_uuid: str
+) -> Relationship:
+    e = await db.get_relationship(relationship_uuid)
     return Relationship.from_edge(e)
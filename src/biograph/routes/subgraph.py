@@ -1,7 +1,7 @@
 from fastapi import APIRouter
 
-from .. import database
-from ..api_models import Graph
+from .. import backend, ndjson
+from ..api_models import Graph, GraphResponse, dump_graph
 
 ##########################
 ## /subgraph API routes ##
@@ -10,8 +10,14 @@ from ..api_models import Graph
 router = APIRouter(prefix="/subgraph", tags=["subgraph"])
 
 
-@router.get("/by-identifier")
-def subgraphs_by_identifier(db: database.DbDep, identifier: str) -> Graph:
-    with db.session() as session:
-        g = database.get_subgraphs_by_identifier(session, identifier)
-    return Graph.from_graph(g)
+@router.get("/by-identifier", responses=ndjson.RESPONSES)
+async def subgraphs_by_identifier(
+    db: backend.DbDep,
+    identifier: str,
+    accept: ndjson.AcceptHeader = None,
+) -> Graph:
+    if ndjson.accepts(accept):
+        return ndjson.response(db.stream_subgraphs_by_identifier(identifier))
+
+    g = await db.get_subgraphs_by_identifier(identifier)
+    return GraphResponse(dump_graph(g))
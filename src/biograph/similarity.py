@@ -0,0 +1,175 @@
+import hashlib
+import logging
+import threading
+from typing import cast
+
+import neo4j
+import networkx as nx
+import numpy as np
+
+from . import backend, database
+from .edges import Edge
+from .nodes import ENTITY_LABEL, Node
+
+logger = logging.getLogger(__name__)
+
+#############################
+## model similarity search ##
+#############################
+
+# each model gets a MinHash sketch over its node identifiers and its
+# (label, edge type, label) shingles, stored on the Model node at import time -
+# an LSH index over the sketches then finds candidate similar models without
+# comparing against every model
+
+NUM_HASHES = 128
+BANDS = 32
+ROWS = NUM_HASHES // BANDS
+
+# fixed seed, so that sketches stay comparable across processes and restarts
+_rng = np.random.default_rng(0x5EED)
+_MULTIPLIERS = _rng.integers(1, 2**63, NUM_HASHES, dtype=np.uint64) | np.uint64(1)
+_OFFSETS = _rng.integers(0, 2**63, NUM_HASHES, dtype=np.uint64)
+
+_EMPTY = np.full(NUM_HASHES, 2**32 - 1, dtype=np.int64)
+
+
+def shingles(g: nx.MultiDiGraph) -> set[str]:
+    """Return the set of features of a model graph that are compared for similarity"""
+    ret: set[str] = set()
+    for _, node in g.nodes.data("node"):
+        ret.update(cast(Node, node).identifiers)
+    for start, end, edge in g.edges.data("edge"):
+        start_node = cast(Node, g.nodes[start]["node"])
+        end_node = cast(Node, g.nodes[end]["node"])
+        ret.add(f"{start_node.label}-{cast(Edge, edge).typ}->{end_node.label}")
+    return ret
+
+
+def sketch(features: set[str]) -> np.ndarray:
+    """Calculate the MinHash sketch of a set of features"""
+    if not features:
+        return _EMPTY.copy()
+
+    # stable 64-bit hashes - the builtin hash() is salted per process
+    hashes = np.array(
+        [
+            int.from_bytes(hashlib.blake2b(f.encode(), digest_size=8).digest())
+            for f in features
+        ],
+        dtype=np.uint64,
+    )
+
+    # multiply-shift hashing, one row per hash function, wrapping around 2**64
+    with np.errstate(over="ignore"):
+        permuted = _MULTIPLIERS[:, None] * hashes[None, :] + _OFFSETS[:, None]
+    return (permuted >> np.uint64(32)).min(axis=1).astype(np.int64)
+
+
+class LSHIndex:
+    """In-memory locality sensitive hashing index over model sketches"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sketches: dict[str, np.ndarray] = {}
+        self._buckets: list[dict[bytes, set[str]]] = [{} for _ in range(BANDS)]
+
+    def __len__(self) -> int:
+        return len(self._sketches)
+
+    def _bands(self, sketch: np.ndarray):
+        for band in range(BANDS):
+            yield band, sketch[band * ROWS : (band + 1) * ROWS].tobytes()
+
+    def add(self, uuid: str, sketch: np.ndarray):
+        with self._lock:
+            self._remove(uuid)
+            self._sketches[uuid] = sketch
+            for band, key in self._bands(sketch):
+                self._buckets[band].setdefault(key, set()).add(uuid)
+
+    def remove(self, uuid: str):
+        with self._lock:
+            self._remove(uuid)
+
+    def _remove(self, uuid: str):
+        sketch = self._sketches.pop(uuid, None)
+        if sketch is None:
+            return
+        for band, key in self._bands(sketch):
+            bucket = self._buckets[band][key]
+            bucket.discard(uuid)
+            if not bucket:
+                del self._buckets[band][key]
+
+    def clear(self):
+        with self._lock:
+            self._sketches.clear()
+            for buckets in self._buckets:
+                buckets.clear()
+
+    def get(self, uuid: str) -> np.ndarray | None:
+        return self._sketches.get(uuid)
+
+    def query(
+        self, sketch: np.ndarray, k: int, exclude: str | None = None
+    ) -> list[tuple[str, float]]:
+        """Return up to k models sharing an LSH bucket with the sketch, by estimated Jaccard similarity"""
+        with self._lock:
+            candidates: set[str] = set()
+            for band, key in self._bands(sketch):
+                candidates |= self._buckets[band].get(key, set())
+            candidates.discard(cast(str, exclude))
+
+            scored = [
+                (uuid, float(np.mean(self._sketches[uuid] == sketch)))
+                for uuid in candidates
+            ]
+
+        scored.sort(key=lambda x: x[1], reverse=True)
+        return scored[:k]
+
+
+# the index of this process, rebuilt from the database at startup
+index = LSHIndex()
+
+
+def set_sketches_by_tag(session: neo4j.Session, tag: str) -> dict[str, np.ndarray]:
+    """Calculate and store the sketches of all models with the given tag"""
+    records = database.query(
+        session,
+        f"MATCH (m:{ENTITY_LABEL}:Model {{tag: $tag}}) RETURN m.uuid AS uuid",
+        {"tag": tag},
+    )
+    return {r["uuid"]: _set_sketch(session, r["uuid"]) for r in records}
+
+
+def backfill_sketches(session: neo4j.Session) -> int:
+    """Calculate and store the sketches of all models that don't have one yet, returns the number of models updated"""
+    records = database.query(
+        session, "MATCH (m:Model) WHERE m.minhash IS NULL RETURN m.uuid AS uuid"
+    )
+    for record in records:
+        _set_sketch(session, record["uuid"])
+    return len(records)
+
+
+def _set_sketch(session: neo4j.Session, uuid: str) -> np.ndarray:
+    s = sketch(shingles(database.get_model(session, uuid)))
+    database.query(
+        session,
+        "MATCH (m:Model {uuid: $uuid}) SET m.minhash = $minhash",
+        {"uuid": uuid, "minhash": s.tolist()},
+    )
+    return s
+
+
+async def load_index(db: backend.Backend):
+    """Rebuild the index from the sketches stored in the database"""
+    sketches = await db.get_model_sketches()
+
+    index.clear()
+    for uuid, minhash in sketches.items():
+        index.add(uuid, np.array(minhash, dtype=np.int64))
+
+    logger.info("Loaded %d model sketches", len(index))
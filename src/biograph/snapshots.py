@@ -0,0 +1,95 @@
+import asyncio
+import functools
+import gzip
+import hashlib
+import logging
+from collections.abc import Awaitable, Callable
+
+import networkx as nx
+from fastapi import Request, Response
+
+from . import api_models, cache, metrics
+from .cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+###############################
+## cached response snapshots ##
+###############################
+
+# large graph responses are serialized and compressed once per database
+# generation, and tagged with an ETag hashed from their content
+#
+# the snapshots are cached per process for at most cache.read_ttl, like the other
+# read caches, and a 304 is only sent while this process holds a snapshot - so a
+# client never confirms a copy older than a fresh 200 could be. writes made by
+# other processes (workers, scripts/import_sbml.py) show up once it expires, an
+# unchanged graph rebuilt after that keeps its ETag as long as it serializes the same
+
+
+class Snapshot:
+    """A serialized response body, plain and gzipped, with its ETag"""
+
+    body: bytes
+    gzipped: bytes
+    etag: str
+
+    def __init__(self, body: bytes) -> None:
+        self.body = body
+        digest = hashlib.blake2b(body, digest_size=16).hexdigest()
+        self.etag = f'W/"{digest}"'
+        with metrics.span("gzip"):
+            self.gzipped = gzip.compress(body, compresslevel=6)
+
+    @classmethod
+    def from_graph(cls, g: nx.MultiDiGraph):
+        return cls(api_models.dump_graph(g))
+
+
+@functools.cache
+def _snapshot_cache() -> LRUCache[tuple, Snapshot]:
+    cfg = cache.Config.get()
+    return cache.register("snapshots", LRUCache(cfg.snapshot_size, cfg.read_ttl))
+
+
+def _matches(request: Request, tag: str) -> bool:
+    """Check if the request's If-None-Match header matches the ETag, using weak comparison"""
+    header = request.headers.get("if-none-match")
+    if header is None:
+        return False
+    tags = [t.strip().removeprefix("W/") for t in header.split(",")]
+    return "*" in tags or tag.removeprefix("W/") in tags
+
+
+async def response(
+    request: Request,
+    key: tuple,
+    build: Callable[[], Awaitable[nx.MultiDiGraph]],
+) -> Response:
+    """Respond with the snapshot for key, building it if it isn't cached for the current generation"""
+    # take the generation before building, like cache.cached
+    gen = cache.generation.value
+
+    snapshot_cache = _snapshot_cache()
+    snapshot = snapshot_cache.get((gen, *key))
+    if snapshot is None:
+        g = await build()
+        # serializing and compressing a large graph takes a while, keep it off the event loop
+        snapshot = await asyncio.to_thread(Snapshot.from_graph, g)
+        snapshot_cache.put((gen, *key), snapshot)
+
+    headers = {
+        "ETag": snapshot.etag,
+        "Cache-Control": "no-cache",
+        "Vary": "Accept-Encoding",
+    }
+    if _matches(request, snapshot.etag):
+        return Response(status_code=304, headers=headers)
+
+    # GZipMiddleware leaves responses that already have a Content-Encoding alone
+    if "gzip" in request.headers.get("accept-encoding", ""):
+        headers["Content-Encoding"] = "gzip"
+        return Response(
+            snapshot.gzipped, media_type="application/json", headers=headers
+        )
+    return Response(snapshot.body, media_type="application/json", headers=headers)